@@ -1,5 +1,8 @@
 """Core parser and executor for Aissembly minimal language."""
+__version__ = "0.1.0"
+
 from .parser import parse_program
 from .executor import Executor, load_llm_defs
+from .async_executor import AsyncExecutor
 
-__all__ = ["parse_program", "Executor", "load_llm_defs"]
+__all__ = ["__version__", "parse_program", "Executor", "AsyncExecutor", "load_llm_defs"]
@@ -0,0 +1,131 @@
+"""Precompiled call plans for LLM function definitions.
+
+:class:`CallPlan` holds everything about an ``llm_defs`` entry that does not
+change from call to call: the positional parameter names, the declared
+defaults, the prepared HTTP endpoints and, for Python adapters, the location of
+the adapter function.  Python adapter modules are imported once per file and
+only re-imported when the file's modification time or size changes, so
+anything a module loads at import time (model weights, clients) is reused by
+later calls.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import importlib.util
+import os
+import threading
+
+from .limits import Limiter
+from .transport import Endpoint
+
+_modules: Dict[str, Tuple[Tuple[int, int], ModuleType]] = {}
+_modules_lock = threading.Lock()
+# One lock per adapter file, held while it is imported.
+_path_locks: Dict[str, threading.Lock] = {}
+
+
+def load_adapter_module(path: str) -> Tuple[ModuleType, Tuple[int, int]]:
+    """Return the module at ``path`` and the file stamp it was loaded from.
+
+    Only loads of the same file wait for an import in progress, so a slow
+    adapter does not hold up the others, and an adapter may load another one
+    at import time.
+    """
+
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _modules_lock:
+        entry = _modules.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], stamp
+        lock = _path_locks.setdefault(path, threading.Lock())
+    with lock:
+        with _modules_lock:
+            entry = _modules.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], stamp
+        spec_obj = importlib.util.spec_from_file_location("llm_adapter", path)
+        if spec_obj is None or spec_obj.loader is None:
+            raise ImportError(f"Cannot load adapter from {path}")
+        module = importlib.util.module_from_spec(spec_obj)
+        spec_obj.loader.exec_module(module)
+        with _modules_lock:
+            _modules[path] = (stamp, module)
+        return module, stamp
+
+
+@dataclass
+class CallPlan:
+    name: str
+    spec: Dict[str, Any]
+    adapter: Optional[Dict[str, Any]]
+    kind: Optional[str]
+    model: Any
+    param_names: Tuple[str, ...]
+    defaults: Tuple[Tuple[str, Any], ...]
+    endpoint: Optional[Endpoint] = None
+    batch_endpoint: Optional[Endpoint] = None
+    limiter: Optional[Limiter] = None
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> "CallPlan":
+        adapter = spec.get("adapter")
+        kind = adapter.get("type") if adapter else None
+        props = spec.get("parameters", {}).get("properties", {})
+        plan = cls(
+            spec.get("name"),
+            spec,
+            adapter,
+            kind,
+            spec.get("model"),
+            tuple(props),
+            tuple((k, p["default"]) for k, p in props.items() if "default" in p),
+        )
+        if kind == "http":
+            plan.endpoint = Endpoint.from_adapter(adapter)
+            batch = adapter.get("batch") or {}
+            plan.batch_endpoint = Endpoint.from_adapter(adapter, batch.get("url")) if batch else None
+        return plan
+
+    def payload(self, args: List[Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the request an adapter receives for a call.
+
+        HTTP adapters get a JSON object: the model, positional arguments mapped
+        onto ``parameters.properties`` in order, keyword arguments and finally
+        the declared defaults.  Python adapters receive the arguments unchanged.
+        """
+
+        if self.kind == "python":
+            return {"args": args, "kwargs": kwargs}
+        payload = {"model": self.model}
+        payload.update(zip(self.param_names, args))
+        payload.update(kwargs)
+        for k, v in self.defaults:
+            if k not in payload:
+                payload[k] = v
+        return payload
+
+    def identity(self) -> List[Any]:
+        """Describe the backend behind the adapter for use in cache keys."""
+
+        adapter = self.adapter or {}
+        if self.kind == "python":
+            path = adapter.get("path")
+            stamp = None
+            if path and os.path.exists(path):
+                stamp = list(load_adapter_module(path)[1])
+            return ["python", path, adapter.get("function"), stamp]
+        return [self.kind, adapter.get("url"), adapter.get("method", "POST").upper()]
+
+    def function(self, name: Optional[str] = None) -> Callable[..., Any]:
+        """Return the Python adapter function ``name`` (default: ``function``)."""
+
+        adapter = self.adapter or {}
+        path = adapter.get("path")
+        func_name = name or adapter.get("function")
+        if not path or not func_name:
+            raise ValueError("Python adapter requires 'path' and 'function'")
+        module, _ = load_adapter_module(path)
+        return getattr(module, func_name)
@@ -0,0 +1,223 @@
+"""Build artifacts of optimized programs.
+
+Parsing and, above all, the LLM-driven optimizer passes dominate the start-up
+of a run, yet their result only depends on the program source, the LLM
+definitions, the pass options and the version of this package.
+:func:`build_artifact` runs the front end once and returns an
+:class:`Artifact` holding the optimized program, the optimizer statistics and
+the compiled bytecode of the program.  :func:`store_artifact` writes it to
+``<cache_dir>/<key>.aart`` and :func:`load_artifact` reads it back, so a run
+with ``--artifact-cache DIR`` whose inputs are unchanged skips parsing and
+optimization entirely.  ``python -m aissembly_core.runtime compile`` builds
+artifacts ahead of deployment.
+
+The program is stored as a compact tree of tuples: every node becomes
+``(tag, *fields)`` with the tag indexing :data:`NODE_TYPES`.  Artifacts are
+marshalled, so the Python bytecode magic number is part of the key.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import tempfile
+
+from . import __version__
+from .compiler import CompiledProgram, compile_program
+from .optimizer import DEFAULT_PASSES, optimizer
+from .parser import (
+    Boolean,
+    Call,
+    Cond,
+    DictLiteral,
+    EMPTY_KWARGS,
+    ForLoop,
+    LetStmt,
+    ListLiteral,
+    Number,
+    Program,
+    String,
+    Var,
+    WhileLoop,
+    parse_program,
+)
+
+# Bumped whenever the layout below changes.
+ARTIFACT_FORMAT = 1
+
+# Order matters: the position of a class is its tag in serialized artifacts.
+NODE_TYPES = (
+    Program,
+    LetStmt,
+    Var,
+    Number,
+    String,
+    Boolean,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+)
+_TAGS = {cls: tag for tag, cls in enumerate(NODE_TYPES)}
+_TUPLE = -1
+
+
+def encode_program(program: Program) -> Any:
+    """Return ``program`` as nested tuples, lists and scalars.
+
+    A subtree shared by several parents is encoded once, so hash-consed
+    programs stay compact and keep their sharing through :func:`decode_program`.
+    """
+
+    return _encode(program, {})
+
+
+def _encode(value: Any, memo: Dict[int, Any]) -> Any:
+    if isinstance(value, list):
+        return [_encode(v, memo) for v in value]
+    if isinstance(value, tuple):
+        return (_TUPLE,) + tuple(_encode(v, memo) for v in value)
+    if isinstance(value, Mapping):
+        return {k: _encode(v, memo) for k, v in value.items()}
+    tag = _TAGS.get(type(value))
+    if tag is None:
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        raise TypeError(f"cannot serialize {type(value).__name__} in a program artifact")
+    encoded = memo.get(id(value))
+    if encoded is None:
+        encoded = memo[id(value)] = (tag,) + tuple(_encode(getattr(value, f), memo) for f in value.__slots__)
+    return encoded
+
+
+def decode_program(data: Any) -> Program:
+    """Inverse of :func:`encode_program`."""
+
+    program = _decode(data, {})
+    if not isinstance(program, Program):
+        raise ValueError("artifact does not hold a program")
+    return program
+
+
+def _decode(value: Any, memo: Dict[int, Any]) -> Any:
+    if isinstance(value, list):
+        return [_decode(v, memo) for v in value]
+    if isinstance(value, dict):
+        if not value:
+            return EMPTY_KWARGS
+        return {k: _decode(v, memo) for k, v in value.items()}
+    if isinstance(value, tuple):
+        node = memo.get(id(value))
+        if node is None:
+            tag, items = value[0], [_decode(v, memo) for v in value[1:]]
+            node = tuple(items) if tag == _TUPLE else NODE_TYPES[tag](*items)
+            memo[id(value)] = node
+        return node
+    return value
+
+
+def pass_options(options: Any) -> Dict[str, Any]:
+    """The options that can change the optimized program."""
+
+    names = [p.option for p in DEFAULT_PASSES] + ["reparse_iterations", "hash_cons"]
+    return {name: int(getattr(options, name, 0) or 0) for name in names}
+
+
+def artifact_key(source: str, options: Any) -> str:
+    """Hash of everything the optimized program depends on.
+
+    That is the program source, the bytes of the LLM definitions file
+    ``options.llm``, :func:`pass_options`, the package version and the Python
+    bytecode magic number.
+    """
+
+    h = hashlib.sha256()
+    h.update(f"{ARTIFACT_FORMAT}\0{__version__}\0".encode("utf-8"))
+    h.update(importlib.util.MAGIC_NUMBER)
+    h.update(hashlib.sha256(source.encode("utf-8")).digest())
+    path = getattr(options, "llm", None)
+    if path:
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    else:
+        h.update(b"\0")
+    h.update(json.dumps(pass_options(options), sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class Artifact:
+    """An optimized program ready to run."""
+
+    key: str
+    program: Program
+    compiled: Optional[CompiledProgram] = None
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+def build_artifact(source: str, options: Any, key: Optional[str] = None) -> Artifact:
+    """Parse, optimize and compile ``source``."""
+
+    program = parse_program(source, options=options)
+    stats: Dict[str, Any] = {}
+    program = optimizer(program, options, stats)
+    compiled = compile_program(program, cache_dir=getattr(options, "bytecode_cache", None))
+    return Artifact(key or artifact_key(source, options), program, compiled, stats)
+
+
+def artifact_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{key}.aart")
+
+
+def load_artifact(cache_dir: str, key: str) -> Optional[Artifact]:
+    """Return the artifact stored under ``key``, or ``None``."""
+
+    try:
+        with open(artifact_path(cache_dir, key), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    try:
+        fmt, stored_key, tree, compiled, stats = marshal.loads(data)
+        if fmt != ARTIFACT_FORMAT or stored_key != key:
+            return None
+        program = decode_program(tree)
+    except (EOFError, ValueError, TypeError, IndexError):
+        return None
+    if compiled is not None:
+        code, python_source, constants, code_key = compiled
+        compiled = CompiledProgram(code, python_source, constants, code_key)
+    return Artifact(key, program, compiled, stats)
+
+
+def store_artifact(cache_dir: str, artifact: Artifact) -> str:
+    """Write ``artifact`` atomically and return its path."""
+
+    compiled = None
+    if artifact.compiled is not None:
+        c = artifact.compiled
+        compiled = (c.code, c.source, c.constants, c.key)
+    record = (ARTIFACT_FORMAT, artifact.key, encode_program(artifact.program), compiled, artifact.stats)
+    try:
+        data = marshal.dumps(record)
+    except ValueError:
+        # Constants marshal cannot represent: keep the program, recompile on load.
+        data = marshal.dumps(record[:3] + (None,) + record[4:])
+    os.makedirs(cache_dir, exist_ok=True)
+    path = artifact_path(cache_dir, artifact.key)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return path
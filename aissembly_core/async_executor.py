@@ -0,0 +1,293 @@
+"""Asyncio execution of Aissembly programs.
+
+:class:`AsyncExecutor` evaluates the same resolved AST as
+:class:`~aissembly_core.executor.Executor` and produces the same environment,
+but LLM calls are awaited instead of blocking a thread: HTTP adapters go
+through :class:`~aissembly_core.async_transport.AsyncHTTPTransport`, ``async
+def`` Python adapter functions are awaited directly, and plain Python adapter
+functions run on the default thread pool.  Many programs can therefore run
+concurrently on one event loop.
+
+Subtrees that cannot reach an LLM call are handed to the synchronous
+evaluator unchanged, so only the path down to each call pays for coroutines.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Set
+import asyncio
+import inspect
+import json
+import time
+
+from . import tracing
+from .cache import MISS, cache_key, copy_result
+from .parser import (
+    Program,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+)
+from .executor import BUILTINS, Executor, statement_name
+from .adapters import CallPlan
+from .async_transport import AsyncHTTPTransport
+from .resolver import FOR_NAMES, WHILE_NAMES, Frame, SlotLet, resolve_program
+from .singleflight import Flight
+from .streaming import CallRecord, TokenCallback, andjson_chunks, astream_text, stream_text
+
+
+def _mark_async(node: Any, marked: Set[int]) -> bool:
+    """Add the ids of nodes whose evaluation may call an LLM to ``marked``."""
+
+    if isinstance(node, Call):
+        found = node.name not in BUILTINS
+        for arg in node.args:
+            found = _mark_async(arg, marked) or found
+        for arg in node.kwargs.values():
+            found = _mark_async(arg, marked) or found
+    elif isinstance(node, ListLiteral):
+        found = False
+        for item in node.elements:
+            found = _mark_async(item, marked) or found
+    elif isinstance(node, DictLiteral):
+        found = False
+        for key, value in node.items:
+            found = _mark_async(key, marked) or found
+            found = _mark_async(value, marked) or found
+    elif isinstance(node, Cond):
+        found = False
+        for part in (node.test, node.then, node.else_):
+            found = _mark_async(part, marked) or found
+    elif isinstance(node, ForLoop):
+        found = False
+        for part in (node.start, node.end, node.step, node.init, node.body):
+            found = _mark_async(part, marked) or found
+    elif isinstance(node, WhileLoop):
+        found = False
+        for part in (node.test, node.init, node.body):
+            found = _mark_async(part, marked) or found
+    else:
+        return False
+    if found:
+        marked.add(id(node))
+    return found
+
+
+class AsyncExecutor(Executor):
+    """Executor whose :meth:`run_async` awaits LLM calls on the event loop.
+
+    Accepts the arguments of :class:`Executor` plus ``async_transport``.
+    Loop batching and the statement scheduler are not used on this path;
+    concurrency comes from running many programs at once.
+    """
+
+    def __init__(self, *args: Any, async_transport: AsyncHTTPTransport | None = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.async_transport = async_transport or AsyncHTTPTransport()
+
+    async def run_async(self, program: Program, env: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        env = env or {}
+        resolved = resolve_program(program)
+        self._loop_plans = {}
+        marked: Set[int] = set()
+        for stmt in resolved.statements:
+            _mark_async(stmt.expr if isinstance(stmt, SlotLet) else stmt, marked)
+        run = _AsyncRun(self, marked)
+        frame = resolved.frame(env)
+        tracer = tracing.active()
+        try:
+            for n, stmt in enumerate(resolved.statements):
+                if tracer is None:
+                    await self._exec_statement_async(run, stmt, frame)
+                else:
+                    with tracer.span(statement_name(stmt), "statement", index=n):
+                        await self._exec_statement_async(run, stmt, frame)
+        finally:
+            env.update(frame.bindings())
+        return env
+
+    async def _exec_statement_async(self, run: "_AsyncRun", stmt: Any, frame: Frame) -> None:
+        if isinstance(stmt, SlotLet):
+            frame.values[stmt.slot] = await run.eval(stmt.expr, frame)
+        else:
+            await run.eval(stmt, frame)
+
+    async def call_llm_async(self, name: str, args: Iterable[Any], kwargs: Dict[str, Any]) -> Any:
+        plan = self.plan(name)
+        if plan.adapter is None:
+            return self.call_llm(name, args, kwargs)
+
+        args = list(args)
+        payload = plan.payload(args, kwargs)
+        policy = self._cache_policy(plan.spec)
+        coalesce = self._coalesce(plan.spec)
+        key = None
+        if policy is not None or coalesce:
+            key = cache_key(name, plan.model, payload, plan.identity())
+        if key is not None and policy is not None:
+            cached = self.cache.get(key)
+            if cached is not MISS:
+                record = self._record(name)
+                record.cached = True
+                if payload.get("stream"):
+                    stream_text([cached], record, self.on_token)
+                record.finished = time.perf_counter()
+                self._trace_call(plan, record, payload, cached)
+                return cached
+
+        if key is None or not coalesce:
+            result = await self._invoke_async(plan, args, kwargs, payload)
+            if key is not None:
+                self.cache.set(key, result, ttl=policy.get("ttl"), compress=policy.get("compress"))
+            return result
+
+        flight, leader = self.flights.join(key)
+        if not leader:
+            record = self._join_flight(name, flight)
+            result = None
+            try:
+                # Shielded so that cancelling one waiter leaves the shared
+                # future, and the other waiters, alone.
+                result = copy_result(await asyncio.shield(asyncio.wrap_future(flight.future)))
+                return result
+            finally:
+                record.finished = time.perf_counter()
+                self._trace_call(plan, record, payload, result)
+        try:
+            result = await self._invoke_async(plan, args, kwargs, payload, flight)
+            if policy is not None:
+                self.cache.set(key, result, ttl=policy.get("ttl"), compress=policy.get("compress"))
+        except BaseException as e:
+            self.flights.finish(key, flight, error=e)
+            raise
+        self.flights.finish(key, flight, result)
+        return result
+
+    async def _invoke_async(
+        self,
+        plan: CallPlan,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        payload: Dict[str, Any],
+        flight: Flight | None = None,
+    ) -> Any:
+        func = None
+        if plan.kind == "python" and not (self.call_log is not None and self.call_log.replaying):
+            func = plan.function()
+            if not inspect.iscoroutinefunction(func) and not inspect.isasyncgenfunction(func):
+                return await asyncio.to_thread(self._invoke, plan, args, kwargs, payload, flight)
+        record = self._record(plan.name)
+        limiter = plan.limiter
+        if limiter is not None:
+            record.queue_wait = await limiter.acquire_async()
+            record.started = time.perf_counter()
+        failed = True
+        result = None
+        try:
+            on_token = self.on_token if flight is None else flight.sink(self.on_token)
+            result = await self._dispatch_async(plan, func, args, kwargs, payload, record, on_token)
+            failed = False
+            return result
+        finally:
+            record.finished = time.perf_counter()
+            if limiter is not None:
+                limiter.release(record.finished - record.started, failed)
+            self._trace_call(plan, record, payload, result, failed)
+
+    async def _dispatch_async(
+        self,
+        plan: CallPlan,
+        func: Any,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: TokenCallback | None,
+    ) -> Any:
+        log = self.call_log
+        if log is None:
+            return await self._send_async(plan, func, args, kwargs, payload, record, on_token)
+        if log.replaying:
+            return await log.areplay(plan, payload, record, on_token)
+        return await log.acapture(
+            plan,
+            payload,
+            record,
+            on_token,
+            lambda sink: self._send_async(plan, func, args, kwargs, payload, record, sink),
+        )
+
+    async def _send_async(
+        self,
+        plan: CallPlan,
+        func: Any,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: TokenCallback | None,
+    ) -> Any:
+        if plan.kind == "python":
+            result = func(*args, **kwargs)
+            if inspect.isasyncgen(result):
+                return await astream_text(result, record, on_token)
+            return await result
+        if plan.kind == "http":
+            data = json.dumps(payload).encode("utf-8")
+            async with await self.async_transport.send(plan.endpoint, data) as resp:
+                if payload.get("stream"):
+                    return await astream_text(andjson_chunks(resp), record, on_token)
+                body = await resp.read()
+                return json.loads(body.decode("utf-8"))
+        raise ValueError(f"Unsupported adapter type: {plan.kind}")
+
+
+class _AsyncRun:
+    def __init__(self, executor: AsyncExecutor, marked: Set[int]):
+        self.executor = executor
+        self.marked = marked
+
+    async def eval(self, node: Any, env: Any) -> Any:
+        executor = self.executor
+        if id(node) not in self.marked:
+            return executor.eval_expr(node, env)
+        if isinstance(node, Call):
+            args = [await self.eval(a, env) for a in node.args]
+            kwargs = {k: await self.eval(v, env) for k, v in node.kwargs.items()}
+            if node.name in BUILTINS:
+                return BUILTINS[node.name](*args, **kwargs)
+            if node.name in executor.llm_defs:
+                return await executor.call_llm_async(node.name, args, kwargs)
+            raise ValueError(f"Unknown function: {node.name}")
+        if isinstance(node, ListLiteral):
+            return [await self.eval(e, env) for e in node.elements]
+        if isinstance(node, DictLiteral):
+            return {await self.eval(k, env): await self.eval(v, env) for k, v in node.items}
+        if isinstance(node, Cond):
+            test = await self.eval(node.test, env)
+            return await self.eval(node.then if test else node.else_, env)
+        if isinstance(node, ForLoop):
+            start = await self.eval(node.start, env)
+            end = await self.eval(node.end, env)
+            step = await self.eval(node.step, env)
+            acc = await self.eval(node.init, env)
+            slots = [None, acc]
+            inner = Frame(FOR_NAMES, slots, env)
+            for i in range(start, end, step):
+                slots[0] = i
+                slots[1] = acc
+                acc = await self.eval(node.body, inner)
+            return acc
+        if isinstance(node, WhileLoop):
+            acc = await self.eval(node.init, env)
+            slots = [acc]
+            inner = Frame(WHILE_NAMES, slots, env)
+            while True:
+                slots[0] = acc
+                if not await self.eval(node.test, inner):
+                    break
+                acc = await self.eval(node.body, inner)
+            return acc
+        raise TypeError(f"Unsupported node: {node}")
@@ -0,0 +1,271 @@
+"""Pooled keep-alive HTTP/1.1 transport on asyncio streams.
+
+:class:`AsyncHTTPTransport` is the event-loop counterpart of
+:class:`~aissembly_core.transport.HTTPTransport`: the same
+:class:`~aissembly_core.transport.Endpoint` settings, per-host pools bounded by
+``max_connections``, gzip decoding and one retry on a stale pooled connection,
+but every wait is an ``await``, so thousands of requests can be in flight on
+one thread.  A transport and its connections belong to the event loop that
+first used them.
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.error import HTTPError
+import asyncio
+import http.client
+import io
+import socket
+import ssl
+import zlib
+
+from .transport import Endpoint
+
+_Conn = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+_STALE = (ConnectionError, asyncio.IncompleteReadError)
+
+
+async def _read_head(reader: asyncio.StreamReader) -> bytes:
+    lines = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return b"".join(lines) + b"\r\n"
+        lines.append(line)
+
+
+class _AsyncPool:
+    def __init__(self, scheme: str, host: str, port: int, max_connections: int):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.idle: List[_Conn] = []
+        self.slots = asyncio.Semaphore(max(max_connections, 1))
+        self.opened = 0
+
+    async def acquire(self, endpoint: Endpoint) -> Tuple[_Conn, bool]:
+        """Return a connection and whether it was used before."""
+
+        await self.slots.acquire()
+        while self.idle:
+            conn = self.idle.pop()
+            if not conn[0].at_eof() and not conn[1].is_closing():
+                return conn, True
+            conn[1].close()
+        try:
+            context = ssl.create_default_context() if self.scheme == "https" else None
+            conn = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=context),
+                endpoint.connect_timeout,
+            )
+        except BaseException:
+            self.slots.release()
+            raise
+        sock = conn[1].get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.opened += 1
+        return conn, False
+
+    def release(self, conn: _Conn, reusable: bool) -> None:
+        if reusable:
+            self.idle.append(conn)
+        else:
+            conn[1].close()
+        self.slots.release()
+
+    def close(self) -> None:
+        idle, self.idle = self.idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+class AsyncResponse:
+    """A response whose connection returns to its pool once fully read.
+
+    ``async for`` yields the body line by line as it arrives; :meth:`read`
+    returns the whole body.
+    """
+
+    def __init__(
+        self,
+        pool: _AsyncPool,
+        conn: _Conn,
+        status: int,
+        reason: str,
+        headers: http.client.HTTPMessage,
+        read_timeout: Optional[float],
+        will_close: bool,
+    ):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._pool = pool
+        self._conn = conn
+        self._timeout = read_timeout
+        self._will_close = will_close
+        self._done = False
+        encoding = (headers.get("Content-Encoding") or "").lower()
+        self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding == "gzip" else None
+
+    async def __aenter__(self) -> "AsyncResponse":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
+
+    async def _raw_chunks(self) -> AsyncIterator[bytes]:
+        reader = self._conn[0]
+        timeout = self._timeout
+        if self.status in (204, 304):
+            return
+        if (self.headers.get("Transfer-Encoding") or "").lower() == "chunked":
+            while True:
+                size_line = await asyncio.wait_for(reader.readline(), timeout)
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip trailers up to the blank line that ends the message.
+                    while (await asyncio.wait_for(reader.readline(), timeout)).strip():
+                        pass
+                    return
+                data = await asyncio.wait_for(reader.readexactly(size + 2), timeout)
+                yield data[:-2]
+        elif self.headers.get("Content-Length") is not None:
+            remaining = int(self.headers["Content-Length"])
+            while remaining:
+                data = await asyncio.wait_for(reader.read(min(remaining, 65536)), timeout)
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), timeout)
+                if not data:
+                    return
+                yield data
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        try:
+            async for data in self._raw_chunks():
+                if self._decoder is not None:
+                    data = self._decoder.decompress(data)
+                if data:
+                    yield data
+            if self._decoder is not None:
+                tail = self._decoder.flush()
+                if tail:
+                    yield tail
+        except BaseException:
+            self._finish(False)
+            raise
+        self._finish(not self._will_close)
+
+    async def read(self) -> bytes:
+        return b"".join([data async for data in self._chunks()])
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        pending: List[bytes] = []
+        async for data in self._chunks():
+            *lines, rest = data.split(b"\n")
+            for line in lines:
+                pending.append(line)
+                yield b"".join(pending) + b"\n"
+                pending = []
+            if rest:
+                pending.append(rest)
+        tail = b"".join(pending)
+        if tail:
+            yield tail
+
+    def _finish(self, reusable: bool) -> None:
+        if not self._done:
+            self._done = True
+            self._pool.release(self._conn, reusable)
+
+    def close(self) -> None:
+        # A partly read body would corrupt the next response on the connection.
+        self._finish(False)
+
+
+class AsyncHTTPTransport:
+    """Per-host pools of persistent HTTP connections for one event loop."""
+
+    def __init__(self) -> None:
+        self._pools: Dict[Tuple[str, str, int], _AsyncPool] = {}
+
+    def _pool(self, endpoint: Endpoint) -> _AsyncPool:
+        # One pool per host, so its cap holds across endpoints; the first
+        # endpoint seen for a host sets ``max_connections``.
+        key = (endpoint.scheme, endpoint.host, endpoint.port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _AsyncPool(
+                endpoint.scheme, endpoint.host, endpoint.port, endpoint.max_connections
+            )
+        return pool
+
+    def _request(self, endpoint: Endpoint, body: Optional[bytes]) -> bytes:
+        lines = [f"{endpoint.method} {endpoint.path} HTTP/1.1", f"Host: {endpoint.host}:{endpoint.port}"]
+        lines.extend(f"{k}: {v}" for k, v in endpoint.headers.items())
+        lines.append(f"Content-Length: {len(body) if body else 0}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+
+    async def send(self, endpoint: Endpoint, body: Optional[bytes] = None) -> AsyncResponse:
+        """Send ``body`` to ``endpoint`` and return the open response.
+
+        Raises :class:`urllib.error.HTTPError` for 4xx/5xx statuses.
+        """
+
+        pool = self._pool(endpoint)
+        request = self._request(endpoint, body)
+        while True:
+            conn, reused = await pool.acquire(endpoint)
+            reader, writer = conn
+            try:
+                writer.write(request)
+                await writer.drain()
+                status_line = await asyncio.wait_for(reader.readline(), endpoint.read_timeout)
+                if not status_line:
+                    raise http.client.RemoteDisconnected("Remote end closed connection without response")
+                head = await asyncio.wait_for(_read_head(reader), endpoint.read_timeout)
+            except _STALE:
+                pool.release(conn, False)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                pool.release(conn, False)
+                raise
+            break
+
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        headers = http.client.parse_headers(io.BytesIO(head))
+        framed = (
+            int(status) in (204, 304)
+            or headers.get("Content-Length") is not None
+            or (headers.get("Transfer-Encoding") or "").lower() == "chunked"
+        )
+        will_close = (
+            version != "HTTP/1.1"
+            or (headers.get("Connection") or "").lower() == "close"
+            or not framed
+        )
+        resp = AsyncResponse(pool, conn, int(status), reason, headers, endpoint.read_timeout, will_close)
+        if resp.status >= 400:
+            detail = await resp.read()
+            raise HTTPError(endpoint.url, resp.status, reason, headers, io.BytesIO(detail))
+        return resp
+
+    def stats(self) -> Dict[str, int]:
+        pools = list(self._pools.values())
+        return {
+            "pools": len(pools),
+            "connections_opened": sum(p.opened for p in pools),
+            "idle_connections": sum(len(p.idle) for p in pools),
+        }
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
@@ -0,0 +1,387 @@
+"""Batched dispatch of LLM calls issued inside ``for`` loops.
+
+A loop such as ``for (range(0, N), init=[]) -> push(acc, f(prompt=...))``
+normally makes ``N`` sequential adapter calls.  When ``f`` declares a
+``batch`` section in its adapter spec, :class:`LoopBatcher` evaluates the
+arguments of the call for a window of upcoming iterations, dispatches them
+through :meth:`Executor.call_llm_batch` and hands each iteration the result
+for its call site.
+
+Only call sites whose arguments can be computed ahead of time qualify: they
+must be evaluated on every iteration (not inside a conditional branch or a
+nested loop body), must not stream, and their arguments may only use ``i``,
+literals, pure builtins and enclosing variables.  If the body mutates anything
+other than a freshly built ``acc`` through builtins like ``push``, the
+enclosing variables must hold immutable values.  Arguments that fail to
+evaluate end the window early, so the failing iteration runs, and raises,
+exactly as it would without batching.
+
+Calls must not be sent for iterations the loop never reaches.  Builtin calls
+of the body whose arguments are like those above, including ``assert`` on
+every iteration and calls that may raise such as ``op.div`` or ``get``, are
+evaluated ahead of time as guards, and one that raises ends the window as
+well.  Loops whose body could stop in a way :meth:`LoopBatcher.fill` cannot
+foresee are not batched: an ``assert`` that cannot be checked ahead, a
+mutating builtin other than ``push``/``op.append`` on a list ``acc`` or
+``set`` on a dict ``acc`` that the body returns, or a builtin or LLM call that
+reads ``acc`` or a call result and is evaluated before a call site.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+from .parser import (
+    Number,
+    String,
+    Boolean,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+)
+from .executor import BUILTINS, SIDE_EFFECT_BUILTINS
+from .resolver import FOR_NAMES, UNBOUND, Frame, SlotVar
+from .scheduler import may_stream
+
+# Builtins that mutate one of their arguments.
+MUTATING_BUILTINS = SIDE_EFFECT_BUILTINS - {"print", "assert"}
+
+_IMMUTABLE = (str, int, float, bool, type(None))
+
+
+def _pure_args(node: Any, outer: List[SlotVar]) -> bool:
+    """Whether ``node`` only depends on ``i``, literals and enclosing variables."""
+
+    if isinstance(node, SlotVar):
+        if node.depth == 0:
+            return node.slot == 0
+        outer.append(node)
+        return True
+    if isinstance(node, (Number, String, Boolean)):
+        return True
+    if isinstance(node, ListLiteral):
+        return all(_pure_args(e, outer) for e in node.elements)
+    if isinstance(node, DictLiteral):
+        return all(_pure_args(k, outer) and _pure_args(v, outer) for k, v in node.items)
+    if isinstance(node, Cond):
+        return all(_pure_args(p, outer) for p in (node.test, node.then, node.else_))
+    if isinstance(node, Call):
+        if node.name not in BUILTINS or node.name in SIDE_EFFECT_BUILTINS:
+            return False
+        return all(_pure_args(a, outer) for a in node.args) and all(
+            _pure_args(v, outer) for v in node.kwargs.values()
+        )
+    return False
+
+
+def _mutation_targets(node: Any, targets: List[Any]) -> None:
+    """Collect the first argument of every mutating builtin call under ``node``."""
+
+    if isinstance(node, Call):
+        if node.name in MUTATING_BUILTINS and node.args:
+            targets.append(node.args[0])
+        for arg in node.args:
+            _mutation_targets(arg, targets)
+        for arg in node.kwargs.values():
+            _mutation_targets(arg, targets)
+    elif isinstance(node, ListLiteral):
+        for item in node.elements:
+            _mutation_targets(item, targets)
+    elif isinstance(node, DictLiteral):
+        for key, value in node.items:
+            _mutation_targets(key, targets)
+            _mutation_targets(value, targets)
+    elif isinstance(node, Cond):
+        for part in (node.test, node.then, node.else_):
+            _mutation_targets(part, targets)
+    elif isinstance(node, (ForLoop, WhileLoop)):
+        parts = (node.start, node.end, node.step, node.init) if isinstance(node, ForLoop) else (node.init,)
+        for part in parts:
+            _mutation_targets(part, targets)
+        # ``acc`` inside a nested loop is that loop's accumulator.
+        inner: List[Any] = []
+        _mutation_targets(node.body, inner)
+        if isinstance(node, WhileLoop):
+            _mutation_targets(node.test, inner)
+        if inner:
+            targets.append(None)
+
+
+# Builtins that return a value for any arguments.
+_NEVER_RAISE = frozenset({"op.eq", "op.neq", "op.lnot", "type", "print"})
+
+
+def _evaluation_order(node: Any, nested: bool = False):
+    """Yield ``(node, nested)`` for the nodes under ``node``, children first.
+
+    ``nested`` is true inside the body of an inner loop.
+    """
+
+    if isinstance(node, Call):
+        for a in node.args:
+            yield from _evaluation_order(a, nested)
+        for v in node.kwargs.values():
+            yield from _evaluation_order(v, nested)
+    elif isinstance(node, ListLiteral):
+        for e in node.elements:
+            yield from _evaluation_order(e, nested)
+    elif isinstance(node, DictLiteral):
+        for k, v in node.items:
+            yield from _evaluation_order(k, nested)
+            yield from _evaluation_order(v, nested)
+    elif isinstance(node, Cond):
+        for part in (node.test, node.then, node.else_):
+            yield from _evaluation_order(part, nested)
+    elif isinstance(node, ForLoop):
+        for part in (node.start, node.end, node.step, node.init):
+            yield from _evaluation_order(part, nested)
+        yield from _evaluation_order(node.body, True)
+    elif isinstance(node, WhileLoop):
+        yield from _evaluation_order(node.init, nested)
+        yield from _evaluation_order(node.test, True)
+        yield from _evaluation_order(node.body, True)
+    yield node, nested
+
+
+def _is_acc(node: Any) -> bool:
+    return isinstance(node, SlotVar) and node.depth == 0 and node.slot == 1
+
+
+# Mutations of ``acc`` that cannot raise while it keeps the type of ``init``.
+_SAFE_MUTATIONS = {ListLiteral: {"push", "op.append"}, DictLiteral: {"set", "op.set"}}
+
+
+def _keeps_acc(node: Any) -> bool:
+    """Whether the value of ``node`` is ``acc`` itself."""
+
+    if _is_acc(node):
+        return True
+    return (
+        isinstance(node, Call)
+        and node.name in ("op.append", "op.set", "set")
+        and bool(node.args)
+        and _keeps_acc(node.args[0])
+    )
+
+
+# Builtins whose result never aliases one of their arguments.
+_FRESH_BUILTINS = frozenset(
+    {
+        "op.add", "op.sub", "op.mul", "op.div", "op.mod", "op.concat",
+        "op.eq", "op.neq", "op.gt", "op.ge", "op.lt", "op.le", "op.lnot",
+        "op.len", "len", "op.has", "op.slice", "slice", "op.substr",
+        "push", "merge", "split", "join", "type", "abs", "ceil", "floor",
+    }
+)
+
+
+def _private_result(node: Any) -> bool:
+    """Whether the value of ``node`` is ``acc`` itself or a newly built value."""
+
+    if _is_acc(node) or isinstance(node, (Number, String, Boolean, ListLiteral, DictLiteral)):
+        return True
+    if isinstance(node, Cond):
+        return _private_result(node.then) and _private_result(node.else_)
+    if isinstance(node, Call):
+        if node.name in ("op.append", "op.set", "set"):
+            return bool(node.args) and _private_result(node.args[0])
+        return node.name in _FRESH_BUILTINS or node.name not in BUILTINS
+    return False
+
+
+class LoopBatcher:
+    """Prefetch the batchable LLM calls of one ``for`` loop.
+
+    Results are queued in ``executor.prefetched`` under the ``id`` of their call
+    site; :meth:`Executor.eval_call` consumes one entry per evaluation.
+    """
+
+    def __init__(self, executor: Any, node: ForLoop, env: Any):
+        self.executor = executor
+        self.sites: List[Call] = []
+        self.guards: List[Call] = []
+        self.outer: List[SlotVar] = []
+        self._collect(node.body, top=True)
+        if self.sites and not self._may_stop_only_at_guards(node):
+            self.sites = []
+        if self.sites and not self._isolated(node):
+            # Enclosing variables cannot be rebound inside the loop, but a
+            # mutable value could change between iterations.
+            for var in self.outer:
+                frame = env
+                for _ in range(var.depth - 1):
+                    frame = frame.parent
+                value = frame.values[var.slot] if isinstance(frame, Frame) else frame.get(var.name)
+                if not isinstance(value, _IMMUTABLE):
+                    self.sites = []
+                    break
+        self.frame = Frame(FOR_NAMES, [None, UNBOUND], env)
+
+    @staticmethod
+    def _isolated(node: ForLoop) -> bool:
+        """Whether the body can only mutate a private accumulator."""
+
+        targets: List[Any] = []
+        _mutation_targets(node.body, targets)
+        if not targets:
+            return True
+        return (
+            all(_is_acc(t) for t in targets)
+            and isinstance(node.init, (ListLiteral, DictLiteral))
+            and _private_result(node.body)
+        )
+
+    def _may_stop_only_at_guards(self, node: ForLoop) -> bool:
+        """Collect the guards of the body, or return ``False``.
+
+        ``False`` means a builtin in the body could end the loop at an
+        iteration :meth:`fill` cannot foresee.
+        """
+
+        safe = _SAFE_MUTATIONS.get(type(node.init), set()) if _keeps_acc(node.body) else set()
+        stack: List[Tuple[Any, bool, bool]] = [(node.body, True, True)]
+        while stack:
+            item, top, own = stack.pop()
+            if isinstance(item, Call):
+                if item.name == "assert":
+                    outer: List[SlotVar] = []
+                    if not top or not own or not (
+                        all(_pure_args(a, outer) for a in item.args)
+                        and all(_pure_args(v, outer) for v in item.kwargs.values())
+                    ):
+                        return False
+                    self.guards.append(item)
+                    self.outer.extend(outer)
+                elif item.name in SIDE_EFFECT_BUILTINS and item.name != "print":
+                    if not own or item.name not in safe or not item.args or not _keeps_acc(item.args[0]):
+                        return False
+                stack.extend((a, top, own) for a in item.args)
+                stack.extend((v, top, own) for v in item.kwargs.values())
+            elif isinstance(item, ListLiteral):
+                stack.extend((e, top, own) for e in item.elements)
+            elif isinstance(item, DictLiteral):
+                stack.extend((part, top, own) for kv in item.items for part in kv)
+            elif isinstance(item, Cond):
+                stack.append((item.test, top, own))
+                stack.extend(((item.then, False, own), (item.else_, False, own)))
+            elif isinstance(item, ForLoop):
+                stack.extend((part, top, own) for part in (item.start, item.end, item.step, item.init))
+                stack.append((item.body, False, False))
+            elif isinstance(item, WhileLoop):
+                stack.append((item.init, top, own))
+                stack.extend(((item.test, False, False), (item.body, False, False)))
+        return self._builtin_guards(node.body)
+
+    def _builtin_guards(self, body: Any) -> bool:
+        """Add the builtin calls that can be evaluated ahead to the guards.
+
+        Returns ``False`` if a call that cannot, and may raise, is evaluated
+        before a call site.
+        """
+
+        order = list(_evaluation_order(body))
+        sites = {id(site) for site in self.sites}
+        asserts = {id(guard) for guard in self.guards}
+        last_site = max(n for n, (item, _) in enumerate(order) if id(item) in sites)
+        covered: set = set()
+        for n in range(len(order) - 1, -1, -1):
+            item, nested = order[n]
+            if id(item) in covered:
+                continue
+            if id(item) in sites or id(item) in asserts:
+                covered.update(id(sub) for sub, _ in _evaluation_order(item))
+                continue
+            if not isinstance(item, Call) or item.name in SIDE_EFFECT_BUILTINS:
+                continue
+            outer: List[SlotVar] = []
+            if not nested and _pure_args(item, outer) and item.name not in _NEVER_RAISE:
+                # The outermost such call; its arguments are evaluated with it.
+                self.guards.append(item)
+                self.outer.extend(outer)
+                covered.update(id(sub) for sub, _ in _evaluation_order(item))
+            elif n < last_site and item.name not in _NEVER_RAISE:
+                return False
+        return True
+
+    def _collect(self, node: Any, top: bool) -> None:
+        if isinstance(node, Call):
+            for arg in node.args:
+                self._collect(arg, top)
+            for arg in node.kwargs.values():
+                self._collect(arg, top)
+            if top and self._batchable(node):
+                self.sites.append(node)
+        elif isinstance(node, ListLiteral):
+            for item in node.elements:
+                self._collect(item, top)
+        elif isinstance(node, DictLiteral):
+            for key, value in node.items:
+                self._collect(key, top)
+                self._collect(value, top)
+        elif isinstance(node, Cond):
+            self._collect(node.test, top)
+            self._collect(node.then, False)
+            self._collect(node.else_, False)
+        elif isinstance(node, ForLoop):
+            for part in (node.start, node.end, node.step, node.init):
+                self._collect(part, top)
+        elif isinstance(node, WhileLoop):
+            self._collect(node.init, top)
+
+    def _batchable(self, node: Call) -> bool:
+        if node.name in BUILTINS:
+            return False
+        spec = self.executor.llm_defs.get(node.name)
+        if not spec or not (spec.get("adapter") or {}).get("batch"):
+            return False
+        if may_stream(spec, node):
+            return False
+        outer: List[SlotVar] = []
+        if not all(_pure_args(a, outer) for a in node.args):
+            return False
+        if not all(_pure_args(v, outer) for v in node.kwargs.values()):
+            return False
+        self.outer.extend(outer)
+        return True
+
+    def fill(self, iterations: range) -> int:
+        """Dispatch the calls of ``iterations`` and return how many are covered."""
+
+        executor = self.executor
+        slots = self.frame.values
+        calls: List[List[Tuple[List[Any], Dict[str, Any]]]] = [[] for _ in self.sites]
+        covered = 0
+        for i in iterations:
+            slots[0] = i
+            row = []
+            try:
+                for guard in self.guards:
+                    executor.eval_expr(guard, self.frame)
+                for site in self.sites:
+                    args = [executor.eval_expr(a, self.frame) for a in site.args]
+                    kwargs = {k: executor.eval_expr(v, self.frame) for k, v in site.kwargs.items()}
+                    row.append((args, kwargs))
+            except Exception:
+                break
+            for pending, call in zip(calls, row):
+                pending.append(call)
+            covered += 1
+        if not covered:
+            return 0
+
+        by_name: Dict[str, List[int]] = {}
+        for n, site in enumerate(self.sites):
+            by_name.setdefault(site.name, []).append(n)
+        for name, indices in by_name.items():
+            flat = [call for n in indices for call in calls[n]]
+            outcomes = executor.call_llm_batch(name, flat)
+            for k, n in enumerate(indices):
+                executor.prefetched[id(self.sites[n])] = deque(outcomes[k * covered:(k + 1) * covered])
+        return covered
+
+    def close(self) -> None:
+        for site in self.sites:
+            self.executor.prefetched.pop(id(site), None)
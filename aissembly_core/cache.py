@@ -0,0 +1,212 @@
+"""Two-tier response cache for LLM calls.
+
+The first tier is an in-process LRU map.  The optional second tier is a SQLite
+database in ``cache_dir`` that several processes can share: SQLite serializes
+concurrent writers, the database runs in WAL mode so readers do not block, and
+each thread uses its own connection.  Entries expire after their TTL, and the
+disk tier is trimmed to ``max_entries``/``max_bytes`` by evicting the least
+recently used rows.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+MISS = object()
+
+DB_NAME = "responses.sqlite3"
+
+
+def cache_key(*parts: Any) -> Optional[str]:
+    """Hash JSON-serializable ``parts`` into a cache key.
+
+    Returns ``None`` when a part cannot be serialized; such calls are not cached.
+    """
+
+    try:
+        blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def copy_result(value: Any) -> Any:
+    """Return ``value``, or a deep copy of it when it is a mutable container.
+
+    A result handed to several callers must not be shared: ``push`` or ``set``
+    on one of them would change the others.
+    """
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return copy.deepcopy(value)
+
+
+class LLMCache:
+    """LRU memory tier in front of an optional SQLite disk tier.
+
+    Args:
+        cache_dir: Directory of the shared SQLite database.  ``None`` keeps the
+            cache in memory only.
+        memory_entries: Capacity of the in-process LRU tier.
+        ttl: Default time-to-live in seconds; ``None`` never expires.
+        max_entries: Row cap for the disk tier.
+        max_bytes: Stored-size cap for the disk tier.
+        compress: Default for zlib-compressing values on disk.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        memory_entries: int = 1024,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        compress: bool = False,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            with self._db() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    " key TEXT PRIMARY KEY,"
+                    " value BLOB NOT NULL,"
+                    " compressed INTEGER NOT NULL,"
+                    " size INTEGER NOT NULL,"
+                    " expires REAL,"
+                    " accessed REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self.cache_dir, DB_NAME), timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Any:
+        """Return the cached value for ``key`` or :data:`MISS`."""
+
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return copy_result(value)
+                del self._memory[key]
+        value = self._disk_get(key, now) if self.cache_dir else MISS
+        with self._lock:
+            if value is MISS:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        compress: Optional[bool] = None,
+    ) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        self._remember(key, copy_result(value), expires)
+        if self.cache_dir:
+            self._disk_set(key, value, expires, self.compress if compress is None else compress)
+
+    def _remember(self, key: str, value: Any, expires: Optional[float]) -> None:
+        with self._lock:
+            self._memory[key] = (value, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Any:
+        with self._db() as db:
+            row = db.execute(
+                "SELECT value, compressed, expires FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return MISS
+            blob, compressed, expires = row
+            if expires is not None and expires <= now:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return MISS
+            db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        if compressed:
+            blob = zlib.decompress(blob)
+        value = json.loads(blob.decode("utf-8"))
+        self._remember(key, copy_result(value), expires)
+        return value
+
+    def _disk_set(self, key: str, value: Any, expires: Optional[float], compress: bool) -> None:
+        try:
+            blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            return
+        if compress:
+            blob = zlib.compress(blob)
+        with self._db() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, compressed, size, expires, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, int(compress), len(blob), expires, time.time()),
+            )
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        excess = max(count - self.max_entries, 0) if self.max_entries is not None else 0
+        if excess:
+            db.execute(
+                "DELETE FROM entries WHERE key IN"
+                " (SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+        if self.max_bytes is not None and total > self.max_bytes:
+            rows = db.execute("SELECT key, size FROM entries ORDER BY accessed DESC").fetchall()
+            kept = 0
+            for key, size in rows:
+                kept += size
+                if kept > self.max_bytes:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            with self._db() as db:
+                db.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
@@ -0,0 +1,347 @@
+"""Ahead-of-time compiler from the Aissembly AST to Python bytecode.
+
+:func:`compile_program` lowers a :class:`~aissembly_core.parser.Program` into
+Python source where ``op.*`` builtins become plain operators, loops become
+native ``for``/``while`` statements over local ``i``/``acc`` variables and LLM
+functions are dispatched through :meth:`Executor.call_llm`.  The resulting code
+object is cached in memory and, optionally, as marshalled bytecode on disk keyed
+by the hash of the generated source.
+
+The tree-walking :class:`~aissembly_core.executor.Executor` stays the reference
+engine; both must produce the same ``env`` for every program.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import CodeType
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import importlib.util
+import marshal
+import math
+import os
+import tempfile
+
+from .executor import BUILTINS, Executor
+from .parser import (
+    Program,
+    LetStmt,
+    Var,
+    Number,
+    String,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+    Boolean,
+)
+
+# Python operator precedence, lowest to highest.
+_P_COND = 1
+_P_OR = 2
+_P_AND = 3
+_P_NOT = 4
+_P_CMP = 5
+_P_ADD = 10
+_P_MUL = 11
+_P_UNARY = 12
+_P_PRIMARY = 15
+_P_ATOM = 16
+
+_BINARY = {
+    "op.add": ("+", _P_ADD),
+    "op.concat": ("+", _P_ADD),
+    "op.sub": ("-", _P_ADD),
+    "op.mul": ("*", _P_MUL),
+    "op.div": ("/", _P_MUL),
+    "op.mod": ("%", _P_MUL),
+}
+
+_COMPARE = {
+    "op.eq": "==",
+    "op.neq": "!=",
+    "op.lt": "<",
+    "op.le": "<=",
+    "op.gt": ">",
+    "op.ge": ">=",
+}
+
+_LOOP_VARS = ("i", "acc")
+
+
+def _call_external(executor: Executor, name: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+    if name in executor.llm_defs:
+        return executor.call_llm(name, args, kwargs)
+    raise ValueError(f"Unknown function: {name}")
+
+
+def _unsupported(node: str) -> Any:
+    raise TypeError(f"Unsupported node: {node}")
+
+
+class _Scope:
+    def __init__(self, parent: Optional["_Scope"], local: Tuple[str, ...], indent: int):
+        self.parent = parent
+        self.local = local
+        self.indent = indent
+        self.prelude: List[str] = []
+
+    def binds(self, name: str) -> bool:
+        scope: Optional[_Scope] = self
+        while scope is not None:
+            if name in scope.local:
+                return True
+            scope = scope.parent
+        return False
+
+
+class _Lowering:
+    def __init__(self) -> None:
+        self.builtins: Dict[str, str] = {}
+        self.constants: List[Any] = []
+        self.loops = 0
+
+    # --- helpers ---
+    def _builtin(self, name: str) -> str:
+        ref = self.builtins.get(name)
+        if ref is None:
+            ref = self.builtins[name] = f"_b{len(self.builtins)}"
+        return ref
+
+    def _const(self, value: Any) -> str:
+        self.constants.append(value)
+        return f"_K[{len(self.constants) - 1}]"
+
+    @staticmethod
+    def _wrap(code: Tuple[str, int], min_prec: int) -> str:
+        text, prec = code
+        return text if prec >= min_prec else f"({text})"
+
+    @staticmethod
+    def _is_safe_operand(node: Any, scope: _Scope) -> bool:
+        """True when evaluating ``node`` can neither fail nor have side effects."""
+
+        if isinstance(node, (Number, String, Boolean)):
+            return True
+        return isinstance(node, Var) and scope.binds(node.name)
+
+    # --- program ---
+    def program(self, program: Program) -> str:
+        scope = _Scope(None, (), 1)
+        body: List[str] = []
+        for stmt in program.statements:
+            if isinstance(stmt, LetStmt):
+                code = self.expr(stmt.expr, scope)[0]
+                line = f"env[{stmt.name!r}] = {code}"
+            else:
+                line = self.expr(stmt, scope)[0]
+            body.extend(scope.prelude)
+            scope.prelude = []
+            body.append("    " + line)
+        header = [f"{ref} = BUILTINS[{name!r}]" for name, ref in self.builtins.items()]
+        return "\n".join(
+            header
+            + ["def __aissembly_main__(env, __rt):"]
+            + body
+            + ["    return env", ""]
+        )
+
+    # --- expressions ---
+    def expr(self, node: Any, scope: _Scope) -> Tuple[str, int]:
+        if isinstance(node, Boolean):
+            return repr(node.value), _P_ATOM
+        if isinstance(node, Number):
+            value = node.value
+            if isinstance(value, float) and not math.isfinite(value):
+                return self._const(value), _P_PRIMARY
+            return repr(value), _P_UNARY if value < 0 else _P_ATOM
+        if isinstance(node, String):
+            return repr(node.value), _P_ATOM
+        if isinstance(node, Var):
+            if scope.binds(node.name):
+                return node.name, _P_ATOM
+            return f"env[{node.name!r}]", _P_PRIMARY
+        if isinstance(node, ListLiteral):
+            items = ", ".join(self.expr(e, scope)[0] for e in node.elements)
+            return f"[{items}]", _P_ATOM
+        if isinstance(node, DictLiteral):
+            items = ", ".join(
+                f"{self._wrap(self.expr(k, scope), _P_OR)}: {self.expr(v, scope)[0]}"
+                for k, v in node.items
+            )
+            return "{" + items + "}", _P_ATOM
+        if isinstance(node, Call):
+            return self.call(node, scope)
+        if isinstance(node, Cond):
+            test = self._wrap(self.expr(node.test, scope), _P_OR)
+            then = self._wrap(self.expr(node.then, scope), _P_OR)
+            else_ = self._wrap(self.expr(node.else_, scope), _P_COND)
+            return f"{then} if {test} else {else_}", _P_COND
+        if isinstance(node, ForLoop):
+            return self.for_loop(node, scope)
+        if isinstance(node, WhileLoop):
+            return self.while_loop(node, scope)
+        return f"_unsupported({str(node)!r})", _P_PRIMARY
+
+    def call(self, node: Call, scope: _Scope) -> Tuple[str, int]:
+        name, args = node.name, node.args
+        if name in BUILTINS and not node.kwargs and None not in args:
+            n = len(args)
+            if name in _BINARY and n == 2:
+                op, prec = _BINARY[name]
+                left = self._wrap(self.expr(args[0], scope), prec)
+                right = self._wrap(self.expr(args[1], scope), prec + 1)
+                return f"{left} {op} {right}", prec
+            if name in _COMPARE and n == 2:
+                left = self._wrap(self.expr(args[0], scope), _P_CMP + 1)
+                right = self._wrap(self.expr(args[1], scope), _P_CMP + 1)
+                return f"{left} {_COMPARE[name]} {right}", _P_CMP
+            if name in ("op.land", "op.lor") and n == 2 and self._is_safe_operand(args[1], scope):
+                # Short-circuiting is only invisible when the right operand
+                # cannot fail or have side effects.
+                op, prec = ("and", _P_AND) if name == "op.land" else ("or", _P_OR)
+                left = self._wrap(self.expr(args[0], scope), prec)
+                right = self._wrap(self.expr(args[1], scope), prec + 1)
+                return f"{left} {op} {right}", prec
+            if name == "op.lnot" and n == 1:
+                return f"not {self._wrap(self.expr(args[0], scope), _P_NOT)}", _P_NOT
+            if name in ("op.get", "get") and n == 2:
+                obj = self._wrap(self.expr(args[0], scope), _P_PRIMARY)
+                return f"{obj}[{self.expr(args[1], scope)[0]}]", _P_PRIMARY
+            if name in ("op.slice", "slice") and n == 3:
+                obj = self._wrap(self.expr(args[0], scope), _P_PRIMARY)
+                start = self.expr(args[1], scope)[0]
+                end = self.expr(args[2], scope)[0]
+                return f"{obj}[{start}:{end}]", _P_PRIMARY
+            if name in ("op.len", "len") and n == 1:
+                return f"len({self.expr(args[0], scope)[0]})", _P_PRIMARY
+
+        arg_code = [self.expr(a, scope)[0] if a is not None else "None" for a in args]
+        kw_code = [f"{k!r}: {self.expr(v, scope)[0]}" for k, v in node.kwargs.items()]
+        if name in BUILTINS:
+            parts = arg_code + [f"**{{{', '.join(kw_code)}}}"] if kw_code else arg_code
+            return f"{self._builtin(name)}({', '.join(parts)})", _P_PRIMARY
+        return (
+            f"_call(__rt, {name!r}, [{', '.join(arg_code)}], {{{', '.join(kw_code)}}})",
+            _P_PRIMARY,
+        )
+
+    def _loop_function(self, scope: _Scope, local: Tuple[str, ...], params: str, build) -> str:
+        fn = f"_loop{self.loops}"
+        self.loops += 1
+        inner = _Scope(scope, local, scope.indent + 1)
+        body = build(inner)
+        pad = "    " * scope.indent
+        scope.prelude.append(f"{pad}def {fn}({params}):")
+        scope.prelude.extend(inner.prelude)
+        scope.prelude.extend(body)
+        scope.prelude.append(f"{pad}    return acc")
+        return fn
+
+    def for_loop(self, node: ForLoop, scope: _Scope) -> Tuple[str, int]:
+        head = [self.expr(part, scope)[0] for part in (node.start, node.end, node.step, node.init)]
+
+        def build(inner: _Scope) -> List[str]:
+            pad = "    " * inner.indent
+            body = self.expr(node.body, inner)[0]
+            return [
+                f"{pad}for i in range(_start, _end, _step):",
+                f"{pad}    acc = {body}",
+            ]
+
+        fn = self._loop_function(scope, _LOOP_VARS, "_start, _end, _step, acc", build)
+        return f"{fn}({', '.join(head)})", _P_PRIMARY
+
+    def while_loop(self, node: WhileLoop, scope: _Scope) -> Tuple[str, int]:
+        init = self.expr(node.init, scope)[0]
+
+        def build(inner: _Scope) -> List[str]:
+            pad = "    " * inner.indent
+            test = self.expr(node.test, inner)[0]
+            body = self.expr(node.body, inner)[0]
+            return [f"{pad}while {test}:", f"{pad}    acc = {body}"]
+
+        fn = self._loop_function(scope, ("acc",), "acc", build)
+        return f"{fn}({init})", _P_PRIMARY
+
+
+def program_to_python(program: Program) -> Tuple[str, List[Any]]:
+    """Lower ``program`` to Python source and the constants it references."""
+
+    lowering = _Lowering()
+    source = lowering.program(program)
+    return source, lowering.constants
+
+
+@dataclass
+class CompiledProgram:
+    """Executable form of a program produced by :func:`compile_program`."""
+
+    code: CodeType
+    source: str
+    constants: List[Any]
+    key: str
+
+    def run(self, executor: Executor, env: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        namespace = {
+            "BUILTINS": BUILTINS,
+            "_K": self.constants,
+            "_call": _call_external,
+            "_unsupported": _unsupported,
+        }
+        exec(self.code, namespace)
+        return namespace["__aissembly_main__"](env or {}, executor)
+
+
+_code_cache: Dict[str, CodeType] = {}
+
+
+def _load_bytecode(path: str) -> Optional[CodeType]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    magic = importlib.util.MAGIC_NUMBER
+    if not data.startswith(magic):
+        return None
+    try:
+        return marshal.loads(data[len(magic):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _store_bytecode(path: str, code: CodeType) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def compile_program(program: Program, cache_dir: Optional[str] = None) -> CompiledProgram:
+    """Compile ``program`` to Python bytecode.
+
+    Code objects are memoized per process and, when ``cache_dir`` is given,
+    stored as ``<sha256>.pyc`` files so later processes skip ``compile()``.
+    """
+
+    source, constants = program_to_python(program)
+    key = hashlib.sha256(importlib.util.MAGIC_NUMBER + source.encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, f"{key}.pyc") if cache_dir else None
+    code = _code_cache.get(key)
+    if code is None and path:
+        code = _load_bytecode(path)
+    if code is None:
+        code = compile(source, f"<aissembly:{key[:12]}>", "exec")
+    if path and not os.path.exists(path):
+        _store_bytecode(path, code)
+    _code_cache[key] = code
+    return CompiledProgram(code, source, constants, key)
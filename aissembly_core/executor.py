@@ -1,12 +1,27 @@
 """Execution engine for Aissembly minimal language."""
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterable, List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import inspect
+import itertools
 import json
-import importlib.util
-import urllib.request
 import math
-
+import time
+
+from . import tracing
+from .cache import MISS, LLMCache, cache_key, copy_result
+from .adapters import CallPlan
+from .lazy import DEFAULT_LAZY_WORKERS, Thunk, force, force_all, snapshot
+from .limits import LimitRegistry, backend_key, default_limit_registry
+from .replay import CallLog
+from .singleflight import Flight, SingleFlight, default_single_flight
+from .streaming import CallRecord, TokenCallback, ndjson_chunks, stdout_sink, stream_text
+from .transport import HTTPTransport, default_transport
+from . import vectorize as vectorize_mod
 from .parser import (
     Program,
     LetStmt,
@@ -22,6 +37,15 @@ from .parser import (
     Boolean,
     parse_program,
 )
+from .resolver import (
+    FOR_NAMES,
+    UNBOUND,
+    WHILE_NAMES,
+    Frame,
+    SlotLet,
+    SlotVar,
+    resolve_program,
+)
 
 
 def _set(obj, key, val):
@@ -120,21 +144,107 @@ BUILTINS.update(
     }
 )
 
+# Builtins that mutate their arguments, write output or raise on purpose.
+# Passes that reorder, share or skip evaluation must leave these in place.
+SIDE_EFFECT_BUILTINS = frozenset(
+    {"print", "push", "pop", "set", "op.set", "op.append", "assert"}
+)
+
+
+def statement_name(stmt: Any) -> str:
+    """Label of a top-level statement in traces."""
+
+    return f"let {stmt.name}" if isinstance(stmt, SlotLet) else "statement"
+
 
 class Executor:
-    def __init__(self, llm_defs: Dict[str, Dict[str, Any]] | None = None):
+    def __init__(
+        self,
+        llm_defs: Dict[str, Dict[str, Any]] | None = None,
+        cache: LLMCache | None = None,
+        max_concurrency: int = 1,
+        batch_window: int = 64,
+        transport: HTTPTransport | None = None,
+        on_token: TokenCallback | None = stdout_sink,
+        max_call_records: int = 1000,
+        limits: LimitRegistry | None = None,
+        flights: SingleFlight | None = None,
+        lazy: bool = False,
+        call_log: CallLog | None = None,
+        vectorize: bool = True,
+    ):
         self.llm_defs = llm_defs or {}
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.batch_window = batch_window
+        # Results of batched loop calls, keyed by the ``id`` of the call site.
+        self.prefetched: Dict[int, deque] = {}
+        self.transport = transport or default_transport()
+        self._plans: Dict[str, CallPlan] = {}
+        self.on_token = on_token
+        # Timings of the most recent adapter calls, oldest first.
+        self.call_records: deque = deque(maxlen=max_call_records)
+        self._call_ids = itertools.count(1)
+        self.limits = limits or default_limit_registry()
+        # Register every declared limit up front so that functions sharing a
+        # backend are limited even before the one declaring it is called.
+        for spec in self.llm_defs.values():
+            adapter = spec.get("adapter")
+            if adapter and adapter.get("limits"):
+                self.limits.limiter(backend_key(adapter), adapter["limits"])
+        # Identical calls in flight at the same time share one request.  The
+        # table is process-wide unless one is passed in.
+        self.flights = flights or default_single_flight()
+        # Defer LLM calls until their values are needed; see ``lazy.py``.
+        self.lazy = lazy
+        # Records adapter calls, or answers them from a recording; see ``replay.py``.
+        self.call_log = call_log
+        # Run arithmetic loops over NumPy arrays; see ``vectorize.py``.
+        self.vectorize = vectorize and vectorize_mod.available()
+        # Vectorizable shape of each loop body seen, keyed by node id.  The
+        # node is kept alive so that its id is not reused.  Every run resolves
+        # the program anew, so each run starts a fresh map.
+        self._loop_plans: Dict[int, Tuple[Any, Any]] = {}
 
     def run(self, program: Program, env: Dict[str, Any] | None = None) -> Dict[str, Any]:
         env = env or {}
-        for stmt in program.statements:
-            if isinstance(stmt, LetStmt):
-                env[stmt.name] = self.eval_expr(stmt.expr, env)
+        resolved = resolve_program(program)
+        self._loop_plans = {}
+        frame = resolved.frame(env)
+        try:
+            if self.max_concurrency > 1 and not self.lazy:
+                from .scheduler import Scheduler
+
+                Scheduler(self, self.max_concurrency).run(resolved, frame)
             else:
-                self.eval_expr(stmt, env)
+                tracer = tracing.active()
+                for n, stmt in enumerate(resolved.statements):
+                    if tracer is None:
+                        self._exec_statement(stmt, frame)
+                    else:
+                        with tracer.span(statement_name(stmt), "statement", index=n):
+                            self._exec_statement(stmt, frame)
+        finally:
+            env.update(frame.bindings())
         return env
 
-    def eval_expr(self, node: Any, env: Dict[str, Any]) -> Any:
+    def _exec_statement(self, stmt: Any, frame: Any) -> None:
+        if isinstance(stmt, SlotLet):
+            frame.values[stmt.slot] = self.eval_expr(stmt.expr, frame)
+        else:
+            self.eval_expr(stmt, frame)
+
+    def eval_expr(self, node: Any, env: Any) -> Any:
+        if isinstance(node, SlotVar):
+            frame = env
+            for _ in range(node.depth):
+                frame = frame.parent
+            value = frame.values[node.slot]
+            if value is UNBOUND:
+                raise KeyError(node.name)
+            return value
+        if isinstance(node, Call):
+            return self.eval_call(node, env)
         if isinstance(node, Number):
             return node.value
         if isinstance(node, String):
@@ -142,115 +252,552 @@ class Executor:
         if isinstance(node, Boolean):
             return node.value
         if isinstance(node, ListLiteral):
+            if self.lazy:
+                return self.force_all([self.eval_expr(e, env) for e in node.elements])
             return [self.eval_expr(e, env) for e in node.elements]
         if isinstance(node, DictLiteral):
+            if self.lazy:
+                flat = self.force_all([self.eval_expr(x, env) for kv in node.items for x in kv])
+                return dict(zip(flat[::2], flat[1::2]))
             return {
                 self.eval_expr(k, env): self.eval_expr(v, env) for k, v in node.items
             }
         if isinstance(node, Var):
             return env[node.name]
-        if isinstance(node, Call):
-            return self.eval_call(node, env)
         if isinstance(node, ForLoop):
             return self.eval_for(node, env)
         if isinstance(node, WhileLoop):
             return self.eval_while(node, env)
         if isinstance(node, Cond):
             test = self.eval_expr(node.test, env)
+            if self.lazy:
+                test = force(test)
             branch = node.then if test else node.else_
             return self.eval_expr(branch, env)
         raise TypeError(f"Unsupported node: {node}")
 
-    def eval_call(self, node: Call, env: Dict[str, Any]) -> Any:
+    def eval_call(self, node: Call, env: Any) -> Any:
+        if self.prefetched:
+            pending = self.prefetched.get(id(node))
+            if pending:
+                ok, value = pending.popleft()
+                if not ok:
+                    raise value
+                return value
         args = [self.eval_expr(a, env) for a in node.args]
         kwargs = {k: self.eval_expr(v, env) for k, v in node.kwargs.items()}
+        if self.lazy:
+            return self._eval_call_lazy(node, args, kwargs)
         if node.name in BUILTINS:
             return BUILTINS[node.name](*args, **kwargs)
         if node.name in self.llm_defs:
             return self.call_llm(node.name, args, kwargs)
         raise ValueError(f"Unknown function: {node.name}")
 
-    def eval_for(self, node: ForLoop, env: Dict[str, Any]) -> Any:
+    def _eval_call_lazy(self, node: Call, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+        from .scheduler import may_stream
+
+        name = node.name
+        if name in self.llm_defs and not may_stream(self.llm_defs[name], node):
+            args = [snapshot(a) for a in args]
+            kwargs = {k: snapshot(v) for k, v in kwargs.items()}
+
+            def call() -> Any:
+                values = self.force_all(args + list(kwargs.values()))
+                return self.call_llm(name, values[:len(args)], dict(zip(kwargs, values[len(args):])))
+
+            return Thunk(call, name)
+        values = self.force_all(args + list(kwargs.values()))
+        args, kwargs = values[:len(args)], dict(zip(kwargs, values[len(args):]))
+        if name in BUILTINS:
+            return BUILTINS[name](*args, **kwargs)
+        if name in self.llm_defs:
+            return self.call_llm(name, args, kwargs)
+        raise ValueError(f"Unknown function: {name}")
+
+    def force_all(self, values: List[Any]) -> List[Any]:
+        """Force the lazy values in ``values``, independent ones concurrently."""
+
+        workers = self.max_concurrency if self.max_concurrency > 1 else DEFAULT_LAZY_WORKERS
+        return force_all(values, workers)
+
+    def force_env(self, env: Dict[str, Any], names: Iterable[str] | None = None) -> Dict[str, Any]:
+        """Return the bindings ``names`` (default: all) of ``env`` with values forced."""
+
+        names = list(env) if names is None else list(names)
+        return dict(zip(names, self.force_all([env[n] for n in names])))
+
+    def eval_for(self, node: ForLoop, env: Any) -> Any:
         start = self.eval_expr(node.start, env)
         end = self.eval_expr(node.end, env)
         step = self.eval_expr(node.step, env)
+        if self.lazy:
+            start, end, step = self.force_all([start, end, step])
         acc = self.eval_expr(node.init, env)
-        for i in range(start, end, step):
-            inner_env = env.copy()
-            inner_env.update({"i": i, "acc": acc})
-            acc = self.eval_expr(node.body, inner_env)
+        # One child frame holding only ``i``/``acc`` is reused for every
+        # iteration; nothing can retain it past the iteration that filled it.
+        slots = [None, acc]
+        inner = Frame(FOR_NAMES, slots, env)
+        body = node.body
+        iterations = range(start, end, step)
+        if self.vectorize and len(iterations) >= vectorize_mod.MIN_ITERATIONS:
+            entry = self._loop_plans.get(id(body))
+            if entry is None or entry[0] is not body:
+                entry = self._loop_plans[id(body)] = (body, vectorize_mod.analyze(body))
+            if entry[1] is not None:
+                value = vectorize_mod.run_loop(entry[1], iterations, acc, self, inner)
+                if value is not vectorize_mod.NOT_VECTORIZED:
+                    return value
+        batcher = None
+        if self.batch_window > 0 and len(iterations) > 1 and self.llm_defs:
+            from .batching import LoopBatcher
+
+            batcher = LoopBatcher(self, node, env)
+            if not batcher.sites:
+                batcher = None
+        if batcher is None:
+            for i in iterations:
+                slots[0] = i
+                slots[1] = acc
+                acc = self.eval_expr(body, inner)
+            return acc
+
+        pos = 0
+        try:
+            while pos < len(iterations):
+                window = iterations[pos:pos + self.batch_window]
+                # An iteration whose arguments cannot be prefetched runs
+                # unbatched so that it fails in its usual place.
+                covered = batcher.fill(window) or 1
+                for i in window[:covered]:
+                    slots[0] = i
+                    slots[1] = acc
+                    acc = self.eval_expr(body, inner)
+                pos += covered
+        finally:
+            batcher.close()
         return acc
 
-    def eval_while(self, node: WhileLoop, env: Dict[str, Any]) -> Any:
+    def eval_while(self, node: WhileLoop, env: Any) -> Any:
         acc = self.eval_expr(node.init, env)
+        slots = [acc]
+        inner = Frame(WHILE_NAMES, slots, env)
         while True:
-            inner_env = env.copy()
-            inner_env["acc"] = acc
-            test = self.eval_expr(node.test, inner_env)
+            slots[0] = acc
+            test = self.eval_expr(node.test, inner)
+            if self.lazy:
+                test = force(test)
             if not test:
                 break
-            acc = self.eval_expr(node.body, inner_env)
+            acc = self.eval_expr(node.body, inner)
         return acc
 
-    def call_llm(self, name: str, args: Iterable[Any], kwargs: Dict[str, Any]) -> Any:
+    def plan(self, name: str) -> CallPlan:
+        """Return the call plan of LLM function ``name``, compiled on first use."""
+
         spec = self.llm_defs[name]
-        adapter = spec.get("adapter")
-        if adapter is None:
+        plan = self._plans.get(name)
+        if plan is None or plan.spec is not spec:
+            plan = CallPlan.from_spec(spec)
+            if plan.adapter is not None:
+                plan.limiter = self.limits.limiter(backend_key(plan.adapter), plan.adapter.get("limits"))
+            self._plans[name] = plan
+        return plan
+
+    def call_llm(self, name: str, args: Iterable[Any], kwargs: Dict[str, Any]) -> Any:
+        plan = self.plan(name)
+        if plan.adapter is None:
             return {
-                "model": spec.get("model", "unknown"),
+                "model": plan.spec.get("model", "unknown"),
                 "name": name,
                 "args": args,
                 "kwargs": kwargs,
             }
 
-        atype = adapter.get("type")
-        if atype == "python":
-            path = adapter.get("path")
-            func_name = adapter.get("function")
-            if not path or not func_name:
-                raise ValueError("Python adapter requires 'path' and 'function'")
-            spec_obj = importlib.util.spec_from_file_location("llm_adapter", path)
-            if spec_obj is None or spec_obj.loader is None:
-                raise ImportError(f"Cannot load adapter from {path}")
-            module = importlib.util.module_from_spec(spec_obj)
-            spec_obj.loader.exec_module(module)
-            func = getattr(module, func_name)
-            return func(*args, **kwargs)
-
-
-        if atype == "http":
-            url = adapter.get("url")
-            method = adapter.get("method", "POST").upper()
-            headers = {"Content-Type": "application/json"}
-            headers.update(adapter.get("headers", {}))
-            params_spec = spec.get("parameters", {}).get("properties", {})
-            param_names = list(params_spec.keys())
-            payload = {"model": spec.get("model")}
-            for name_arg, val in zip(param_names, args):
-                payload[name_arg] = val
-            for k, v in kwargs.items():
-                payload[k] = v
-            for k, prop in params_spec.items():
-                if k not in payload and "default" in prop:
-                    payload[k] = prop["default"]
+        args = list(args)
+        payload = plan.payload(args, kwargs)
+        policy = self._cache_policy(plan.spec)
+        coalesce = self._coalesce(plan.spec)
+        key = None
+        if policy is not None or coalesce:
+            key = cache_key(name, plan.model, payload, plan.identity())
+        if key is not None and policy is not None:
+            cached = self.cache.get(key)
+            if cached is not MISS:
+                record = self._record(name)
+                record.cached = True
+                if payload.get("stream"):
+                    stream_text([cached], record, self.on_token)
+                record.finished = time.perf_counter()
+                self._trace_call(plan, record, payload, cached)
+                return cached
+
+        if key is None or not coalesce:
+            result = self._invoke(plan, args, kwargs, payload)
+            if key is not None:
+                self.cache.set(key, result, ttl=policy.get("ttl"), compress=policy.get("compress"))
+            return result
+
+        flight, leader = self.flights.join(key)
+        if not leader:
+            return self._await_flight(name, flight, payload)
+        try:
+            result = self._invoke(plan, args, kwargs, payload, flight)
+            if policy is not None:
+                self.cache.set(key, result, ttl=policy.get("ttl"), compress=policy.get("compress"))
+        except BaseException as e:
+            self.flights.finish(key, flight, error=e)
+            raise
+        self.flights.finish(key, flight, result)
+        return result
+
+    def _coalesce(self, spec: Dict[str, Any]) -> bool:
+        """Whether identical calls in flight may share one request.
+
+        Sharing hands every caller the same sample, so by default it applies
+        only to calls the response cache would answer anyway.
+        """
+
+        flag = spec.get("single_flight")
+        if flag is not None:
+            return bool(flag)
+        return self._cache_policy(spec) is not None
+
+    def _join_flight(self, name: str, flight: Flight) -> CallRecord:
+        """Record a coalesced call and forward the leader's stream to ``on_token``."""
+
+        record = self._record(name)
+        record.coalesced = True
+        on_token = self.on_token
+
+        def forward(chunk: str | None) -> None:
+            if chunk is not None:
+                if record.first_token is None:
+                    record.first_token = time.perf_counter()
+                record.chunks += 1
+            if on_token is not None:
+                on_token(record.name, record.call_id, chunk)
+
+        flight.subscribe(forward)
+        return record
+
+    def _await_flight(self, name: str, flight: Flight, payload: Dict[str, Any] | None = None) -> Any:
+        record = self._join_flight(name, flight)
+        result = None
+        try:
+            # Each waiter gets its own copy, as if it had made the call.
+            result = copy_result(flight.future.result())
+            return result
+        finally:
+            record.finished = time.perf_counter()
+            self._trace_call(self.plan(name), record, payload, result)
+
+    def call_llm_batch(
+        self, name: str, calls: List[Tuple[List[Any], Dict[str, Any]]]
+    ) -> List[Tuple[bool, Any]]:
+        """Call ``name`` once per ``(args, kwargs)`` pair through its batch hook.
+
+        Returns ``(True, result)`` or ``(False, exception)`` for each call, in
+        order.  Cached responses are served without contacting the adapter.
+        """
+
+        plan = self.plan(name)
+        batch = plan.adapter.get("batch") or {}
+        payloads = [plan.payload(list(a), k) for a, k in calls]
+        outcomes: List[Tuple[bool, Any]] = [(False, None)] * len(calls)
+        policy = self._cache_policy(plan.spec)
+        coalesce = self._coalesce(plan.spec)
+        keys: List[str | None] = [None] * len(calls)
+        todo: List[int] = []
+        identity = plan.identity() if policy is not None or coalesce else None
+        for n, payload in enumerate(payloads):
+            if identity is not None:
+                keys[n] = cache_key(name, plan.model, payload, identity)
+            if keys[n] is not None and policy is not None:
+                cached = self.cache.get(keys[n])
+                if cached is not MISS:
+                    outcomes[n] = (True, cached)
+                    continue
+            todo.append(n)
+
+        # Calls identical to one in flight, including an earlier one in this
+        # batch, wait for it instead of being sent.
+        flights: Dict[int, Flight] = {}
+        waiting: List[int] = []
+        if coalesce:
+            leaders = []
+            for n in todo:
+                if keys[n] is None:
+                    leaders.append(n)
+                    continue
+                flights[n], leader = self.flights.join(keys[n])
+                (leaders if leader else waiting).append(n)
+            todo = leaders
+
+        try:
+            size = batch.get("max_size") or len(todo) or 1
+            for pos in range(0, len(todo), size):
+                chunk = todo[pos:pos + size]
+                results = self._invoke_batch(
+                    plan,
+                    batch,
+                    [(list(calls[n][0]), calls[n][1]) for n in chunk],
+                    [payloads[n] for n in chunk],
+                )
+                for n, outcome in zip(chunk, results):
+                    outcomes[n] = outcome
+                    if outcome[0] and keys[n] is not None and policy is not None:
+                        self.cache.set(keys[n], outcome[1], ttl=policy.get("ttl"), compress=policy.get("compress"))
+                    if n in flights:
+                        flight = flights.pop(n)
+                        if outcome[0]:
+                            self.flights.finish(keys[n], flight, outcome[1])
+                        else:
+                            self.flights.finish(keys[n], flight, error=outcome[1])
+        finally:
+            for n in todo:
+                if n in flights:
+                    self.flights.finish(keys[n], flights.pop(n), error=RuntimeError(f"Batch call to {name} was abandoned"))
+
+        for n in waiting:
+            try:
+                outcomes[n] = (True, copy_result(flights[n].future.result()))
+            except Exception as e:
+                outcomes[n] = (False, e)
+        return outcomes
+
+    def _invoke_batch(
+        self,
+        plan: CallPlan,
+        batch: Dict[str, Any],
+        calls: List[Tuple[List[Any], Dict[str, Any]]],
+        payloads: List[Dict[str, Any]],
+    ) -> List[Tuple[bool, Any]]:
+        mode = batch.get("mode", "fanout")
+        if mode == "fanout":
+            def one(n: int) -> Tuple[bool, Any]:
+                try:
+                    return True, self._invoke(plan, calls[n][0], calls[n][1], payloads[n])
+                except Exception as e:
+                    return False, e
+
+            workers = min(batch.get("max_workers", 8), len(calls))
+            if workers <= 1:
+                return [one(n) for n in range(len(calls))]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(one, range(len(calls))))
+
+        if mode != "array":
+            raise ValueError(f"Unsupported batch mode: {mode}")
+        try:
+            results = self._invoke_array(plan, batch, payloads)
+            if not isinstance(results, list) or len(results) != len(calls):
+                raise ValueError(
+                    f"Batch adapter for {plan.name} returned {type(results).__name__}, "
+                    f"expected a list of {len(calls)} results"
+                )
+        except Exception as e:
+            return [(False, e)] * len(calls)
+        return [(True, r) for r in results]
+
+    def _invoke_array(self, plan: CallPlan, batch: Dict[str, Any], payloads: List[Dict[str, Any]]) -> Any:
+        # One batch request counts as one request against the backend limits.
+        limiter = plan.limiter
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        failed = True
+        result = None
+        try:
+            result = self._send_array(plan, batch, payloads)
+            failed = False
+            return result
+        finally:
+            end = time.perf_counter()
+            if limiter is not None:
+                limiter.release(end - start, failed)
+            tracer = tracing.active()
+            if tracer is not None:
+                tracer.record(
+                    f"llm batch {plan.name}",
+                    "llm",
+                    start,
+                    end,
+                    function=plan.name,
+                    model=plan.model,
+                    batch_size=len(payloads),
+                    payload_bytes=tracing.size_of(payloads),
+                    response_bytes=None if failed else tracing.size_of(result),
+                )
+
+    def _send_array(self, plan: CallPlan, batch: Dict[str, Any], payloads: List[Dict[str, Any]]) -> Any:
+        log = self.call_log
+        if log is None:
+            return self._post_array(plan, batch, payloads)
+        if log.replaying:
+            return log.replay_batch(plan, payloads)
+        # Each element is logged as a call of its own, so a recorded batch
+        # can answer single calls and the other way round.
+        start = time.perf_counter()
+        results = self._post_array(plan, batch, payloads)
+        if isinstance(results, list) and len(results) == len(payloads):
+            for payload, result in zip(payloads, results):
+                log.write(plan, payload, result, time.perf_counter() - start)
+        return results
+
+    def _post_array(self, plan: CallPlan, batch: Dict[str, Any], payloads: List[Dict[str, Any]]) -> Any:
+        if plan.kind == "python":
+            return plan.function(batch.get("function"))(payloads)
+
+        if plan.kind == "http":
+            data = json.dumps(payloads).encode("utf-8")
+            with self.transport.send(plan.batch_endpoint, data) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        raise ValueError(f"Unsupported adapter type: {plan.kind}")
+
+    def _cache_policy(self, spec: Dict[str, Any]) -> Dict[str, Any] | None:
+        if self.cache is None:
+            return None
+        policy = spec.get("cache", True)
+        if policy is True:
+            return {}
+        if not policy or not policy.get("enabled", True):
+            return None
+        return policy
+
+    def _record(self, name: str) -> CallRecord:
+        record = CallRecord(name, next(self._call_ids), time.perf_counter())
+        self.call_records.append(record)
+        return record
+
+    def _invoke(
+        self,
+        plan: CallPlan,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        payload: Dict[str, Any],
+        flight: Flight | None = None,
+    ) -> Any:
+        record = self._record(plan.name)
+        limiter = plan.limiter
+        if limiter is not None:
+            record.queue_wait = limiter.acquire()
+            record.started = time.perf_counter()
+        failed = True
+        result = None
+        try:
+            on_token = self.on_token if flight is None else flight.sink(self.on_token)
+            result = self._dispatch(plan, args, kwargs, payload, record, on_token)
+            failed = False
+            return result
+        finally:
+            record.finished = time.perf_counter()
+            if limiter is not None:
+                limiter.release(record.finished - record.started, failed)
+            self._trace_call(plan, record, payload, result, failed)
+
+    def _trace_call(
+        self,
+        plan: CallPlan,
+        record: CallRecord,
+        payload: Dict[str, Any] | None,
+        result: Any,
+        failed: bool = False,
+    ) -> None:
+        """Add an adapter-call span for ``record`` when tracing is active."""
+
+        tracer = tracing.active()
+        if tracer is None:
+            return
+        if record.cached:
+            cache = "hit"
+        elif record.coalesced:
+            cache = "coalesced"
+        else:
+            cache = "miss" if self._cache_policy(plan.spec) is not None else "off"
+        tracer.record(
+            f"llm {record.name}",
+            "llm",
+            record.started,
+            record.finished,
+            function=record.name,
+            model=plan.model,
+            call_id=record.call_id,
+            payload_bytes=None if payload is None else tracing.size_of(payload),
+            response_bytes=None if failed else tracing.size_of(result),
+            ttft=record.ttft,
+            queue_wait=record.queue_wait,
+            chunks=record.chunks,
+            cache=cache,
+            failed=failed,
+        )
+
+    def _dispatch(
+        self,
+        plan: CallPlan,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: TokenCallback | None,
+    ) -> Any:
+        log = self.call_log
+        if log is None:
+            return self._send(plan, args, kwargs, payload, record, on_token)
+        if log.replaying:
+            return log.replay(plan, payload, record, on_token)
+        return log.capture(
+            plan, payload, record, on_token, lambda sink: self._send(plan, args, kwargs, payload, record, sink)
+        )
+
+    def _send(
+        self,
+        plan: CallPlan,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: TokenCallback | None,
+    ) -> Any:
+        if plan.kind == "python":
+            result = plan.function()(*args, **kwargs)
+            if inspect.iscoroutine(result):
+                result = _run_coroutine(result)
+            # A generator adapter streams its chunks like an HTTP stream.
+            if inspect.isgenerator(result):
+                return stream_text(result, record, on_token)
+            return result
+
+        if plan.kind == "http":
             data = json.dumps(payload).encode("utf-8")
-            req = urllib.request.Request(url, data=data, headers=headers, method=method)
-            with urllib.request.urlopen(req) as resp:
+            with self.transport.send(plan.endpoint, data) as resp:
                 if payload.get("stream"):
-                    text = ""
-                    for line in resp:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        chunk = json.loads(line.decode("utf-8"))
-                        response_text = chunk.get("response", "")
-                        text += response_text
-                        print(response_text, end="", flush=True)
-                    print()
-                    return text
+                    return stream_text(ndjson_chunks(resp), record, on_token)
                 body = resp.read().decode("utf-8")
                 return json.loads(body)
-        raise ValueError(f"Unsupported adapter type: {atype}")
+        raise ValueError(f"Unsupported adapter type: {plan.kind}")
+
+
+def _run_coroutine(coro: Any) -> Any:
+    """Run ``coro`` to completion and return its result.
+
+    ``asyncio.run`` cannot start inside a running event loop, which is the case
+    when ``Executor.run`` is called from a coroutine.  The coroutine then runs
+    on a helper thread with its own loop; ``AsyncExecutor`` avoids the thread.
+    """
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(contextvars.copy_context().run, asyncio.run, coro).result()
+
+
+def resolve_payload(spec: Dict[str, Any], args: List[Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the request an adapter receives for a call; see :meth:`CallPlan.payload`."""
+
+    return CallPlan.from_spec(spec).payload(args, kwargs)
 
 
 def load_llm_defs(path: str) -> Dict[str, Dict[str, Any]]:
@@ -0,0 +1,103 @@
+"""Call-by-need evaluation of LLM calls.
+
+With ``Executor(lazy=True)`` (``--lazy`` on the command line) an LLM call does
+not run when it is evaluated.  Its arguments are evaluated and the call becomes
+a :class:`Thunk`, a thread-safe, memoized :class:`~aissembly_core.parser.LazyStr`.
+Thunks pass through ``let`` bindings, variables, ``cond`` branches and loop
+accumulators untouched and are forced only when a value is needed:
+
+- by a builtin, including ``print``, which receives forced arguments;
+- by a condition or a loop bound;
+- by a list or dict literal, so containers never hold thunks;
+- by another LLM call, when that call is itself forced.
+
+Thunks needed at the same time, such as both operands of ``a + b``, are forced
+concurrently.  Calls that may stream are evaluated in place, so output keeps
+its order relative to ``print``.  A deferred call that fails raises where it
+is forced, and a call whose value is never needed never runs.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import copy
+import threading
+
+from .parser import LazyStr
+
+# Upper bound on the threads forcing thunks at once when the executor was not
+# given a ``max_concurrency`` above one.
+DEFAULT_LAZY_WORKERS = 8
+
+
+class Thunk(LazyStr):
+    """A deferred value computed at most once, also under concurrent forcing.
+
+    An exception raised by the computation is remembered and raised again by
+    every later :meth:`force`.
+    """
+
+    def __init__(self, thunk: Callable[[], Any], label: str = ""):
+        super().__init__(thunk)
+        self.label = label
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def force(self) -> Any:
+        if not self._done:
+            with self._lock:
+                if not self._done:
+                    try:
+                        self._value = self._thunk()
+                    except BaseException as e:
+                        self._error = e
+                    self._done = True
+                    self._thunk = None
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def __str__(self) -> str:
+        return str(self.force())
+
+    def __repr__(self) -> str:
+        if not self._done:
+            return f"Thunk({self.label}, <pending>)"
+        return f"Thunk({self.label}, {self._value!r})"
+
+
+def snapshot(value: Any) -> Any:
+    """Copy a container argument so later mutation cannot change a deferred call."""
+
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+
+def force(value: Any) -> Any:
+    return value.force() if isinstance(value, Thunk) else value
+
+
+def force_all(values: Iterable[Any], workers: int = DEFAULT_LAZY_WORKERS) -> List[Any]:
+    """Force every thunk in ``values``, running independent ones concurrently."""
+
+    values = list(values)
+    pending: Dict[int, Thunk] = {}
+    for value in values:
+        if isinstance(value, Thunk) and not value.done:
+            pending[id(value)] = value
+    if len(pending) > 1 and workers > 1:
+        # A pool per batch: a thunk forced here may force its own arguments
+        # in a nested batch without waiting on this pool's threads.
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            for future in [pool.submit(t.force) for t in pending.values()]:
+                try:
+                    future.result()
+                except BaseException:
+                    # Raised again below, in argument order.
+                    pass
+    return [force(v) for v in values]
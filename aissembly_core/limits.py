@@ -0,0 +1,233 @@
+"""Rate limits and concurrency control for LLM backends.
+
+Adapters declare limits in a ``limits`` section:
+
+``rate``/``burst``
+    Token bucket: at most ``rate`` requests per second on average, with bursts
+    of up to ``burst`` requests (default: ``rate``).
+``max_in_flight``
+    Upper bound on concurrent requests.
+``adaptive``
+    AIMD concurrency control.  The in-flight limit grows by one request per
+    window of successful requests faster than ``target_latency`` seconds, and
+    is multiplied by ``decrease`` (default 0.5) on an error or a slow response,
+    at most once per ``target_latency``.  ``min``/``max`` bound the limit.
+
+All functions whose adapters target the same backend (the same URL, or the
+same Python file and function) share one :class:`Limiter` in a
+:class:`LimitRegistry`.  When several of them declare limits, the strictest
+value of each setting applies.  Time spent waiting for the limiter is recorded
+so that backpressure is visible.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import math
+import threading
+import time
+
+
+class Limiter:
+    def __init__(self, key: str):
+        self.key = key
+        self.rate: Optional[float] = None
+        self.burst = 1.0
+        self.max_in_flight: Optional[int] = None
+        self.adaptive: Optional[Dict[str, float]] = None
+        self.limit: float = math.inf
+        self.tokens = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._refilled = time.monotonic()
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        # Coroutines waiting for a slot, woken by :meth:`_notify`.
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def configure(self, limits: Dict[str, Any]) -> None:
+        """Merge ``limits`` into this limiter, keeping the strictest values."""
+
+        with self._cond:
+            rate = limits.get("rate")
+            if rate is not None and (self.rate is None or rate < self.rate):
+                self.rate = float(rate)
+                self.burst = float(limits.get("burst", max(rate, 1)))
+                self.tokens = min(self.tokens, self.burst) if self.requests else self.burst
+            cap = limits.get("max_in_flight")
+            if cap is not None and (self.max_in_flight is None or cap < self.max_in_flight):
+                self.max_in_flight = int(cap)
+            adaptive = limits.get("adaptive")
+            if adaptive:
+                if adaptive is True:
+                    adaptive = {}
+                merged = {
+                    "target_latency": float(adaptive.get("target_latency", 5.0)),
+                    "decrease": float(adaptive.get("decrease", 0.5)),
+                    "min": float(adaptive.get("min", 1)),
+                    "max": float(adaptive.get("max", self.max_in_flight or 64)),
+                }
+                if self.adaptive is not None:
+                    merged["target_latency"] = min(merged["target_latency"], self.adaptive["target_latency"])
+                    merged["max"] = min(merged["max"], self.adaptive["max"])
+                    merged["min"] = max(merged["min"], self.adaptive["min"])
+                self.adaptive = merged
+                if self.limit is math.inf:
+                    self.limit = merged["min"]
+            self._bound()
+            self._notify()
+
+    def _notify(self) -> None:
+        """Wake every waiter.  Must be called with the lock held."""
+
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # the waiter's loop is closed
+                pass
+        self._async_waiters.clear()
+
+    def _bound(self) -> None:
+        if self.adaptive is not None:
+            self.limit = min(max(self.limit, self.adaptive["min"]), self.adaptive["max"])
+        if self.max_in_flight is not None:
+            self.limit = min(self.limit, self.max_in_flight)
+
+    def _try_enter(self, now: float) -> Optional[float]:
+        """Take a slot and a token, or return how long to wait before retrying.
+
+        A wait of ``0`` means a slot is needed and the caller should wait for a
+        release.  Must be called with the lock held.
+        """
+
+        if self.limit is not math.inf and self.in_flight >= max(int(self.limit), 1):
+            return 0.0
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        self.in_flight += 1
+        self.requests += 1
+        return None
+
+    def _waited(self, wait: float) -> None:
+        self.waits += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def acquire(self) -> float:
+        """Block until a request may start; return the seconds spent waiting."""
+
+        with self._cond:
+            delay = self._try_enter(time.monotonic())
+            if delay is None:
+                return 0.0
+            start = time.monotonic()
+            while delay is not None:
+                self._cond.wait(delay or None)
+                delay = self._try_enter(time.monotonic())
+            wait = time.monotonic() - start
+            self._waited(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Like :meth:`acquire`, but waits on the event loop."""
+
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        waited = False
+        while True:
+            event = None
+            with self._cond:
+                delay = self._try_enter(time.monotonic())
+                if delay is None:
+                    if not waited:
+                        return 0.0
+                    wait = time.monotonic() - start
+                    self._waited(wait)
+                    return wait
+                if not delay:
+                    event = asyncio.Event()
+                    self._async_waiters.append((loop, event))
+            waited = True
+            if event is None:
+                await asyncio.sleep(delay)
+            else:
+                await event.wait()
+
+    def release(self, latency: float, error: bool = False) -> None:
+        """Finish a request that took ``latency`` seconds."""
+
+        with self._cond:
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+            adaptive = self.adaptive
+            if adaptive is not None:
+                now = time.monotonic()
+                if error or latency > adaptive["target_latency"]:
+                    if now - self._last_decrease >= adaptive["target_latency"]:
+                        self.limit *= adaptive["decrease"]
+                        self._last_decrease = now
+                else:
+                    self.limit += 1 / max(self.limit, 1)
+                self._bound()
+            self._notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "limit": None if self.limit is math.inf else self.limit,
+                "requests": self.requests,
+                "errors": self.errors,
+                "waits": self.waits,
+                "wait_total": self.wait_total,
+                "wait_max": self.wait_max,
+            }
+
+
+class LimitRegistry:
+    """The limiters of a set of executors, one per backend."""
+
+    def __init__(self) -> None:
+        self._limiters: Dict[str, Limiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, key: str, limits: Optional[Dict[str, Any]] = None) -> Limiter:
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = Limiter(key)
+        if limits:
+            limiter.configure(limits)
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {l.key: l.stats() for l in limiters}
+
+
+_default_registry = LimitRegistry()
+
+
+def default_limit_registry() -> LimitRegistry:
+    """Return the registry shared by executors that are not given one."""
+
+    return _default_registry
+
+
+def backend_key(adapter: Dict[str, Any]) -> str:
+    """Identify the backend an adapter talks to."""
+
+    if adapter.get("type") == "python":
+        return f"python:{adapter.get('path')}:{adapter.get('function')}"
+    return str(adapter.get("url"))
@@ -1,9 +1,8 @@
 import json
 import re
-from collections.abc import Sequence
+from collections.abc import Mapping, Sequence
 from .ebnf import aissembly_ebnf
-from ..executor import Executor
-from ..util.find_functions import find_function_blocks_excluding_strings
+from .rewrite import call_sites, load_defs, next_index, rewrite_prompts, splice, statement_start
 
 from ..parser import (
     Program,
@@ -18,115 +17,101 @@ from ..parser import (
     WhileLoop,
     Cond,
     Boolean,
+    Node,
     parse_program,
 )
 
+_LEAVES = (str, int, float, bool, bytes)
+
 def find_key_with_path(obj, target_key, path=(), _seen=None):
-    """컨테이너(객체.__dict__, dict, list/tuple)를 재귀 탐색하며
-    target_key(예: 'prompt')를 찾으면 (path, value)를 yield."""
-    if _seen is None:
-        _seen = set()
-    oid = id(obj)
-    if oid in _seen:
-        return
-    _seen.add(oid)
-
-    # 1) dict: 키 직접 확인 + 값들 재귀
-    if isinstance(obj, dict):
-        if target_key in obj:
-            yield (path + (target_key,), obj[target_key])
-        for k, v in obj.items():
-            yield from find_key_with_path(v, target_key, path + (str(k),), _seen)
-
-    # 2) list/tuple 등 시퀀스: 인덱스로 재귀
-    elif isinstance(obj, Sequence) and not isinstance(obj, (str, bytes, bytearray)):
-        for i, v in enumerate(obj):
-            yield from find_key_with_path(v, target_key, path + (f'[{i}]',), _seen)
-
-    # 3) 일반 객체: __dict__로 재귀 (+ 해당 이름의 속성이면 반환)
-    elif hasattr(obj, "__dict__"):
-        d = obj.__dict__
-        if target_key in d:
-            yield (path + (target_key,), d[target_key])
-        for k, v in d.items():
-            yield from find_key_with_path(v, target_key, path + (k,), _seen)
-
-    # 리프면 종료
-    else:
-        return
-
-def accuracy_opt_passes_optimization(program_source, options) :
-    f = open(options.llm, 'r', encoding='utf-8')
-    llm_defs = f.read()
-    f.close()
-
-    _defs = json.loads(llm_defs)
-
-    ind = None
-
-    names = []
-
-    for n, item in enumerate(_defs) :
-        names.append(item['name'])
-        if item['name'] == 'accuracy_opt_passes' :
-            ind = n
-
-    executor = Executor(llm_defs=_defs)
+    """컨테이너(AST 노드의 slot, 객체.__dict__, dict, list/tuple)를 탐색하며
+    target_key(예: 'prompt')를 찾으면 (path, value)를 yield.
+
+    재귀 제너레이터 대신 명시적 스택을 써서 깊은 트리에서도 yield 비용이
+    깊이에 비례하지 않는다.  순환 검사는 현재 경로의 조상만 보므로,
+    hash_cons로 공유된 하위 트리는 나타나는 위치마다 탐색된다."""
+    ancestors = set(_seen or ())
+    stack = [(obj, path, False)]
+    while stack:
+        obj, path, leaving = stack.pop()
+        oid = id(obj)
+        if leaving:
+            ancestors.discard(oid)
+            continue
+        if oid in ancestors:
+            continue
 
-    ret = str(program_source)
-    
-    cnt = 0
+        # 1) AST 노드: slot 필드
+        if isinstance(obj, Node):
+            names = obj.__slots__
+            if target_key in names:
+                yield (path + (target_key,), getattr(obj, target_key))
+            children = [(f, getattr(obj, f)) for f in names]
+        # 2) list/tuple: 인덱스
+        elif isinstance(obj, (list, tuple)):
+            children = [(f'[{i}]', v) for i, v in enumerate(obj)]
+        # 3) dict: 키 직접 확인 + 값들
+        elif isinstance(obj, Mapping):
+            if target_key in obj:
+                yield (path + (target_key,), obj[target_key])
+            children = [(str(k), v) for k, v in obj.items()]
+        # 4) 그 밖의 시퀀스
+        elif isinstance(obj, Sequence) and not isinstance(obj, (str, bytes, bytearray)):
+            children = [(f'[{i}]', v) for i, v in enumerate(obj)]
+        # 5) 일반 객체: __dict__ (+ 해당 이름의 속성이면 반환)
+        elif hasattr(obj, "__dict__"):
+            if target_key in obj.__dict__:
+                yield (path + (target_key,), obj.__dict__[target_key])
+            children = list(obj.__dict__.items())
+        # 리프면 건너뜀
+        else:
+            continue
 
-    for full, name, params, span in find_function_blocks_excluding_strings(program_source, names) :
-        # ollama_chat(prompt="What is an essence of Philosophy?") /  ollama_chat /  prompt="What is an essence of Philosophy?" / (6, 61)
+        ancestors.add(oid)
+        stack.append((obj, path, True))
+        for k, v in reversed(children):
+            if v is not None and not isinstance(v, _LEAVES):
+                stack.append((v, path + (k,), False))
 
-        try :
-            pattern = re.compile(r'prompt\s*=\s*(.*?)(?:,|$)')
-            prompt = pattern.search(params).group(1).strip()
-        except Exception as e :
-            print(e)
-            continue
+def _accuracy_request(prompt):
+    return {
+        'system': 'You are a professional prompt engineer. Only to make the prompt more sophisticated. The GIVEN PROMPT is a part of Aissembly source code. Preserve the syntax of given text with following rule:' + aissembly_ebnf,
+        'prompt': '''Sophistically engineer the GIVEN PROMPT without omitting the smallest details of given conditions. Output nothing more than the prompt only. No explaination. Mind that this is only a prompt engineering, not answering the prompt. Only make the GIVEN PROMPT more sophisticated without omitting the given conditions. Output the formulation of string value in correct standard of Aissembly source code string syntax without using inline function.
+            GIVEN PROMPT: ''' + prompt
+    }
 
-        if prompt.endswith(' ') or prompt.endswith(',') or prompt.endswith(')') :
-            prompt = prompt[:len(prompt) - 1]
+def accuracy_opt_passes_optimization(program_source, options, defs=None, executor=None) :
+    _defs = defs if defs is not None else load_defs(options)
 
-        prompt = prompt.strip()
+    ret = str(program_source)
 
-        sentence = executor.call_llm(ind, args=[], kwargs={
-            'system': 'You are a professional prompt engineer. Only to make the prompt more sophisticated. The GIVEN PROMPT is a part of Aissembly source code. Preserve the syntax of given text with following rule:' + aissembly_ebnf,
-            'prompt': '''Sophistically engineer the GIVEN PROMPT without omitting the smallest details of given conditions. Output nothing more than the prompt only. No explaination. Mind that this is only a prompt engineering, not answering the prompt. Only make the GIVEN PROMPT more sophisticated without omitting the given conditions. Output the formulation of string value in correct standard of Aissembly source code string syntax without using inline function.
-            GIVEN PROMPT: ''' + prompt
-        })
+    # ollama_chat(prompt="What is an essence of Philosophy?") /  ollama_chat /  "What is an essence of Philosophy?" / (6, 61)
+    sites = call_sites(ret, _defs, strip_closing=True)
+    rewrites = rewrite_prompts('accuracy_opt_passes', _defs, [site.prompt for site in sites], _accuracy_request, options, executor)
 
-        total = []
+    cnt = next_index(ret, 'ACCURACY_OPT_')
+    edits = []
+
+    for site in sites :
+        sentence = rewrites[site.prompt]
 
         if sentence.strip() == '' : continue
-        
+
         # sentence = sentence.replace('"', '\\"')
 
-        replaced = str(full)
-        replaced = 'let ACCURACY_OPT_' + str(cnt) + ' = ' + replaced.replace(prompt, '"Question : " + ' + sentence) +';'
-        total.append(replaced)
+        name = 'ACCURACY_OPT_' + str(cnt)
         cnt = cnt + 1
-        
-        pos = None
-        try :
-            pos = ret.lfind(full)
-        except :
-            continue
 
-        enter_place = None
-        try :
-            enter_place = ret.lfind(';', pos)
-        except :
-            enter_place = 0
+        replaced = 'let ' + name + ' = ' + site.full.replace(site.prompt, '"Question : " + ' + sentence) + ';'
 
-        ret = ret.replace(full, 'ACCURACY_OPT_' + str(cnt - 1), 1)
-        ret = ret[:enter_place] + '\n' + '\n'.join(total) + '\n' + ret[enter_place:]
+        # The binding goes right before the top-level statement using it.
+        enter_place = statement_start(ret, site.span[0])
+        edits.append((enter_place, enter_place, replaced + '\n'))
+        edits.append((site.span[0], site.span[1], name))
 
-    print(ret)
-    return ret
+    ret = splice(ret, edits)
 
+    return ret
 
 
 '''
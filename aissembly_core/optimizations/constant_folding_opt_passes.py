@@ -0,0 +1,178 @@
+"""Constant folding and propagation over the AST.
+
+Operators are parsed into builtin calls (``1 + 2`` is ``Call("op.add", ...)``
+and ``-x`` is ``op.sub(0, x)``), so an expression built from literals is
+re-evaluated through the builtin table on every execution and loop iteration.
+This pass evaluates such calls once:
+
+- a call to a builtin that is not in ``SIDE_EFFECT_BUILTINS`` whose arguments
+  are all constant is replaced by its result when that result is a number,
+  string or boolean;
+- a ``Cond`` whose test is constant is replaced by the branch it selects;
+- a top-level ``let`` bound to a number, string or boolean is substituted into
+  later uses of the name until the name is bound again.  The ``let`` itself is
+  kept, so the final environment does not change.
+
+LLM calls are never folded.  A call that raises, or whose result is not a
+plain literal, is left for the executor so that errors still surface at run
+time.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+import math
+
+from ..executor import BUILTINS, SIDE_EFFECT_BUILTINS
+from ..parser import (
+    Program,
+    LetStmt,
+    Var,
+    Number,
+    String,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+    Boolean,
+)
+from ..resolver import FOR_NAMES, WHILE_NAMES
+
+# Strings and lists built while folding, such as ``op.mul("ab", n)`` or
+# ``[1] * n``, are capped so that a program cannot make the optimizer build an
+# arbitrarily large value.
+MAX_FOLDED_STRING = 4096
+
+_NO_VALUE = object()
+
+
+def _literal(value: Any) -> Any:
+    """Return the literal node for ``value``, or ``None`` if there is none."""
+
+    if isinstance(value, bool):
+        return Boolean(value)
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return Number(value)
+    if isinstance(value, str) and len(value) <= MAX_FOLDED_STRING:
+        return String(value)
+    return None
+
+
+def _value(node: Any) -> Any:
+    """Return the value of a constant node, or ``_NO_VALUE``.
+
+    List and dict literals count as constant when all their items are: each
+    evaluation builds a fresh container, so a pure builtin cannot observe the
+    difference.
+    """
+
+    if isinstance(node, (Number, String, Boolean)):
+        return node.value
+    if isinstance(node, ListLiteral):
+        items = [_value(e) for e in node.elements]
+        return _NO_VALUE if any(v is _NO_VALUE for v in items) else items
+    if isinstance(node, DictLiteral):
+        items = [(_value(k), _value(v)) for k, v in node.items]
+        if any(k is _NO_VALUE or v is _NO_VALUE for k, v in items):
+            return _NO_VALUE
+        try:
+            return dict(items)
+        except TypeError:
+            return _NO_VALUE
+    return _NO_VALUE
+
+
+def _too_large(name: str, args: List[Any]) -> bool:
+    """Whether ``name(*args)`` would build a sequence over the folding cap."""
+
+    if len(args) != 2:
+        return False
+    a, b = args
+    if name == "op.mul":
+        if isinstance(b, (str, list)):
+            a, b = b, a
+        return isinstance(a, (str, list)) and isinstance(b, int) and len(a) * b > MAX_FOLDED_STRING
+    if name in ("op.add", "op.concat"):
+        return isinstance(a, (str, list)) and isinstance(b, (str, list)) and len(a) + len(b) > MAX_FOLDED_STRING
+    return False
+
+
+def _fold_call(node: Call) -> Any:
+    if node.name not in BUILTINS or node.name in SIDE_EFFECT_BUILTINS:
+        return node
+    args = [_value(a) for a in node.args]
+    kwargs = {k: _value(v) for k, v in node.kwargs.items()}
+    if any(v is _NO_VALUE for v in args) or any(v is _NO_VALUE for v in kwargs.values()):
+        return node
+    if _too_large(node.name, args):
+        return node
+    try:
+        result = BUILTINS[node.name](*args, **kwargs)
+    except Exception:
+        return node
+    folded = _literal(result)
+    return node if folded is None else folded
+
+
+def fold_expr(node: Any, consts: Dict[str, Any]) -> Any:
+    """Fold ``node``, substituting the literal nodes in ``consts`` for names."""
+
+    if isinstance(node, Var):
+        return consts.get(node.name, node)
+    if isinstance(node, Call):
+        args = [fold_expr(a, consts) for a in node.args]
+        kwargs = {k: fold_expr(v, consts) for k, v in node.kwargs.items()}
+        return _fold_call(Call(node.name, args, kwargs))
+    if isinstance(node, ListLiteral):
+        return ListLiteral([fold_expr(e, consts) for e in node.elements])
+    if isinstance(node, DictLiteral):
+        return DictLiteral([(fold_expr(k, consts), fold_expr(v, consts)) for k, v in node.items])
+    if isinstance(node, Cond):
+        test = fold_expr(node.test, consts)
+        if isinstance(test, (Number, String, Boolean)):
+            return fold_expr(node.then if test.value else node.else_, consts)
+        return Cond(test, fold_expr(node.then, consts), fold_expr(node.else_, consts))
+    if isinstance(node, ForLoop):
+        inner = _shadow(consts, FOR_NAMES)
+        return ForLoop(
+            fold_expr(node.start, consts),
+            fold_expr(node.end, consts),
+            fold_expr(node.step, consts),
+            fold_expr(node.init, consts),
+            fold_expr(node.body, inner),
+        )
+    if isinstance(node, WhileLoop):
+        inner = _shadow(consts, WHILE_NAMES)
+        return WhileLoop(
+            fold_expr(node.test, inner),
+            fold_expr(node.init, consts),
+            fold_expr(node.body, inner),
+        )
+    return node
+
+
+def _shadow(consts: Dict[str, Any], names: Tuple[str, ...]) -> Dict[str, Any]:
+    if not any(n in consts for n in names):
+        return consts
+    return {k: v for k, v in consts.items() if k not in names}
+
+
+def constant_folding_opt_passes_optimization(program: Program, options: Any = None) -> Program:
+    """Return a copy of ``program`` with constant expressions folded."""
+
+    consts: Dict[str, Any] = {}
+    statements = []
+    for stmt in program.statements:
+        if isinstance(stmt, LetStmt):
+            expr = fold_expr(stmt.expr, consts)
+            if isinstance(expr, (Number, String, Boolean)):
+                consts[stmt.name] = expr
+            else:
+                consts.pop(stmt.name, None)
+            statements.append(LetStmt(stmt.name, expr))
+        else:
+            statements.append(fold_expr(stmt, consts))
+    return Program(statements)
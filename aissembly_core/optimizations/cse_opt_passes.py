@@ -0,0 +1,392 @@
+"""Common-subexpression elimination for repeated calls.
+
+Call subtrees are hash-consed into structural keys.  When the same pure call
+(a builtin without side effects, or an LLM function whose ``llm_functions.json``
+entry sets ``"pure": true``) appears more than once, it is evaluated once and
+the repeats read the result:
+
+- if the first occurrence is the whole right-hand side of ``let x = ...``,
+  later occurrences become ``x``;
+- otherwise a synthetic ``let _cseN = ...`` is inserted before the statement
+  holding the first occurrence, and every occurrence becomes ``_cseN``.  This
+  only happens when nothing evaluated before the call in that statement has
+  side effects (``assert``, ``print``, impure LLM calls...), since those
+  would otherwise run after it.  The names are reported so that runners can
+  leave them out of the resulting environment.
+
+The first occurrence must be evaluated unconditionally (not in a ``cond``
+branch or a loop body), so no call runs that would not have run before.
+Repeats are only replaced while the variables the call reads are not rebound,
+and never where a loop variable shadows one of them.  Programs that mutate
+values through ``push``/``set``/``op.append`` and friends are left alone unless
+every mutation targets the fresh accumulator of a loop, since a shared result
+could otherwise be changed behind a later use.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+from ..batching import MUTATING_BUILTINS
+from ..executor import BUILTINS, SIDE_EFFECT_BUILTINS, load_llm_defs
+from ..parser import (
+    Program,
+    LetStmt,
+    Var,
+    Number,
+    String,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+    Boolean,
+    Node,
+)
+from ..resolver import FOR_NAMES, WHILE_NAMES
+
+
+@dataclass
+class _Occurrence:
+    node: Call
+    stmt: int
+    conditional: bool
+    calls: int
+    llm_calls: int
+    free: FrozenSet[str]
+    shadowed: FrozenSet[str]
+
+
+@dataclass
+class _Info:
+    key: Any
+    free: FrozenSet[str] = frozenset()
+    calls: int = 0
+    llm_calls: int = 0
+
+
+@dataclass
+class _Walk:
+    pure_llm: Set[str]
+    occurrences: Dict[Any, List[_Occurrence]] = field(default_factory=dict)
+
+    def expr(self, node: Any, stmt: int, shadowed: FrozenSet[str], conditional: bool) -> _Info:
+        """Record the hoistable calls under ``node`` and return its key.
+
+        The key is ``None`` when ``node`` cannot be hoisted as a whole.
+        """
+
+        if isinstance(node, (Number, String, Boolean)):
+            return _Info((type(node).__name__, type(node.value).__name__, node.value))
+        if isinstance(node, Var):
+            return _Info(("Var", node.name), frozenset((node.name,)))
+        if isinstance(node, ListLiteral):
+            return self._combine("List", [self.expr(e, stmt, shadowed, conditional) for e in node.elements])
+        if isinstance(node, DictLiteral):
+            parts = []
+            for k, v in node.items:
+                parts.append(self.expr(k, stmt, shadowed, conditional))
+                parts.append(self.expr(v, stmt, shadowed, conditional))
+            return self._combine("Dict", parts)
+        if isinstance(node, Call):
+            parts = [self.expr(a, stmt, shadowed, conditional) for a in node.args]
+            names = sorted(node.kwargs)
+            parts += [self.expr(node.kwargs[k], stmt, shadowed, conditional) for k in names]
+            info = self._combine(("Call", node.name, len(node.args), tuple(names)), parts)
+            is_llm = node.name in self.pure_llm
+            pure = is_llm or (node.name in BUILTINS and node.name not in SIDE_EFFECT_BUILTINS)
+            if info.key is None or not pure:
+                return _Info(None)
+            info.calls += 1
+            info.llm_calls += is_llm
+            if not info.free & shadowed:
+                self.occurrences.setdefault(info.key, []).append(
+                    _Occurrence(node, stmt, conditional, info.calls, info.llm_calls, info.free, shadowed)
+                )
+            return info
+        if isinstance(node, Cond):
+            self.expr(node.test, stmt, shadowed, conditional)
+            self.expr(node.then, stmt, shadowed, True)
+            self.expr(node.else_, stmt, shadowed, True)
+            return _Info(None)
+        if isinstance(node, ForLoop):
+            for part in (node.start, node.end, node.step, node.init):
+                self.expr(part, stmt, shadowed, conditional)
+            self.expr(node.body, stmt, shadowed | frozenset(FOR_NAMES), True)
+            return _Info(None)
+        if isinstance(node, WhileLoop):
+            self.expr(node.init, stmt, shadowed, conditional)
+            inner = shadowed | frozenset(WHILE_NAMES)
+            self.expr(node.test, stmt, inner, conditional)
+            self.expr(node.body, stmt, inner, True)
+            return _Info(None)
+        return _Info(None)
+
+    @staticmethod
+    def _combine(tag: Any, parts: List[_Info]) -> _Info:
+        if any(p.key is None for p in parts):
+            return _Info(None)
+        free: FrozenSet[str] = frozenset().union(*(p.free for p in parts))
+        return _Info(
+            (tag, tuple(p.key for p in parts)),
+            free,
+            sum(p.calls for p in parts),
+            sum(p.llm_calls for p in parts),
+        )
+
+
+def _unsafe_mutation(node: Any, fresh_acc: bool) -> bool:
+    """Whether ``node`` mutates anything but a loop's freshly built ``acc``."""
+
+    if isinstance(node, Call):
+        if node.name in MUTATING_BUILTINS and node.args:
+            target = node.args[0]
+            if not (fresh_acc and isinstance(target, Var) and target.name == "acc"):
+                return True
+        return any(_unsafe_mutation(a, fresh_acc) for a in node.args) or any(
+            _unsafe_mutation(v, fresh_acc) for v in node.kwargs.values()
+        )
+    if isinstance(node, ListLiteral):
+        return any(_unsafe_mutation(e, fresh_acc) for e in node.elements)
+    if isinstance(node, DictLiteral):
+        return any(_unsafe_mutation(k, fresh_acc) or _unsafe_mutation(v, fresh_acc) for k, v in node.items)
+    if isinstance(node, Cond):
+        return any(_unsafe_mutation(p, fresh_acc) for p in (node.test, node.then, node.else_))
+    if isinstance(node, (ForLoop, WhileLoop)):
+        outer = (node.start, node.end, node.step, node.init) if isinstance(node, ForLoop) else (node.init,)
+        if any(_unsafe_mutation(p, fresh_acc) for p in outer):
+            return True
+        fresh = isinstance(node.init, (ListLiteral, DictLiteral))
+        inner = (node.body,) if isinstance(node, ForLoop) else (node.test, node.body)
+        return any(_unsafe_mutation(p, fresh) for p in inner)
+    return False
+
+
+def _replace(node: Any, targets: Dict[int, Any]) -> Any:
+    hit = targets.get(id(node))
+    if hit is not None:
+        return hit
+    if isinstance(node, Call):
+        return Call(
+            node.name,
+            [_replace(a, targets) for a in node.args],
+            {k: _replace(v, targets) for k, v in node.kwargs.items()},
+        )
+    if isinstance(node, ListLiteral):
+        return ListLiteral([_replace(e, targets) for e in node.elements])
+    if isinstance(node, DictLiteral):
+        return DictLiteral([(_replace(k, targets), _replace(v, targets)) for k, v in node.items])
+    if isinstance(node, Cond):
+        return Cond(_replace(node.test, targets), _replace(node.then, targets), _replace(node.else_, targets))
+    if isinstance(node, ForLoop):
+        return ForLoop(*(_replace(p, targets) for p in (node.start, node.end, node.step, node.init, node.body)))
+    if isinstance(node, WhileLoop):
+        return WhileLoop(_replace(node.test, targets), _replace(node.init, targets), _replace(node.body, targets))
+    return node
+
+
+def _names(node: Any, names: Set[str]) -> None:
+    if isinstance(node, Var):
+        names.add(node.name)
+    elif isinstance(node, Call):
+        for a in node.args:
+            _names(a, names)
+        for v in node.kwargs.values():
+            _names(v, names)
+    elif isinstance(node, ListLiteral):
+        for e in node.elements:
+            _names(e, names)
+    elif isinstance(node, DictLiteral):
+        for k, v in node.items:
+            _names(k, names)
+            _names(v, names)
+    elif isinstance(node, Cond):
+        for p in (node.test, node.then, node.else_):
+            _names(p, names)
+    elif isinstance(node, ForLoop):
+        for p in (node.start, node.end, node.step, node.init, node.body):
+            _names(p, names)
+    elif isinstance(node, WhileLoop):
+        for p in (node.test, node.init, node.body):
+            _names(p, names)
+
+
+def _evaluation_order(node: Any):
+    """Yield the nodes under ``node``, each after the nodes evaluated before it."""
+
+    if isinstance(node, Call):
+        for a in node.args:
+            yield from _evaluation_order(a)
+        for v in node.kwargs.values():
+            yield from _evaluation_order(v)
+    elif isinstance(node, ListLiteral):
+        for e in node.elements:
+            yield from _evaluation_order(e)
+    elif isinstance(node, DictLiteral):
+        for k, v in node.items:
+            yield from _evaluation_order(k)
+            yield from _evaluation_order(v)
+    elif isinstance(node, Cond):
+        for p in (node.test, node.then, node.else_):
+            yield from _evaluation_order(p)
+    elif isinstance(node, ForLoop):
+        for p in (node.start, node.end, node.step, node.init, node.body):
+            yield from _evaluation_order(p)
+    elif isinstance(node, WhileLoop):
+        for p in (node.init, node.test, node.body):
+            yield from _evaluation_order(p)
+    yield node
+
+
+def _effects_before(stmt: Any, target: Call, pure_llm: Set[str]) -> bool:
+    """Whether a call with side effects may run before ``target`` in ``stmt``."""
+
+    for node in _evaluation_order(_expr(stmt)):
+        if node is target:
+            return False
+        if isinstance(node, Call) and (
+            node.name in SIDE_EFFECT_BUILTINS or (node.name not in BUILTINS and node.name not in pure_llm)
+        ):
+            return True
+    return False
+
+
+def _expr(stmt: Any) -> Any:
+    return stmt.expr if isinstance(stmt, LetStmt) else stmt
+
+
+def _plan(
+    statements: List[Any], occurrences: List[_Occurrence], pure_llm: Set[str]
+) -> Optional[Tuple[_Occurrence, Optional[str], List[_Occurrence]]]:
+    """Choose where to evaluate a repeated call and which repeats to replace."""
+
+    for first in occurrences:
+        if first.conditional:
+            continue
+        head = statements[first.stmt]
+        name = head.name if isinstance(head, LetStmt) and head.expr is first.node else None
+        if name is None and _effects_before(head, first.node, pure_llm):
+            continue
+        replace = []
+        for stmt in range(first.stmt, len(statements)):
+            for o in occurrences:
+                if o.stmt != stmt or o is first:
+                    continue
+                if name is None:
+                    replace.append(o)
+                # A reused name is only bound once its statement has run, and
+                # a loop variable of the same name would hide it.
+                elif stmt > first.stmt and name not in o.shadowed:
+                    replace.append(o)
+            s = statements[stmt]
+            if isinstance(s, LetStmt) and (
+                s.name in first.free or (name is not None and stmt > first.stmt and s.name == name)
+            ):
+                break
+        if replace:
+            return first, name, replace
+    return None
+
+
+def _unshare(value: Any, seen: Set[int]) -> Any:
+    # Occurrences are replaced by identity, so a subtree shared by several
+    # parents (see ``parser.hash_cons``) is copied for each extra parent.
+    if isinstance(value, list):
+        return [_unshare(v, seen) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_unshare(v, seen) for v in value)
+    if isinstance(value, Mapping):
+        return {k: _unshare(v, seen) for k, v in value.items()} if value else value
+    if not isinstance(value, Node):
+        return value
+    parts = [_unshare(getattr(value, f), seen) for f in value.__slots__]
+    if id(value) not in seen:
+        seen.add(id(value))
+        if all(p is getattr(value, f) for p, f in zip(parts, value.__slots__)):
+            return value
+    return type(value)(*parts)
+
+
+def eliminate_common_subexpressions(
+    program: Program, pure_llm: Set[str]
+) -> Tuple[Program, int, int, List[str]]:
+    """Return ``program`` with repeated pure calls shared.
+
+    ``pure_llm`` names the LLM functions that may be shared.  Also returns the
+    number of call nodes removed, how many of them were LLM calls, and the
+    synthetic ``_cseN`` names that were bound.
+    """
+
+    if any(_unsafe_mutation(_expr(s), False) for s in program.statements):
+        return program, 0, 0, []
+    seen: Set[int] = set()
+    statements = [_unshare(s, seen) for s in program.statements]
+    used: Set[str] = {s.name for s in statements if isinstance(s, LetStmt)}
+    for s in statements:
+        _names(_expr(s), used)
+    counter = 0
+    removed = removed_llm = 0
+    bindings: List[str] = []
+    while True:
+        walk = _Walk(pure_llm)
+        for n, stmt in enumerate(statements):
+            walk.expr(_expr(stmt), n, frozenset(), False)
+        best = None
+        for occurrences in walk.occurrences.values():
+            if len(occurrences) < 2:
+                continue
+            plan = _plan(statements, occurrences, pure_llm)
+            if plan is None:
+                continue
+            first = plan[0]
+            rank = (first.calls, -first.stmt)
+            if best is None or rank > best[0]:
+                best = (rank, plan)
+        if best is None:
+            return Program(statements), removed, removed_llm, bindings
+
+        first, name, replace = best[1]
+        synthetic = name is None
+        if synthetic:
+            while f"_cse{counter}" in used:
+                counter += 1
+            name = f"_cse{counter}"
+            used.add(name)
+            bindings.append(name)
+            targets = {id(o.node): Var(name) for o in replace + [first]}
+        else:
+            targets = {id(o.node): Var(name) for o in replace}
+        removed += sum(o.calls for o in replace)
+        removed_llm += sum(o.llm_calls for o in replace)
+        statements = [
+            LetStmt(s.name, _replace(s.expr, targets)) if isinstance(s, LetStmt) else _replace(s, targets)
+            for s in statements
+        ]
+        if synthetic:
+            statements.insert(first.stmt, LetStmt(name, first.node))
+
+
+def cse_opt_passes_optimization(
+    program: Program,
+    options: Any = None,
+    llm_defs: Optional[Dict[str, Dict[str, Any]]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Program:
+    """Run :func:`eliminate_common_subexpressions` with the functions in ``llm_defs``.
+
+    Without ``llm_defs`` the definitions are loaded from ``options.llm`` when
+    set.  Removed call counts are added to ``stats`` under ``cse_removed_calls``
+    and ``cse_removed_llm_calls``, and the synthetic names to ``cse_bindings``.
+    """
+
+    if llm_defs is None:
+        path = getattr(options, "llm", None)
+        llm_defs = load_llm_defs(path) if path else {}
+    pure = {name for name, spec in llm_defs.items() if spec.get("pure") is True}
+    program, removed, removed_llm, bindings = eliminate_common_subexpressions(program, pure)
+    if stats is not None:
+        stats["cse_removed_calls"] = stats.get("cse_removed_calls", 0) + removed
+        stats["cse_removed_llm_calls"] = stats.get("cse_removed_llm_calls", 0) + removed_llm
+        stats["cse_bindings"] = stats.get("cse_bindings", []) + bindings
+    return program
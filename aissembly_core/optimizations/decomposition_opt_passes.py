@@ -1,88 +1,53 @@
-import json
-import re
-from collections.abc import Sequence
 from .ebnf import aissembly_ebnf
-from ..executor import Executor
-from ..util.find_functions import find_function_blocks_excluding_strings
+from .rewrite import call_sites, load_defs, next_index, rewrite_prompts, splice, statement_start
 
-def decomposition_opt_passes_optimization(program_source, options) :
-    f = open(options.llm, 'r', encoding='utf-8')
-    llm_defs = f.read()
-    f.close()
-
-    _defs = json.loads(llm_defs)
-
-    ind = None
-
-    names = []
-
-    for n, item in enumerate(_defs) :
-        names.append(item['name'])
-        if item['name'] == 'decomposition_opt_passes' :
-            ind = n
+def _decomposition_request(prompt):
+    return {
+        'system': 'You are a professional prompt engineer and a programmer. Only to make the prompt much more sophisticated. You follow the strict rule that not making syntax error by make appropriate use of positions of the operaters in the string that matter with the source code. The GIVEN PROMPT is a part of Aissembly source code. Preserve the syntax of given text with following rule:' + aissembly_ebnf,
+        'prompt': '''Split GIVEN PROMPT in several steps owning its answer from previous step without omitting the smallest details of given conditions. The prompts targets making answers better step-by-step without omitting the given conditions. Output of the engineered prompt only step by step in line by each line without omitting the given conditions. Output nothing more than the prompt only step by step in line by each lin without omitting the given conditionse. No step notation. No explaination. Only the prompts to be placed each in line without omitting the given conditions. Each prompts must not have to loose original attempt of GIVEN PROMPT. Output the formulation of string value in correct standard of Aissembly source code string syntax without using inline function.
+            GIVEN PROMPT: ''' + prompt
+    }
 
-    executor = Executor(llm_defs=_defs)
+def decomposition_opt_passes_optimization(program_source, options, defs=None, executor=None) :
+    _defs = defs if defs is not None else load_defs(options)
 
     ret = str(program_source)
-    
-    cnt = 0
 
-    for full, name, params, span in find_function_blocks_excluding_strings(program_source, names) :
-        # ollama_chat(prompt="What is an essence of Philosophy?") /  ollama_chat /  prompt="What is an essence of Philosophy?" / (6, 61)
+    # ollama_chat(prompt="What is an essence of Philosophy?") /  ollama_chat /  "What is an essence of Philosophy?" / (6, 61)
+    sites = call_sites(ret, _defs)
+    rewrites = rewrite_prompts('decomposition_opt_passes', _defs, [site.prompt for site in sites], _decomposition_request, options, executor)
 
-        try :
-            pattern = re.compile(r'prompt\s*=\s*(.*?)(?:,|$)')
-            prompt = pattern.search(params).group(1).strip()
-        except Exception as e :
-            print(e)
-            continue
+    cnt = next_index(ret, 'DECOMPOSITION_OPT_')
+    edits = []
 
-        prompt = prompt.strip()
+    for site in sites :
+        full = site.full
+        prompt = site.prompt
 
-        val = executor.call_llm(ind, args=[], kwargs={
-            'system': 'You are a professional prompt engineer and a programmer. Only to make the prompt much more sophisticated. You follow the strict rule that not making syntax error by make appropriate use of positions of the operaters in the string that matter with the source code. The GIVEN PROMPT is a part of Aissembly source code. Preserve the syntax of given text with following rule:' + aissembly_ebnf,
-            'prompt': '''Split GIVEN PROMPT in several steps owning its answer from previous step without omitting the smallest details of given conditions. The prompts targets making answers better step-by-step without omitting the given conditions. Output of the engineered prompt only step by step in line by each line without omitting the given conditions. Output nothing more than the prompt only step by step in line by each lin without omitting the given conditionse. No step notation. No explaination. Only the prompts to be placed each in line without omitting the given conditions. Each prompts must not have to loose original attempt of GIVEN PROMPT. Output the formulation of string value in correct standard of Aissembly source code string syntax without using inline function.
-            GIVEN PROMPT: ''' + prompt
-        })
-
-        val = val.replace('\n\n', '\n').split('\n')
+        val = rewrites[prompt].replace('\n\n', '\n').split('\n')
 
         before_sent = None
 
         total = []
 
-        n = None
-
-        for n, sentence in enumerate(val) :
+        for sentence in val :
             if sentence.strip() == '' : continue
             # sentence = sentence.replace('"', '\\"')
             if before_sent is None :
-                replaced = str(full)
-                replaced = 'let DECOMPOSITION_OPT_' + str(cnt) + ' = ' + replaced.replace(prompt, '"Question : " + ' + sentence) +';'
-                total.append(replaced)
-                cnt = cnt + 1
-                before_sent = sentence
+                replaced = 'let DECOMPOSITION_OPT_' + str(cnt) + ' = ' + full.replace(prompt, '"Question : " + ' + sentence) +';'
             else :
-                replaced = str(full)
-                replaced = 'let DECOMPOSITION_OPT_' + str(cnt) + ' = ' + replaced.replace(prompt, 'DECOMPOSITION_OPT_' + str(cnt-1) + ' + " Question : " + ' + sentence) +';'
-                total.append(replaced)
-                cnt = cnt + 1
-                before_sent = sentence
-        
-        pos = None
-        try :
-            pos = ret.lfind(full)
-        except :
-            continue
+                replaced = 'let DECOMPOSITION_OPT_' + str(cnt) + ' = ' + full.replace(prompt, 'DECOMPOSITION_OPT_' + str(cnt-1) + ' + " Question : " + ' + sentence) +';'
+            total.append(replaced)
+            cnt = cnt + 1
+            before_sent = sentence
+
+        if not total : continue
 
-        enter_place = None
-        try :
-            enter_place = ret.lfind(';', pos)
-        except :
-            enter_place = 0
+        # The bindings go right before the top-level statement using them.
+        enter_place = statement_start(ret, site.span[0])
+        edits.append((enter_place, enter_place, '\n'.join(total) + '\n'))
+        edits.append((site.span[0], site.span[1], 'DECOMPOSITION_OPT_' + str(cnt - 1)))
 
-        ret = ret.replace(full, 'DECOMPOSITION_OPT_' + str(cnt - 1), 1)
-        ret = ret[:enter_place] + '\n' + '\n'.join(total) + '\n' + ret[enter_place:]
+    ret = splice(ret, edits)
 
-    print(ret)
-    return ret
\ No newline at end of file
+    return ret
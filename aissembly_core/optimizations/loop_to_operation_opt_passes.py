@@ -0,0 +1,457 @@
+"""Closed forms for ``for`` loops with a linear accumulator.
+
+A loop ``for(range(a, b, s), init=x) -> body`` is replaced by an expression of
+``op.*`` calls computing its result without iterating when:
+
+- ``a``, ``b`` and ``s`` are integers known at compile time: literals, or
+  names bound by an earlier top-level ``let`` to one;
+- ``x`` is an integer expression: integer literals and names bound to integer
+  expressions, combined with ``+ - *``, ``abs``, ``min`` and ``max``;
+- ``body`` is ``c * acc + E`` in any arrangement of ``+``, ``-`` and ``*``,
+  where ``c`` is a compile-time integer and ``E`` is affine in ``i`` with
+  integer coefficients (``acc + i``, ``acc + k``, ``acc * 2``,
+  ``2 * acc - i + k``...);
+- or ``body`` counts: ``cond(test=P) -> acc + k1 ::else-> acc + k2`` (either
+  branch may be plain ``acc``) or ``acc + (if P ? k1 : k2)``, where ``P``
+  either compares ``i`` (or ``i % m``) with a compile-time integer, or does
+  not depend on ``i`` and ``acc`` at all.  In the second case the loop becomes
+  ``cond(test=P) -> ... ::else-> ...``.
+
+Under these rules every value involved is a Python ``int``, so the closed form
+is exact, and none of the expressions it evaluates once instead of ``n`` times
+can raise or have side effects.  A loop over an empty range becomes its
+``init``.  Powers ``c ** n`` larger than :data:`MAX_CLOSED_FORM_BITS` bits are
+left to the interpreter.  Rewritten loops are listed in
+``stats["loop_rewrites"]``.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from math import gcd
+from typing import Any, Callable, Dict, List, Optional
+import operator
+
+from ..executor import BUILTINS, SIDE_EFFECT_BUILTINS
+from ..parser import (
+    Program,
+    LetStmt,
+    Var,
+    Number,
+    String,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+    Boolean,
+    EMPTY_KWARGS,
+)
+
+MAX_CLOSED_FORM_BITS = 4096
+# Longest run of iterations evaluated at compile time: the period of an
+# ``i % m`` test, or the loop length of a ``c * acc + E(i)`` recurrence.
+MAX_UNROLL = 4096
+
+# Names known to hold an int, with the value when it is known at compile time.
+Ints = Dict[str, Optional[int]]
+
+_INT_CALLS = {"op.add": 2, "op.sub": 2, "op.mul": 2, "abs": 1}
+_COMPARE: Dict[str, Callable[[int, int], bool]] = {
+    "op.lt": operator.lt,
+    "op.le": operator.le,
+    "op.gt": operator.gt,
+    "op.ge": operator.ge,
+    "op.eq": operator.eq,
+    "op.neq": operator.ne,
+}
+_FLIP = {"op.lt": "op.gt", "op.le": "op.ge", "op.gt": "op.lt", "op.ge": "op.le", "op.eq": "op.eq", "op.neq": "op.neq"}
+
+
+def _is_int(node: Any, ints: Ints) -> bool:
+    """Whether ``node`` evaluates to an int without raising or side effects."""
+
+    if isinstance(node, Number):
+        return type(node.value) is int
+    if isinstance(node, Var):
+        return node.name in ints
+    if isinstance(node, Call) and not node.kwargs:
+        if node.name in ("min", "max"):
+            arity_ok = len(node.args) >= 2
+        else:
+            arity_ok = _INT_CALLS.get(node.name) == len(node.args)
+        return arity_ok and all(_is_int(a, ints) for a in node.args)
+    return False
+
+
+def _int_value(node: Any, ints: Ints) -> Optional[int]:
+    """The value of ``node`` if it is an int known at compile time."""
+
+    if isinstance(node, Number):
+        return node.value if type(node.value) is int else None
+    if isinstance(node, Var):
+        return ints.get(node.name)
+    if isinstance(node, Call) and node.name in ("op.add", "op.sub", "op.mul") and len(node.args) == 2 and not node.kwargs:
+        a, b = (_int_value(x, ints) for x in node.args)
+        if a is None or b is None:
+            return None
+        if node.name == "op.mul" and a.bit_length() + b.bit_length() > MAX_CLOSED_FORM_BITS:
+            return None
+        return BUILTINS[node.name](a, b)
+    return None
+
+
+def _pure(node: Any, bound: frozenset) -> bool:
+    """Whether ``node`` has no side effects and reads none of ``bound``."""
+
+    if isinstance(node, (Number, String, Boolean)):
+        return True
+    if isinstance(node, Var):
+        return node.name not in bound
+    if isinstance(node, Call):
+        return (
+            node.name in BUILTINS
+            and node.name not in SIDE_EFFECT_BUILTINS
+            and all(_pure(a, bound) for a in node.args)
+            and all(_pure(v, bound) for v in node.kwargs.values())
+        )
+    return False
+
+
+# --- building the closed form ---
+
+def _num(value: int) -> Number:
+    return Number(value)
+
+
+def _add(a: Any, b: Any) -> Any:
+    """``a + b``; ``None`` stands for zero."""
+
+    if a is None or (isinstance(a, Number) and a.value == 0):
+        return b
+    if b is None or (isinstance(b, Number) and b.value == 0):
+        return a
+    if isinstance(a, Number) and isinstance(b, Number):
+        return _num(a.value + b.value)
+    return Call("op.add", [a, b], EMPTY_KWARGS)
+
+
+def _neg(a: Any) -> Any:
+    if a is None:
+        return None
+    if isinstance(a, Number):
+        return _num(-a.value)
+    return Call("op.sub", [_num(0), a], EMPTY_KWARGS)
+
+
+def _mul(a: Any, b: Any) -> Any:
+    """``a * b`` for int expressions; ``None`` stands for zero."""
+
+    if a is None or b is None:
+        return None
+    if isinstance(a, Number) and isinstance(b, Number):
+        return _num(a.value * b.value)
+    for x, y in ((a, b), (b, a)):
+        if isinstance(x, Number):
+            if x.value == 0:
+                return None
+            if x.value == 1:
+                return y
+    return Call("op.mul", [a, b], EMPTY_KWARGS)
+
+
+def _sum(*terms: Any) -> Any:
+    total = None
+    for t in terms:
+        total = _add(total, t)
+    return total if total is not None else _num(0)
+
+
+@dataclass
+class _Linear:
+    """``acc * acc_coef + i * i_coef + const``; ``None`` coefficients are zero."""
+
+    acc: int
+    i: Any = None
+    const: Any = None
+
+
+def _linear(node: Any, invariant: Ints) -> Optional[_Linear]:
+    """Decompose a loop body; ``invariant`` are the int names other than ``i``."""
+
+    if isinstance(node, Var) and node.name == "acc":
+        return _Linear(1)
+    if isinstance(node, Var) and node.name == "i":
+        return _Linear(0, _num(1))
+    if _is_int(node, invariant):
+        return _Linear(0, None, node)
+    if not isinstance(node, Call) or node.kwargs or len(node.args) != 2:
+        return None
+    if node.name not in ("op.add", "op.sub", "op.mul"):
+        return None
+    u, v = (_linear(a, invariant) for a in node.args)
+    if u is None or v is None:
+        return None
+    if node.name == "op.add":
+        return _Linear(u.acc + v.acc, _add(u.i, v.i), _add(u.const, v.const))
+    if node.name == "op.sub":
+        return _Linear(u.acc - v.acc, _add(u.i, _neg(v.i)), _add(u.const, _neg(v.const)))
+    for x, y in ((u, v), (v, u)):
+        if x.acc == 0 and x.i is None:
+            factor = x.const
+            if y.acc == 0:
+                return _Linear(0, _mul(y.i, factor), _mul(y.const, factor))
+            value = _int_value(factor, invariant) if factor is not None else 0
+            if value is None:
+                return None
+            return _Linear(y.acc * value, _mul(y.i, factor), _mul(y.const, factor))
+    return None
+
+
+def _geometric(c: int, r: range) -> Optional[tuple]:
+    """``(c**n, sum(c**k for k < n), sum(c**(n-1-k) * r[k]))``; the last is
+    ``None`` when it would take too long to compute."""
+
+    n = len(r)
+    if abs(c) > 1 and n * abs(c).bit_length() > MAX_CLOSED_FORM_BITS:
+        return None
+    if c == 1:
+        return 1, n, n * (r[0] + r[-1]) // 2
+    p = c ** n
+    q = (p - 1) // (c - 1)
+    t = None
+    if n <= MAX_UNROLL:
+        t = 0
+        for v in r:
+            t = t * c + v
+    return p, q, t
+
+
+def _count(test: Any, r: range, ints: Ints) -> Optional[int]:
+    """Number of ``i`` in ``r`` for which ``test`` holds, or ``None``."""
+
+    if not isinstance(test, Call) or test.name not in _COMPARE or len(test.args) != 2 or test.kwargs:
+        return None
+    name = test.name
+    left, right = test.args
+    if _int_value(left, ints) is not None:
+        left, right, name = right, left, _FLIP[name]
+    k = _int_value(right, ints)
+    if k is None:
+        return None
+    compare = _COMPARE[name]
+    if isinstance(left, Var) and left.name == "i":
+        if name == "op.eq":
+            return int(k in r)
+        if name == "op.neq":
+            return len(r) - int(k in r)
+        # Monotone along the range: the matches are a prefix or a suffix.
+        first, last = compare(r[0], k), compare(r[-1], k)
+        if first == last:
+            return len(r) if first else 0
+        lo, hi = 0, len(r) - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if compare(r[mid], k) == first:
+                lo = mid
+            else:
+                hi = mid
+        return hi if first else len(r) - hi
+    if (
+        name in ("op.eq", "op.neq")
+        and isinstance(left, Call)
+        and left.name == "op.mod"
+        and len(left.args) == 2
+        and not left.kwargs
+        and isinstance(left.args[0], Var)
+        and left.args[0].name == "i"
+    ):
+        m = _int_value(left.args[1], ints)
+        if not m:
+            return None
+        period = abs(m) // gcd(abs(r.step), abs(m))
+        if period > MAX_UNROLL:
+            return None
+        full, rest = divmod(len(r), period)
+        hits = [compare(r[k2] % m, k) for k2 in range(min(period, len(r)))]
+        return full * sum(hits) + sum(hits[:rest])
+    return None
+
+
+def _branch(node: Any, invariant: Ints) -> Any:
+    """``k`` for a branch ``acc + k`` (``0`` for ``acc``), else ``False``."""
+
+    if isinstance(node, Var) and node.name == "acc":
+        return None
+    if isinstance(node, Call) and node.name in ("op.add", "op.sub") and len(node.args) == 2 and not node.kwargs:
+        a, b = node.args
+        if isinstance(a, Var) and a.name == "acc" and _is_int(b, invariant):
+            return b if node.name == "op.add" else _neg(b)
+        if node.name == "op.add" and isinstance(b, Var) and b.name == "acc" and _is_int(a, invariant):
+            return a
+    return False
+
+
+def _counting(body: Any, invariant: Ints) -> Optional[tuple]:
+    """``(test, k_then, k_else)`` for the counting shapes of a loop body."""
+
+    if isinstance(body, Cond):
+        k1, k2 = _branch(body.then, invariant), _branch(body.else_, invariant)
+        if k1 is False or k2 is False:
+            return None
+        return body.test, k1, k2
+    if isinstance(body, Call) and body.name in ("op.add", "op.sub") and len(body.args) == 2 and not body.kwargs:
+        a, b = body.args
+        if body.name == "op.add" and isinstance(a, Cond):
+            a, b = b, a
+        if isinstance(a, Var) and a.name == "acc" and isinstance(b, Cond):
+            if _is_int(b.then, invariant) and _is_int(b.else_, invariant):
+                if body.name == "op.sub":
+                    return b.test, _neg(b.then), _neg(b.else_)
+                return b.test, b.then, b.else_
+    return None
+
+
+def _mentions(node: Any, names: frozenset) -> bool:
+    if isinstance(node, Var):
+        return node.name in names
+    if isinstance(node, Call):
+        return any(_mentions(a, names) for a in node.args) or any(_mentions(v, names) for v in node.kwargs.values())
+    if isinstance(node, (ListLiteral,)):
+        return any(_mentions(e, names) for e in node.elements)
+    if isinstance(node, DictLiteral):
+        return any(_mentions(k, names) or _mentions(v, names) for k, v in node.items)
+    if isinstance(node, Cond):
+        return any(_mentions(x, names) for x in (node.test, node.then, node.else_))
+    # Loops rebind ``i``/``acc``; treat them as reading everything.
+    return isinstance(node, (ForLoop, WhileLoop))
+
+
+_LOOP_NAMES = frozenset(("i", "acc"))
+
+
+def _without(ints: Ints, names: frozenset) -> Ints:
+    if not any(n in ints for n in names):
+        return ints
+    return {k: v for k, v in ints.items() if k not in names}
+
+
+class _Rewriter:
+    def __init__(self) -> None:
+        self.rewrites: List[str] = []
+        self.label = ""
+
+    def expr(self, node: Any, ints: Ints) -> Any:
+        if isinstance(node, Call):
+            args = [self.expr(a, ints) for a in node.args]
+            kwargs = {k: self.expr(v, ints) for k, v in node.kwargs.items()}
+            if all(x is y for x, y in zip(args, node.args)) and all(kwargs[k] is v for k, v in node.kwargs.items()):
+                return node
+            return Call(node.name, args, kwargs if kwargs else EMPTY_KWARGS)
+        if isinstance(node, ListLiteral):
+            elements = [self.expr(e, ints) for e in node.elements]
+            if all(x is y for x, y in zip(elements, node.elements)):
+                return node
+            return ListLiteral(elements)
+        if isinstance(node, DictLiteral):
+            items = [(self.expr(k, ints), self.expr(v, ints)) for k, v in node.items]
+            if all(a is c and b is d for (a, b), (c, d) in zip(items, node.items)):
+                return node
+            return DictLiteral(items)
+        if isinstance(node, Cond):
+            parts = [self.expr(x, ints) for x in (node.test, node.then, node.else_)]
+            if all(x is y for x, y in zip(parts, (node.test, node.then, node.else_))):
+                return node
+            return Cond(*parts)
+        if isinstance(node, WhileLoop):
+            inner = _without(ints, frozenset(("acc",)))
+            parts = [self.expr(node.test, inner), self.expr(node.init, ints), self.expr(node.body, inner)]
+            if all(x is y for x, y in zip(parts, (node.test, node.init, node.body))):
+                return node
+            return WhileLoop(*parts)
+        if isinstance(node, ForLoop):
+            inner = dict(_without(ints, _LOOP_NAMES), i=None)
+            parts = [self.expr(x, ints) for x in (node.start, node.end, node.step, node.init)]
+            body = self.expr(node.body, inner)
+            if not (all(x is y for x, y in zip(parts, (node.start, node.end, node.step, node.init))) and body is node.body):
+                node = ForLoop(*parts, body)
+            closed = self.loop(node, ints, inner)
+            return node if closed is None else closed
+        return node
+
+    def loop(self, node: ForLoop, ints: Ints, inner: Ints) -> Any:
+        bounds = [_int_value(x, ints) for x in (node.start, node.end, node.step)]
+        if None in bounds or bounds[2] == 0:
+            return None
+        r = range(*bounds)
+        if len(r) == 0:
+            return self._done(node.init, "empty range")
+        if not _is_int(node.init, ints):
+            return None
+        invariant = _without(inner, frozenset(("i",)))
+        lin = _linear(node.body, invariant)
+        if lin is not None:
+            sums = _geometric(lin.acc, r)
+            if sums is None or (lin.i is not None and sums[2] is None):
+                return None
+            p, q, t = sums
+            kind = "arithmetic" if lin.acc == 1 else "geometric"
+            closed = _sum(_mul(node.init, _num(p)), _mul(lin.i, _num(t) if t is not None else None), _mul(lin.const, _num(q)))
+            return self._done(closed, f"{kind} progression over {len(r)} iterations")
+        counting = _counting(node.body, invariant)
+        if counting is None:
+            return None
+        test, k1, k2 = counting
+        if _mentions(test, frozenset(("acc",))):
+            return None
+        if not _mentions(test, frozenset(("i",))):
+            if not _pure(test, _LOOP_NAMES):
+                return None
+            n = _num(len(r))
+            closed = Cond(test, _sum(node.init, _mul(k1, n)), _sum(node.init, _mul(k2, n)))
+            return self._done(closed, f"loop-invariant test over {len(r)} iterations")
+        hits = _count(test, r, ints)
+        if hits is None:
+            return None
+        closed = _sum(node.init, _mul(k1, _num(hits)), _mul(k2, _num(len(r) - hits)))
+        return self._done(closed, f"count over {len(r)} iterations")
+
+    def _done(self, closed: Any, what: str) -> Any:
+        self.rewrites.append(f"{self.label}: {what}")
+        return closed
+
+
+def rewrite_loops(program: Program) -> tuple:
+    """Return ``program`` with closed-form loops and a description of each rewrite."""
+
+    rewriter = _Rewriter()
+    ints: Ints = {}
+    statements = []
+    for n, stmt in enumerate(program.statements):
+        if isinstance(stmt, LetStmt):
+            rewriter.label = f"let {stmt.name}"
+            expr = rewriter.expr(stmt.expr, ints)
+            if _is_int(expr, ints):
+                ints[stmt.name] = _int_value(expr, ints)
+            else:
+                ints.pop(stmt.name, None)
+            statements.append(stmt if expr is stmt.expr else LetStmt(stmt.name, expr))
+        else:
+            rewriter.label = f"statement {n + 1}"
+            statements.append(rewriter.expr(stmt, ints))
+    if not rewriter.rewrites:
+        return program, []
+    return Program(statements), rewriter.rewrites
+
+
+def loop_to_operation_opt_passes_optimization(
+    program: Program,
+    options: Any = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Program:
+    """Run :func:`rewrite_loops`; rewrites are added to ``stats["loop_rewrites"]``."""
+
+    program, rewrites = rewrite_loops(program)
+    if stats is not None and rewrites:
+        stats.setdefault("loop_rewrites", []).extend(rewrites)
+    return program
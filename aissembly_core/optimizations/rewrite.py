@@ -0,0 +1,154 @@
+"""Shared machinery of the LLM-driven prompt rewriting passes.
+
+The accuracy and decomposition passes ask a model to rewrite the ``prompt=``
+argument of every LLM call site.  This module collects the call sites in one
+scan, sends the rewrite requests for all distinct prompts concurrently (up to
+``options.opt_concurrency``, default 8) and memoizes each rewrite by pass,
+model, instructions and prompt text.  With ``options.cache_dir`` set (the
+CLI's ``--cache-dir``) the memo is an :class:`~aissembly_core.cache.LLMCache`
+in its ``rewrites`` subdirectory, so unchanged prompts are not rewritten
+again by later runs; otherwise it lasts for the process.  :func:`splice`
+applies all edits to the source in a single pass.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+
+from ..cache import MISS, LLMCache, cache_key
+from ..executor import Executor
+from ..util.find_functions import find_function_blocks_excluding_strings
+
+DEFAULT_OPT_CONCURRENCY = 8
+
+_PROMPT = re.compile(r'prompt\s*=\s*(.*?)(?:,|$)')
+
+_stores: Dict[Any, LLMCache] = {}
+_stores_lock = threading.Lock()
+
+
+@dataclass
+class CallSite:
+    full: str
+    name: str
+    prompt: str
+    span: Tuple[int, int]
+
+
+def load_defs(options: Any) -> Dict[str, Dict[str, Any]]:
+    with open(options.llm, 'r', encoding='utf-8') as f:
+        return {item['name']: item for item in json.load(f)}
+
+
+def call_sites(source: str, names: Iterable[str], strip_closing: bool = False) -> List[CallSite]:
+    """Return the calls to ``names`` in ``source`` that pass a ``prompt=``."""
+
+    sites = []
+    for full, name, params, span in find_function_blocks_excluding_strings(source, list(names)):
+        match = _PROMPT.search(params)
+        if match is None:
+            continue
+        prompt = match.group(1).strip()
+        if strip_closing and prompt.endswith((' ', ',', ')')):
+            prompt = prompt[:-1]
+        sites.append(CallSite(full, name, prompt.strip(), span))
+    return sites
+
+
+def rewrite_store(options: Any) -> LLMCache:
+    cache_dir = getattr(options, 'cache_dir', None)
+    path = os.path.join(cache_dir, 'rewrites') if cache_dir else None
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = LLMCache(path)
+        return store
+
+
+def rewrite_prompts(
+    pass_name: str,
+    defs: Dict[str, Dict[str, Any]],
+    prompts: Iterable[str],
+    request: Callable[[str], Dict[str, Any]],
+    options: Any,
+    executor: Optional[Executor] = None,
+) -> Dict[str, str]:
+    """Rewrite each distinct prompt with the LLM function ``pass_name``.
+
+    ``request(prompt)`` builds the keyword arguments of the call.  Returns the
+    model output for every prompt.  ``executor`` defaults to a new silent
+    executor over ``defs``.
+    """
+
+    store = rewrite_store(options)
+    model = defs[pass_name].get('model')
+    # The instructions are part of the key, so editing them invalidates the memo.
+    instructions = request('')
+    results: Dict[str, str] = {}
+    todo: List[Tuple[str, str]] = []
+    for prompt in dict.fromkeys(prompts):
+        key = cache_key(pass_name, model, instructions, prompt)
+        value = store.get(key)
+        if value is MISS:
+            todo.append((prompt, key))
+        else:
+            results[prompt] = value
+    if not todo:
+        return results
+
+    if executor is None:
+        executor = Executor(llm_defs=defs, on_token=None)
+
+    def one(item: Tuple[str, str]) -> str:
+        prompt, key = item
+        value = executor.call_llm(pass_name, [], request(prompt))
+        store.set(key, value)
+        return value
+
+    workers = max(1, min(getattr(options, 'opt_concurrency', DEFAULT_OPT_CONCURRENCY), len(todo)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (prompt, _), value in zip(todo, pool.map(one, todo)):
+            results[prompt] = value
+    return results
+
+
+def statement_start(source: str, pos: int) -> int:
+    """Return the offset of the line opening the top-level statement at ``pos``."""
+
+    start = source.rfind('\n', 0, pos) + 1
+    while start > 0:
+        end = source.find('\n', start)
+        line = source[start:] if end < 0 else source[start:end]
+        if line.strip() and not line[0].isspace():
+            break
+        start = source.rfind('\n', 0, start - 1) + 1
+    return start
+
+
+def next_index(source: str, prefix: str) -> int:
+    """Return the first ``n`` such that no ``{prefix}{m}`` with ``m >= n`` is in ``source``."""
+
+    found = [int(m) for m in re.findall(re.escape(prefix) + r'(\d+)', source)]
+    return max(found) + 1 if found else 0
+
+
+def splice(source: str, edits: List[Tuple[int, int, str]]) -> str:
+    """Replace ``source[start:end]`` by ``text`` for every edit at once.
+
+    Edits must not overlap; insertions (``start == end``) at the same offset
+    keep their order and come before a replacement starting there.
+    """
+
+    out = []
+    last = 0
+    for start, end, text in sorted(edits, key=lambda e: (e[0], e[1])):
+        out.append(source[last:start])
+        out.append(text)
+        last = end
+    out.append(source[last:])
+    return ''.join(out)
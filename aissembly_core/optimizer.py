@@ -1,30 +1,168 @@
+"""Optimization passes over the program AST.
+
+:class:`PassManager` runs the registered passes in order.  Each pass runs up
+to the number of iterations named by its option (for example
+``options.constant_folding_opt_passes``) and stops early once an iteration
+leaves the program unchanged.  Passes share a :class:`PassContext` that loads
+the LLM definitions, builds an executor and keeps caches once per run instead
+of once per pass.  Only passes that rewrite source text (``needs_source``)
+unparse the program, and a text pass whose output equals its input is not
+reparsed.  The duration and outcome of every iteration are recorded in
+:attr:`PassManager.records`.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import time
+
 from .optimizations.accuracy_opt_passes import accuracy_opt_passes_optimization
 from .optimizations.decomposition_opt_passes import decomposition_opt_passes_optimization
 from .optimizations.integration_opt_passes import integration_opt_passes_optimization
+from .optimizations.constant_folding_opt_passes import constant_folding_opt_passes_optimization
+from .optimizations.cse_opt_passes import cse_opt_passes_optimization
+from .optimizations.loop_to_operation_opt_passes import loop_to_operation_opt_passes_optimization
+from . import tracing
+from .executor import Executor, load_llm_defs
 from .unparser import program_to_source
-from .parser import parse_program
+from .parser import IncrementalParser, Program, get_parser
+
+# "[EBNF of Aissembly Language]\n(* =========================================================\n   Aissembly Language \u2014 Minimal Formal Grammar (EBNF)\n   Terminals are in \"double quotes\". {} = zero or more,\n   [] = optional, | = alternation, () = grouping.\n   ========================================================= *)\n\nprogram        = { statement } ;\n\n(* ---------- Statements ---------- *)\nstatement      = var_assign\n               | aug_assign\n               | fn_def\n               | if_stmt\n               | while_stmt\n               | for_in_stmt\n               | return_stmt\n               | expr_stmt\n               ;\n\nvar_assign     = identifier \"=\" expression ;\naug_op         = \"+=\" | \"-=\" | \"*=\" | \"/=\" | \"%=\" ;\naug_assign     = identifier aug_op expression ;\n\nfn_def         = \"fn\" identifier \"(\" [ param_list ] \")\" block ;\nparam_list     = identifier { \",\" identifier } ;\n\nif_stmt        = \"if\" expression block [ \"else\" block ] ;\nwhile_stmt     = \"while\" expression block ;\nfor_in_stmt    = \"for\" identifier \"in\" expression block ;\n\nreturn_stmt    = \"return\" [ expression ] ;\nexpr_stmt      = expression ;\n\nblock          = \"{\" { statement } \"}\" ;\n\n(* ---------- Expressions (precedence: low \u2192 high) ---------- *)\nexpression     = or_expr ;\n\nor_expr        = and_expr { \"or\" and_expr } ;\nand_expr       = not_expr { \"and\" not_expr } ;\nnot_expr       = [ \"not\" ] compare_expr ;\n\ncompare_expr   = membership_expr\n                 { comp_op membership_expr } ;\ncomp_op        = \"==\" | \"!=\" | \"<\" | \">\" | \"<=\" | \">=\" ;\n\nmembership_expr = additive_expr\n                  { \"in\" additive_expr } ;\n\nadditive_expr  = multiplicative_expr\n                 { (\"+\" | \"-\") multiplicative_expr } ;\n\nmultiplicative_expr\n               = unary_expr { (\"*\" | \"/\" | \"%\") unary_expr } ;\n\nunary_expr     = [ (\"+\" | \"-\" ) ] postfix_expr ;\n\npostfix_expr   = primary_expr\n                 { call_suffix\n                 | index_suffix\n                 | member_suffix\n                 } ;\n\ncall_suffix    = \"(\" [ arg_list ] \")\" ;\narg_list       = expression { \",\" expression } ;\n\nindex_suffix   = \"[\" expression \"]\" ;\nmember_suffix  = \".\" identifier ;\n\nprimary_expr   = literal\n               | identifier\n               | list_lit\n               | dict_lit\n               | \"(\" expression \")\"\n               ;\n\n(* ---------- Literals ---------- *)\nliteral        = number | string | boolean | null ;\n\nlist_lit       = \"[\" [ expression { \",\" expression } [ \",\" ] ] \"]\" ;\n\ndict_lit       = \"{\"\n                   [ dict_entry { \",\" dict_entry } [ \",\" ] ]\n                 \"}\" ;\ndict_entry     = dict_key \":\" expression ;\ndict_key       = identifier | string ;\n\nboolean        = \"true\" | \"false\" ;\nnull           = \"null\" ;\n\n(* ---------- Lexical ---------- *)\nidentifier     = ident_start { ident_part } ;\nident_start    = letter | \"_\" ;\nident_part     = letter | digit | \"_\" ;\n\nnumber         = int | float ;\nint            = digit { digit } ;\nfloat          = int \".\" digit { digit } [ exp ] | \".\" digit { digit } [ exp ] | int exp ;\nexp            = (\"e\" | \"E\") [ \"+\" | \"-\" ] digit { digit } ;\n\nstring         = dq_string | sq_string ;\ndq_string      = \"\"\" { dq_char } \"\"\" ;\nsq_string      = \"'\"  { sq_char } \"'\"  ;\n\nletter         = \"A\" | ... | \"Z\" | \"a\" | ... | \"z\" ;\ndigit          = \"0\" | \"1\" | \"2\" | \"3\" | \"4\" | \"5\" | \"6\" | \"7\" | \"8\" | \"9\" ;\n\n(* ---------- Trivia (ignored by parser) ---------- *)\nwhitespace     = { \" \" | \"\t\" | \"\r\" | \"\n\" } ;\ncomment        = \"#\" { any_char_except_newline } ( \"\n\" | EOF ) ;\n\n(* The lexer should skip whitespace and comments between tokens.\n   Statements are separated by newlines or block delimiters; semicolons are optional. *)\n\n(* ---------- Reserved Words ---------- *)\n(* \"fn\", \"if\", \"else\", \"while\", \"for\", \"in\",\n   \"return\", \"and\", \"or\", \"not\",\n   \"true\", \"false\", \"null\" are reserved and cannot be identifiers. *)"
+
+
+class PassContext:
+    """State shared by the passes of one optimizer run."""
+
+    def __init__(self, options: Any, stats: Optional[Dict[str, Any]] = None, llm_defs: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.options = options
+        self.stats = stats if stats is not None else {}
+        # Scratch space for passes that keep state across iterations.
+        self.caches: Dict[str, Any] = {}
+        self._llm_defs = llm_defs
+        self._executor: Optional[Executor] = None
+        self._source: Optional[tuple] = None
+
+    @property
+    def llm_defs(self) -> Dict[str, Dict[str, Any]]:
+        """LLM definitions from ``options.llm``, loaded on first use."""
+
+        if self._llm_defs is None:
+            path = getattr(self.options, "llm", None)
+            self._llm_defs = load_llm_defs(path) if path else {}
+        return self._llm_defs
+
+    @property
+    def executor(self) -> Executor:
+        """An executor over :attr:`llm_defs` for passes that call models."""
+
+        if self._executor is None:
+            self._executor = Executor(llm_defs=self.llm_defs, on_token=None)
+        return self._executor
+
+    def source(self, program: Program) -> str:
+        if self._source is None or self._source[0] is not program:
+            self._source = (program, program_to_source(program))
+        return self._source[1]
+
+    def parse(self, source: str) -> Program:
+        program = IncrementalParser(source, get_parser(getattr(self.options, "parser_cache_dir", None))).program
+        self._source = (program, source)
+        return program
+
+
+@dataclass
+class Pass:
+    name: str
+    # Attribute of the options holding the maximum number of iterations.
+    option: str
+    run: Callable[[Program, PassContext], Program]
+    needs_source: bool = False
+
+
+@dataclass
+class PassRecord:
+    name: str
+    iteration: int
+    seconds: float
+    changed: bool
+
+
+def text_pass(name: str, option: str, rewrite: Callable[..., str]) -> Pass:
+    """Wrap ``rewrite(source, options, defs=..., executor=...)`` as a pass."""
 
-def _identity(program):
+    def run(program: Program, ctx: PassContext) -> Program:
+        source = ctx.source(program)
+        out = rewrite(source, ctx.options, defs=ctx.llm_defs, executor=ctx.executor)
+        return program if out == source else ctx.parse(out)
+
+    return Pass(name, option, run, needs_source=True)
+
+
+def _identity(program, ctx=None):
     """Placeholder optimization that returns the program unchanged."""
     return program
 
-# "[EBNF of Aissembly Language]\n(* =========================================================\n   Aissembly Language \u2014 Minimal Formal Grammar (EBNF)\n   Terminals are in \"double quotes\". {} = zero or more,\n   [] = optional, | = alternation, () = grouping.\n   ========================================================= *)\n\nprogram        = { statement } ;\n\n(* ---------- Statements ---------- *)\nstatement      = var_assign\n               | aug_assign\n               | fn_def\n               | if_stmt\n               | while_stmt\n               | for_in_stmt\n               | return_stmt\n               | expr_stmt\n               ;\n\nvar_assign     = identifier \"=\" expression ;\naug_op         = \"+=\" | \"-=\" | \"*=\" | \"/=\" | \"%=\" ;\naug_assign     = identifier aug_op expression ;\n\nfn_def         = \"fn\" identifier \"(\" [ param_list ] \")\" block ;\nparam_list     = identifier { \",\" identifier } ;\n\nif_stmt        = \"if\" expression block [ \"else\" block ] ;\nwhile_stmt     = \"while\" expression block ;\nfor_in_stmt    = \"for\" identifier \"in\" expression block ;\n\nreturn_stmt    = \"return\" [ expression ] ;\nexpr_stmt      = expression ;\n\nblock          = \"{\" { statement } \"}\" ;\n\n(* ---------- Expressions (precedence: low \u2192 high) ---------- *)\nexpression     = or_expr ;\n\nor_expr        = and_expr { \"or\" and_expr } ;\nand_expr       = not_expr { \"and\" not_expr } ;\nnot_expr       = [ \"not\" ] compare_expr ;\n\ncompare_expr   = membership_expr\n                 { comp_op membership_expr } ;\ncomp_op        = \"==\" | \"!=\" | \"<\" | \">\" | \"<=\" | \">=\" ;\n\nmembership_expr = additive_expr\n                  { \"in\" additive_expr } ;\n\nadditive_expr  = multiplicative_expr\n                 { (\"+\" | \"-\") multiplicative_expr } ;\n\nmultiplicative_expr\n               = unary_expr { (\"*\" | \"/\" | \"%\") unary_expr } ;\n\nunary_expr     = [ (\"+\" | \"-\" ) ] postfix_expr ;\n\npostfix_expr   = primary_expr\n                 { call_suffix\n                 | index_suffix\n                 | member_suffix\n                 } ;\n\ncall_suffix    = \"(\" [ arg_list ] \")\" ;\narg_list       = expression { \",\" expression } ;\n\nindex_suffix   = \"[\" expression \"]\" ;\nmember_suffix  = \".\" identifier ;\n\nprimary_expr   = literal\n               | identifier\n               | list_lit\n               | dict_lit\n               | \"(\" expression \")\"\n               ;\n\n(* ---------- Literals ---------- *)\nliteral        = number | string | boolean | null ;\n\nlist_lit       = \"[\" [ expression { \",\" expression } [ \",\" ] ] \"]\" ;\n\ndict_lit       = \"{\"\n                   [ dict_entry { \",\" dict_entry } [ \",\" ] ]\n                 \"}\" ;\ndict_entry     = dict_key \":\" expression ;\ndict_key       = identifier | string ;\n\nboolean        = \"true\" | \"false\" ;\nnull           = \"null\" ;\n\n(* ---------- Lexical ---------- *)\nidentifier     = ident_start { ident_part } ;\nident_start    = letter | \"_\" ;\nident_part     = letter | digit | \"_\" ;\n\nnumber         = int | float ;\nint            = digit { digit } ;\nfloat          = int \".\" digit { digit } [ exp ] | \".\" digit { digit } [ exp ] | int exp ;\nexp            = (\"e\" | \"E\") [ \"+\" | \"-\" ] digit { digit } ;\n\nstring         = dq_string | sq_string ;\ndq_string      = \"\"\" { dq_char } \"\"\" ;\nsq_string      = \"'\"  { sq_char } \"'\"  ;\n\nletter         = \"A\" | ... | \"Z\" | \"a\" | ... | \"z\" ;\ndigit          = \"0\" | \"1\" | \"2\" | \"3\" | \"4\" | \"5\" | \"6\" | \"7\" | \"8\" | \"9\" ;\n\n(* ---------- Trivia (ignored by parser) ---------- *)\nwhitespace     = { \" \" | \"\t\" | \"\r\" | \"\n\" } ;\ncomment        = \"#\" { any_char_except_newline } ( \"\n\" | EOF ) ;\n\n(* The lexer should skip whitespace and comments between tokens.\n   Statements are separated by newlines or block delimiters; semicolons are optional. *)\n\n(* ---------- Reserved Words ---------- *)\n(* \"fn\", \"if\", \"else\", \"while\", \"for\", \"in\",\n   \"return\", \"and\", \"or\", \"not\",\n   \"true\", \"false\", \"null\" are reserved and cannot be identifiers. *)"
 
-def optimizer(program, options) :
-    for _ in range(options.decomposition_opt_passes):
-        ret = decomposition_opt_passes_optimization(program_to_source(program), options)
-        program = parse_program(ret, options)
-    for _ in range(options.accuracy_opt_passes):
-        ret = accuracy_opt_passes_optimization(program_to_source(program), options)
-        program = parse_program(ret, options)
-    for _ in range(options.integration_opt_passes):
-        # program = parse_program(integration_opt_passes_optimization(program_to_source(program), options), options)
-        pass
-    for _ in range(options.loop_to_operation_opt_passes):
-        program = _identity(program)
-    for _ in range(options.operation_to_loop_opt_passes):
-        program = _identity(program)
-    for _ in range(options.condition_to_operation_opt_passes):
-        program = _identity(program)
-
-    return program
\ No newline at end of file
+def _integration(program, ctx):
+    # program = parse_program(integration_opt_passes_optimization(program_to_source(program), options), options)
+    return program
+
+
+def _loop_to_operation(program, ctx):
+    return loop_to_operation_opt_passes_optimization(program, ctx.options, stats=ctx.stats)
+
+
+def _constant_folding(program, ctx):
+    return constant_folding_opt_passes_optimization(program, ctx.options)
+
+
+def _cse(program, ctx):
+    return cse_opt_passes_optimization(program, ctx.options, llm_defs=ctx.llm_defs, stats=ctx.stats)
+
+
+DEFAULT_PASSES = [
+    text_pass("decomposition", "decomposition_opt_passes", decomposition_opt_passes_optimization),
+    text_pass("accuracy", "accuracy_opt_passes", accuracy_opt_passes_optimization),
+    Pass("integration", "integration_opt_passes", _integration),
+    Pass("loop_to_operation", "loop_to_operation_opt_passes", _loop_to_operation),
+    Pass("operation_to_loop", "operation_to_loop_opt_passes", _identity),
+    Pass("condition_to_operation", "condition_to_operation_opt_passes", _identity),
+    Pass("constant_folding", "constant_folding_opt_passes", _constant_folding),
+    Pass("cse", "cse_opt_passes", _cse),
+]
+
+
+class PassManager:
+    def __init__(self, passes: Optional[List[Pass]] = None):
+        self.passes = list(DEFAULT_PASSES if passes is None else passes)
+        self.records: List[PassRecord] = []
+
+    def register(self, pass_: Pass, before: Optional[str] = None) -> None:
+        """Add ``pass_``, at the end or in front of the pass named ``before``."""
+
+        if before is None:
+            self.passes.append(pass_)
+            return
+        names = [p.name for p in self.passes]
+        self.passes.insert(names.index(before), pass_)
+
+    def run(self, program: Program, options: Any, stats: Optional[Dict[str, Any]] = None, context: Optional[PassContext] = None) -> Program:
+        ctx = context or PassContext(options, stats)
+        tracer = tracing.active()
+        for pass_ in self.passes:
+            for iteration in range(getattr(options, pass_.option, 0)):
+                start = time.perf_counter()
+                result = pass_.run(program, ctx)
+                changed = result is not program and result != program
+                end = time.perf_counter()
+                self.records.append(PassRecord(pass_.name, iteration, end - start, changed))
+                if tracer is not None:
+                    tracer.record(f"pass {pass_.name}", "optimize", start, end, iteration=iteration, changed=changed)
+                program = result
+                if not changed:
+                    break
+        return program
+
+
+def optimizer(program, options, stats=None) :
+    return PassManager().run(program, options, stats)
@@ -3,77 +3,186 @@ from __future__ import annotations
 """Parser for Aissembly minimal language."""
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Union
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+import hashlib
+import os
+import sys
+import threading
+from bisect import bisect_right
 
 from lark import Lark, Transformer
 from lark.exceptions import UnexpectedEOF, UnexpectedInput
-from lark.indenter import Indenter
+from lark.indenter import DedentError, Indenter
 
-@dataclass
-class Program:
+from . import tracing
+
+class Node:
+    """Base of the AST node classes.
+
+    Nodes are slotted and treated as immutable once built: passes return new
+    nodes rather than editing existing ones.  That makes it safe to share
+    structurally equal subtrees (see :func:`hash_cons`) and to cache the
+    structural hash of a node after its first use.
+    """
+
+    __slots__ = ("_hash",)
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if type(other) is not type(self):
+            return NotImplemented
+        mine, theirs = _cached_hash(self), _cached_hash(other)
+        if mine is not None and theirs is not None and mine != theirs:
+            return False
+        return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            h = self._hash = hash((type(self).__name__,) + tuple(_hashable(getattr(self, f)) for f in self.__slots__))
+            return h
+
+
+def _cached_hash(node: Node) -> Optional[int]:
+    # ``None`` until the node is hashed; never forces a hash here.
+    return getattr(node, "_hash", None)
+
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, Mapping):
+        # Mappings compare equal in any order, so they hash the same way.
+        return frozenset((k, _hashable(v)) for k, v in value.items())
+    return value
+
+
+# Shared, read-only ``kwargs`` of every call without keyword arguments.
+EMPTY_KWARGS: Mapping[str, Any] = MappingProxyType({})
+
+@dataclass(eq=False)
+class Program(Node):
+    __slots__ = ("statements",)
     statements: List[Any]
 
-@dataclass
-class LetStmt:
+@dataclass(eq=False)
+class LetStmt(Node):
+    __slots__ = ("name", "expr")
     name: str
     expr: Any
 
-@dataclass
-class Var:
+@dataclass(eq=False)
+class Var(Node):
+    __slots__ = ("name",)
     name: str
 
-@dataclass
-class Number:
+@dataclass(eq=False)
+class Number(Node):
+    __slots__ = ("value",)
     value: Union[int, float]
 
-@dataclass
-class String:
+@dataclass(eq=False)
+class String(Node):
+    __slots__ = ("value",)
     value: str
 
-@dataclass
-class Boolean:
+@dataclass(eq=False)
+class Boolean(Node):
+    __slots__ = ("value",)
     value: bool
 
-@dataclass
-class ListLiteral:
+@dataclass(eq=False)
+class ListLiteral(Node):
+    __slots__ = ("elements",)
     elements: List[Any]
 
-@dataclass
-class DictLiteral:
+@dataclass(eq=False)
+class DictLiteral(Node):
+    __slots__ = ("items",)
     items: List[Tuple[Any, Any]]
 
-@dataclass
-class NamedArg:
+@dataclass(eq=False)
+class NamedArg(Node):
+    __slots__ = ("name", "value")
     name: str
     value: Any
 
-@dataclass
-class Call:
+@dataclass(eq=False)
+class Call(Node):
+    __slots__ = ("name", "args", "kwargs")
     name: str
     args: List[Any]
-    kwargs: Dict[str, Any]
+    kwargs: Mapping[str, Any]
 
-@dataclass
-class ForLoop:
+@dataclass(eq=False)
+class ForLoop(Node):
+    __slots__ = ("start", "end", "step", "init", "body")
     start: Any
     end: Any
     step: Any
     init: Any
     body: Any
 
-@dataclass
-class WhileLoop:
+@dataclass(eq=False)
+class WhileLoop(Node):
+    __slots__ = ("test", "init", "body")
     test: Any
     init: Any
     body: Any
 
-@dataclass
-class Cond:
+@dataclass(eq=False)
+class Cond(Node):
+    __slots__ = ("test", "then", "else_")
     test: Any
     then: Any
     else_: Any
 
 
+def hash_cons(node: Any, table: Optional[Dict[Any, Any]] = None) -> Any:
+    """Return ``node`` with structurally equal subtrees shared.
+
+    Equal subtrees become one object, so comparing them is an identity check
+    and their hash is computed once.  ``table`` may be passed to share nodes
+    across several programs.  Scalars keep their type: ``1`` and ``1.0`` are
+    never merged.
+    """
+
+    return _cons(node, {} if table is None else table)[0]
+
+
+def _cons(value: Any, table: Dict[Any, Any]) -> Tuple[Any, Any]:
+    if isinstance(value, Node):
+        parts = [_cons(getattr(value, f), table) for f in value.__slots__]
+        key = (type(value),) + tuple(k for _, k in parts)
+        node = table.get(key)
+        if node is None:
+            if all(v is getattr(value, f) for (v, _), f in zip(parts, value.__slots__)):
+                node = value
+            else:
+                node = type(value)(*(v for v, _ in parts))
+            table[key] = node
+        # Children are unique per structure, so their identity is their key.
+        return node, id(node)
+    if isinstance(value, (list, tuple)):
+        parts = [_cons(v, table) for v in value]
+        key = ("l" if isinstance(value, list) else "t",) + tuple(k for _, k in parts)
+        if any(v is not old for (v, _), old in zip(parts, value)):
+            value = type(value)(v for v, _ in parts)
+        return value, key
+    if isinstance(value, Mapping):
+        if not value:
+            return EMPTY_KWARGS, ("d",)
+        parts = [(k, _cons(v, table)) for k, v in value.items()]
+        key = ("d",) + tuple((k, key) for k, (_, key) in parts)
+        if any(v is not value[k] for k, (v, _) in parts):
+            value = {k: v for k, (v, _) in parts}
+        return value, key
+    return value, (type(value), value)
+
+
 # ---- 간단한 evaluator (핵심: Call 처리) ----
 def eval_node(node):
     if isinstance(node, String):
@@ -232,13 +341,13 @@ class ASTBuilder(Transformer):
     def let_stmt(self, items):
         name = items[0]
         expr = items[1]
-        return LetStmt(str(name), expr)
+        return LetStmt(sys.intern(str(name)), expr)
 
     def expr_stmt(self, items):
         return items[0]
 
     def dotted_name(self, items):
-        return ".".join(str(i) for i in items)
+        return sys.intern(".".join(str(i) for i in items))
 
     def var(self, items):
         return Var(items[0])
@@ -260,6 +369,8 @@ class ASTBuilder(Transformer):
         return Boolean(False)
 
     def list_lit(self, items):
+        if items and items[0] is None:
+            items = []
         return ListLiteral(items)
 
     def dict_lit(self, items):
@@ -271,7 +382,7 @@ class ASTBuilder(Transformer):
         return (items[0], items[1])
 
     def named_arg(self, items):
-        return NamedArg(str(items[0]), items[1])
+        return NamedArg(sys.intern(str(items[0])), items[1])
 
     def positional_arg(self, items):
         return items[0]
@@ -283,22 +394,22 @@ class ASTBuilder(Transformer):
         name = items[0]
         args = []
         kwargs: Dict[str, Any] = {}
-        if len(items) > 1:
+        if len(items) > 1 and items[1] is not None:
             for arg in items[1]:
                 if isinstance(arg, NamedArg):
                     kwargs[arg.name] = arg.value
                 else:
                     args.append(arg)
-        return Call(name, args, kwargs)
+        return Call(name, args, kwargs or EMPTY_KWARGS)
 
     def atom(self, items):
         node = items[0]
         for tr in items[1:]:
             if tr[0] == "index":
-                node = Call("op.get", [node, tr[1]], {})
+                node = Call("op.get", [node, tr[1]], EMPTY_KWARGS)
             else:
                 start, end = tr[1], tr[2]
-                node = Call("op.slice", [node, start, end], {})
+                node = Call("op.slice", [node, start, end], EMPTY_KWARGS)
         return node
 
     def index(self, items):
@@ -311,33 +422,33 @@ class ASTBuilder(Transformer):
 
     def add(self, items):
         a, b = items
-        return Call("op.add", [a, b], {})
+        return Call("op.add", [a, b], EMPTY_KWARGS)
 
     def sub(self, items):
         a, b = items
-        return Call("op.sub", [a, b], {})
+        return Call("op.sub", [a, b], EMPTY_KWARGS)
 
     def mul(self, items):
         a, b = items
-        return Call("op.mul", [a, b], {})
+        return Call("op.mul", [a, b], EMPTY_KWARGS)
 
     def div(self, items):
         a, b = items
-        return Call("op.div", [a, b], {})
+        return Call("op.div", [a, b], EMPTY_KWARGS)
 
     def mod(self, items):
         a, b = items
-        return Call("op.mod", [a, b], {})
+        return Call("op.mod", [a, b], EMPTY_KWARGS)
 
     def neg(self, items):
         val = items[0]
-        return Call("op.sub", [Number(0), val], {})
+        return Call("op.sub", [Number(0), val], EMPTY_KWARGS)
 
     def comparison(self, items):
         if len(items) == 1:
             return items[0]
         left, op, right = items
-        return Call(f"op.{op}", [left, right], {})
+        return Call(sys.intern(f"op.{op}"), [left, right], EMPTY_KWARGS)
 
     def eq(self, _):
         return "eq"
@@ -359,15 +470,15 @@ class ASTBuilder(Transformer):
 
     def and_op(self, items):
         a, b = items
-        return Call("op.land", [a, b], {})
+        return Call("op.land", [a, b], EMPTY_KWARGS)
 
     def or_op(self, items):
         a, b = items
-        return Call("op.lor", [a, b], {})
+        return Call("op.lor", [a, b], EMPTY_KWARGS)
 
     def not_op(self, items):
         a = items[0]
-        return Call("op.lnot", [a], {})
+        return Call("op.lnot", [a], EMPTY_KWARGS)
 
     def block_body(self, items):
         return items[0]
@@ -411,63 +522,285 @@ def _identity(program: Program) -> Program:
     return program
 
 
-def parse_program(source: str, options) -> Program:
-    """Parse source code into a :class:`Program`.
+@dataclass
+class ParserOptions:
+    """Options accepted by :func:`parse_program` and :func:`optimizer`.
+
+    ``parser_cache_dir`` selects where the serialized LALR tables are stored.
+    When ``None`` the directory from ``AISSEMBLY_PARSER_CACHE`` is used, falling
+    back to Lark's own temporary-directory cache.  ``hash_cons`` makes
+    structurally equal subtrees of the parsed program share one object (see
+    :func:`hash_cons`).
+    """
 
-    The parser incrementally consumes the source line by line.  Each line is
-    appended to a buffer and reparsed until a complete statement is produced.
-    This enables re-parsing of individual lines during interactive development
-    or when streaming program text from an LLM.  After parsing, a series of
-    optimisation hooks are executed according to ``options``.  Each optimisation
-    currently performs no transformation; they serve as placeholders for future
-    LLM-based workflows.
+    reparse_iterations: int = 1
+    accuracy_opt_passes: int = 0
+    decomposition_opt_passes: int = 0
+    integration_opt_passes: int = 0
+    loop_to_operation_opt_passes: int = 0
+    operation_to_loop_opt_passes: int = 0
+    condition_to_operation_opt_passes: int = 0
+    constant_folding_opt_passes: int = 0
+    cse_opt_passes: int = 0
+    opt_concurrency: int = 8
+    parser_cache_dir: Optional[str] = None
+    hash_cons: bool = False
 
-    Args:
-        source: Raw program text.
-        options: Options.
 
-    Returns:
-        Parsed :class:`Program` instance.
+# Hash of the grammar text; serialized parser tables are keyed by it so that a
+# grammar change never loads stale tables.
+GRAMMAR_SHA256 = hashlib.sha256(GRAMMAR.encode("utf-8")).hexdigest()
+
+PARSER_CACHE_ENV = "AISSEMBLY_PARSER_CACHE"
+
+# Lark parsers are cheap to share but the indenter keeps per-parse state, so
+# each thread gets its own instance.
+_parsers = threading.local()
+
+
+def _parser_cache_target(cache_dir: Optional[str]) -> Union[bool, str]:
+    cache_dir = cache_dir or os.environ.get(PARSER_CACHE_ENV)
+    if not cache_dir:
+        return True
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"aissembly_grammar_{GRAMMAR_SHA256[:16]}.lark")
+
+
+def get_parser(cache_dir: Optional[str] = None) -> Lark:
+    """Return the LALR parser for :data:`GRAMMAR`.
+
+    The parser is built once per thread and cache directory.  Construction
+    itself is backed by Lark's on-disk cache, so a fresh process only
+    deserializes the tables instead of regenerating them.
     """
 
-    def _parse_once() -> Program:
-        parser = Lark(GRAMMAR, parser="lalr", postlex=TreeIndenter(), start="start")
-        builder = ASTBuilder()
+    cached = getattr(_parsers, "by_dir", None)
+    if cached is None:
+        cached = _parsers.by_dir = {}
+    parser = cached.get(cache_dir)
+    if parser is None:
+        parser = Lark(
+            GRAMMAR,
+            parser="lalr",
+            postlex=TreeIndenter(),
+            start="start",
+            cache=_parser_cache_target(cache_dir),
+        )
+        cached[cache_dir] = parser
+    return parser
+
+
+def _indent_width(line: str) -> int:
+    expanded = line.expandtabs(TreeIndenter.tab_len)
+    return len(expanded) - len(expanded.lstrip())
+
+
+def _is_incomplete(exc: UnexpectedInput) -> bool:
+    if isinstance(exc, UnexpectedEOF):
+        return True
+    token_type = getattr(getattr(exc, "token", None), "type", "")
+    return token_type in ("$END", "_DEDENT")
+
+
+@dataclass
+class _Chunk:
+    start: int
+    end: int
+    text: str
+    statements: List[Any]
+
+
+class IncrementalParser:
+    """Parse a program as a sequence of independently parsed top-level chunks.
+
+    A chunk opens at every non-blank line that is not indented deeper than the
+    line opening the previous chunk; deeper lines belong to the block of the
+    statement above them.  Chunks tile the source, so :meth:`apply_edit` only
+    reparses the chunks an edit touches (plus one neighbour on each side) and
+    every other chunk keeps its cached statements.  A chunk that ends in the
+    middle of a statement is merged with the following one, which preserves
+    the behaviour of the original line-buffer parser.
+
+    After each edit :attr:`changed` lists the indices of the statements in
+    :attr:`program` that were produced by a fresh parse.
+    """
+
+    def __init__(self, source: str = "", parser: Optional[Lark] = None):
+        self.parser = parser or get_parser()
+        self.builder = ASTBuilder()
+        self.source = ""
+        self.chunks: List[_Chunk] = []
+        self.program = Program([])
+        self.changed: List[int] = []
+        self._cache: Dict[str, List[Any]] = {}
+        if source:
+            self.apply_edit(0, 0, source)
+
+    def apply_edit(self, start: int, end: int, text: str) -> Program:
+        """Replace ``source[start:end]`` with ``text`` and return the new program."""
+
+        if not 0 <= start <= end <= len(self.source):
+            raise ValueError(f"Invalid edit range: {start}..{end}")
+        source = self.source[:start] + text + self.source[end:]
+        delta = len(text) - (end - start)
+        old = self.chunks
+        lo, hi = 0, len(old)
+        if old:
+            starts = [c.start for c in old]
+            lo = max(bisect_right(starts, start) - 2, 0)
+            hi = min(bisect_right(starts, end) + 1, len(old))
+
+        while True:
+            region_start = old[lo].start if lo < len(old) else 0
+            region_end = old[hi].start + delta if hi < len(old) else len(source)
+            fresh = self._parse_region(source, region_start, region_end, hi >= len(old))
+            if fresh is not None:
+                break
+            hi += 1
+
+        known = {c.text for c in old[lo:hi]}
+        for chunk in old[hi:]:
+            chunk.start += delta
+            chunk.end += delta
+        self.source = source
+        self.chunks = old[:lo] + fresh + old[hi:]
+        self._cache = {c.text: c.statements for c in self.chunks}
+
+        reparsed = {id(c) for c in fresh if c.text not in known}
+        statements: List[Any] = []
+        changed: List[int] = []
+        for chunk in self.chunks:
+            if id(chunk) in reparsed:
+                changed.extend(range(len(statements), len(statements) + len(chunk.statements)))
+            statements.extend(chunk.statements)
+        self.changed = changed
+        self.program = Program(statements)
+        return self.program
+
+    def _split(self, source: str, start: int, end: int) -> List[Tuple[int, int]]:
+        spans: List[Tuple[int, int]] = []
+        opener: Optional[int] = None
+        pos = start
+        for line in source[start:end].splitlines(True):
+            if line.strip():
+                width = _indent_width(line)
+                if opener is None or width <= opener:
+                    if spans:
+                        spans[-1] = (spans[-1][0], pos)
+                    spans.append((pos if spans else start, end))
+                    opener = width
+            pos += len(line)
+        return spans or [(start, end)]
+
+    def _parse_region(
+        self, source: str, start: int, end: int, final: bool
+    ) -> Optional[List[_Chunk]]:
+        chunks: List[_Chunk] = []
+        pending: Optional[int] = None
+        for span_start, span_end in self._split(source, start, end):
+            chunk_start = span_start if pending is None else pending
+            text = self._normalize(source[chunk_start:span_end])
+            statements = self._parse_chunk(text)
+            if statements is None:
+                pending = chunk_start
+                continue
+            pending = None
+            chunks.append(_Chunk(chunk_start, span_end, text, statements))
+        if pending is not None:
+            if not final:
+                return None
+            # Surface the parse error for the unterminated trailing statement.
+            self.parser.parse(self._normalize(source[pending:end]))
+        return chunks
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        lines = [ln for ln in text.splitlines() if ln.strip()]
+        if not lines:
+            return ""
+        lines[0] = lines[0].lstrip()
+        return "\n".join(lines) + "\n"
+
+    def _parse_chunk(self, text: str) -> Optional[List[Any]]:
+        if not text:
+            return []
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+        try:
+            tree = self.parser.parse(text)
+        except UnexpectedInput as e:
+            if _is_incomplete(e):
+                return None
+            if text.count("\n") < 2:
+                raise
+            return self._parse_lines(text.splitlines())
+        except DedentError:
+            if text.count("\n") < 2:
+                raise
+            return self._parse_lines(text.splitlines())
+        return self._statements(tree)
+
+    def _parse_lines(self, lines: List[str]) -> List[Any]:
+        """Line-buffer fallback for chunks whose block layout does not parse."""
 
         statements: List[Any] = []
-        lines = [ln for ln in source.strip().splitlines() if ln.strip()]
         buffer = ""
         for line in lines:
             buffer += line + "\n"
             try:
-                tree = parser.parse(buffer)
-            except UnexpectedEOF:
-                continue
+                tree = self.parser.parse(buffer)
             except UnexpectedInput as e:
-                token_type = getattr(getattr(e, "token", None), "type", "")
-                if token_type in ("$END", "_DEDENT"):
+                if _is_incomplete(e):
                     continue
                 raise
-            else:
-                prog = builder.transform(tree)
-                if isinstance(prog, Program):
-                    statements.extend(prog.statements)
-                else:
-                    statements.append(prog)
-                buffer = ""
-
+            statements.extend(self._statements(tree))
+            buffer = ""
         if buffer.strip():
-            tree = parser.parse(buffer)
-            prog = builder.transform(tree)
-            if isinstance(prog, Program):
-                statements.extend(prog.statements)
-            else:
-                statements.append(prog)
+            statements.extend(self._statements(self.parser.parse(buffer)))
+        return statements
+
+    def _statements(self, tree) -> List[Any]:
+        prog = self.builder.transform(tree)
+        if isinstance(prog, Program):
+            return prog.statements
+        return [prog]
+
+
+def parse_program(source: str, options=None) -> Program:
+    """Parse source code into a :class:`Program`.
+
+    The source is split into top-level statements by indentation and each one
+    is parsed on its own (see :class:`IncrementalParser`), so parsing is linear
+    in the program size.  Interactive editors and LLM streaming can keep an
+    :class:`IncrementalParser` around and reparse only edited statements.  After parsing, a series of
+    optimisation hooks are executed according to ``options``.  Each optimisation
+    currently performs no transformation; they serve as placeholders for future
+    LLM-based workflows.
+
+    Args:
+        source: Raw program text.
+        options: :class:`ParserOptions` or any object with the same
+            attributes.  Defaults to ``ParserOptions()``.
+
+    Returns:
+        Parsed :class:`Program` instance.
+    """
+
+    if options is None:
+        options = ParserOptions()
+    with tracing.span("parse_program", "parse", source_bytes=len(source)) as span:
+        parser = get_parser(getattr(options, "parser_cache_dir", None))
+
+        def _parse_once() -> Program:
+            return IncrementalParser(source, parser).program
 
-        return Program(statements)
+        program = None
+        for _ in range(max(options.reparse_iterations, 1)):
+            program = _parse_once()
 
-    program = None
-    for _ in range(max(options.reparse_iterations, 1)):
-        program = _parse_once()
-    
+        if getattr(options, "hash_cons", False):
+            program = hash_cons(program)
+        if span is not None:
+            span.attributes["statements"] = len(program.statements)
     return program
@@ -0,0 +1,234 @@
+"""Record and replay LLM adapter calls.
+
+An :class:`~aissembly_core.executor.Executor` given a :class:`CallLog` in
+record mode (``--record calls.jsonl``) appends every request it sends to an
+adapter, and the response, to the log.  In replay mode (``--replay
+calls.jsonl``) the adapters are never contacted: each request is answered
+from the log, either at once or, with ``latency="recorded"``
+(``--replay-latency recorded``), after the time the original call took.
+Streamed responses are replayed chunk by chunk, and in recorded mode each
+chunk arrives at its original offset.  Runs can then be reproduced and
+benchmarked without a network.
+
+The log is append-only JSON lines, one object per adapter call::
+
+    {"key": ..., "function": "chat", "model": "m", "payload": {...},
+     "result": "...", "error": null, "duration": 0.42, "chunks": [[0.05, "Hel"], ...]}
+
+Requests are matched by function, model and payload.  When the same request
+was recorded more than once, replay serves the responses in recorded order and
+repeats the last one once they run out.  A recorded failure is raised again as
+:class:`ReplayError`.  Calls answered by the cache never reach an adapter and
+are not recorded.  Results that are not JSON are stored as their ``str``.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
+import threading
+import time
+
+from .adapters import CallPlan
+from .cache import cache_key
+from .streaming import CallRecord, TokenCallback, astream_text, stream_text
+
+LATENCIES = ("instant", "recorded")
+
+
+class ReplayError(RuntimeError):
+    """A replayed call has no recording, or its recording is a failure."""
+
+
+class CallLog:
+    """Append-only log of adapter calls.
+
+    Args:
+        path: The JSON lines file.
+        mode: ``"record"`` appends calls to ``path``; ``"replay"`` loads it and
+            answers calls from it.
+        latency: In replay mode, ``"instant"`` or ``"recorded"``.
+    """
+
+    def __init__(self, path: str, mode: str = "record", latency: str = "instant"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown call log mode: {mode}")
+        if latency not in LATENCIES:
+            raise ValueError(f"Unknown replay latency: {latency}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        if mode == "replay":
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(plan: CallPlan, payload: Dict[str, Any]) -> Optional[str]:
+        # The adapter location is left out so that a log recorded against
+        # production endpoints replays against a local configuration.
+        return cache_key(plan.name, plan.model, payload)
+
+    # --- record ---
+    def capture(
+        self,
+        plan: CallPlan,
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: Optional[TokenCallback],
+        send: Callable[[TokenCallback], Any],
+    ) -> Any:
+        """Run ``send(sink)`` and append the call; ``sink`` collects streamed chunks."""
+
+        chunks, sink = self._sink(record, on_token)
+        try:
+            result = send(sink)
+        except Exception as e:
+            self.write(plan, payload, None, time.perf_counter() - record.started, chunks, e)
+            raise
+        self.write(plan, payload, result, time.perf_counter() - record.started, chunks)
+        return result
+
+    async def acapture(
+        self,
+        plan: CallPlan,
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: Optional[TokenCallback],
+        send: Callable[[TokenCallback], Any],
+    ) -> Any:
+        """Like :meth:`capture` for a coroutine ``send``."""
+
+        chunks, sink = self._sink(record, on_token)
+        try:
+            result = await send(sink)
+        except Exception as e:
+            self.write(plan, payload, None, time.perf_counter() - record.started, chunks, e)
+            raise
+        self.write(plan, payload, result, time.perf_counter() - record.started, chunks)
+        return result
+
+    @staticmethod
+    def _sink(record: CallRecord, on_token: Optional[TokenCallback]) -> Tuple[List[Any], TokenCallback]:
+        chunks: List[Any] = []
+
+        def sink(name: str, call_id: int, chunk: Optional[str]) -> None:
+            if chunk is not None:
+                chunks.append([round(time.perf_counter() - record.started, 6), chunk])
+            if on_token is not None:
+                on_token(name, call_id, chunk)
+
+        return chunks, sink
+
+    def write(
+        self,
+        plan: CallPlan,
+        payload: Dict[str, Any],
+        result: Any,
+        duration: float,
+        chunks: Optional[List[Any]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Append one call to the log; requests that are not JSON are skipped."""
+
+        key = self.key(plan, payload)
+        if key is None:
+            return
+        entry = {
+            "key": key,
+            "function": plan.name,
+            "model": plan.model,
+            "payload": payload,
+            "result": result,
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+            "duration": round(duration, 6),
+            "chunks": chunks or None,
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    # --- replay ---
+    def lookup(self, plan: CallPlan, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the next recording of this request."""
+
+        key = self.key(plan, payload)
+        entries = self._entries.get(key) if key is not None else None
+        if not entries:
+            raise ReplayError(f"No recorded call of {plan.name} matches the request")
+        with self._lock:
+            n = self._served.get(key, 0)
+            self._served[key] = n + 1
+        return entries[min(n, len(entries) - 1)]
+
+    def replay(
+        self,
+        plan: CallPlan,
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: Optional[TokenCallback],
+    ) -> Any:
+        entry = self.lookup(plan, payload)
+        if entry["chunks"]:
+            return stream_text(self._chunks(entry, record.started), record, on_token)
+        self._sleep_until(record.started + entry["duration"])
+        return self._outcome(entry)
+
+    async def areplay(
+        self,
+        plan: CallPlan,
+        payload: Dict[str, Any],
+        record: CallRecord,
+        on_token: Optional[TokenCallback],
+    ) -> Any:
+        entry = self.lookup(plan, payload)
+        if entry["chunks"]:
+            return await astream_text(self._achunks(entry, record.started), record, on_token)
+        await asyncio.sleep(self._delay(record.started + entry["duration"]))
+        return self._outcome(entry)
+
+    def replay_batch(self, plan: CallPlan, payloads: List[Dict[str, Any]]) -> List[Any]:
+        """Answer a batch request; it takes as long as its slowest recording."""
+
+        started = time.perf_counter()
+        entries = [self.lookup(plan, p) for p in payloads]
+        self._sleep_until(started + max((e["duration"] for e in entries), default=0.0))
+        return [self._outcome(e) for e in entries]
+
+    def _delay(self, deadline: float) -> float:
+        if self.latency == "instant":
+            return 0.0
+        return max(0.0, deadline - time.perf_counter())
+
+    def _sleep_until(self, deadline: float) -> None:
+        delay = self._delay(deadline)
+        if delay:
+            time.sleep(delay)
+
+    def _chunks(self, entry: Dict[str, Any], started: float) -> Iterator[str]:
+        for offset, text in entry["chunks"]:
+            self._sleep_until(started + offset)
+            yield text
+        self._outcome(entry)
+
+    async def _achunks(self, entry: Dict[str, Any], started: float):
+        for offset, text in entry["chunks"]:
+            await asyncio.sleep(self._delay(started + offset))
+            yield text
+        self._outcome(entry)
+
+    @staticmethod
+    def _outcome(entry: Dict[str, Any]) -> Any:
+        if entry["error"] is not None:
+            raise ReplayError(entry["error"])
+        return entry["result"]
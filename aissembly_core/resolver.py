@@ -0,0 +1,156 @@
+"""Static variable resolution for the tree-walking executor.
+
+:func:`resolve_program` assigns every top-level name a slot in the global
+:class:`Frame` and rewrites each variable reference into a :class:`SlotVar`
+carrying the number of frames to walk up and the slot to read.  Loops evaluate
+their bodies in a small child frame that only holds ``i``/``acc`` instead of a
+copy of the whole environment.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .parser import (
+    Program,
+    LetStmt,
+    Var,
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+    EMPTY_KWARGS,
+)
+
+
+class _Unbound:
+    def __repr__(self) -> str:
+        return "<unbound>"
+
+
+UNBOUND = _Unbound()
+
+FOR_NAMES = ("i", "acc")
+WHILE_NAMES = ("acc",)
+
+
+class Frame:
+    """A scope: slot values plus a link to the enclosing scope.
+
+    ``names`` gives the name of each slot so that unresolved :class:`Var` nodes
+    can still be looked up with ``frame[name]``.  ``parent`` is another frame
+    or, for the outermost scope of an ad-hoc evaluation, a plain ``dict``.
+    """
+
+    __slots__ = ("names", "values", "parent")
+
+    def __init__(self, names: Sequence[str], values: List[Any], parent: Any = None):
+        self.names = names
+        self.values = values
+        self.parent = parent
+
+    def __getitem__(self, name: str) -> Any:
+        frame: Any = self
+        while isinstance(frame, Frame):
+            if name in frame.names:
+                value = frame.values[frame.names.index(name)]
+                if value is UNBOUND:
+                    raise KeyError(name)
+                return value
+            frame = frame.parent
+        if frame is None:
+            raise KeyError(name)
+        return frame[name]
+
+    def bindings(self) -> Dict[str, Any]:
+        return {n: v for n, v in zip(self.names, self.values) if v is not UNBOUND}
+
+
+@dataclass
+class SlotVar:
+    name: str
+    depth: int
+    slot: int
+
+
+@dataclass
+class SlotLet:
+    name: str
+    slot: int
+    expr: Any
+
+
+@dataclass
+class ResolvedProgram:
+    statements: List[Any]
+    names: List[str]
+
+    def frame(self, env: Dict[str, Any]) -> Frame:
+        """Build the global frame, seeding slots from ``env``."""
+
+        return Frame(self.names, [env.get(n, UNBOUND) for n in self.names])
+
+
+class _Resolver:
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.slots = {n: i for i, n in enumerate(names)}
+
+    def global_slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def expr(self, node: Any, scopes: Tuple[Sequence[str], ...]) -> Any:
+        if isinstance(node, Var):
+            for depth, names in enumerate(scopes):
+                if node.name in names:
+                    return SlotVar(node.name, depth, names.index(node.name))
+            return SlotVar(node.name, len(scopes), self.global_slot(node.name))
+        if isinstance(node, Call):
+            return Call(
+                node.name,
+                [self.expr(a, scopes) for a in node.args],
+                {k: self.expr(v, scopes) for k, v in node.kwargs.items()} if node.kwargs else EMPTY_KWARGS,
+            )
+        if isinstance(node, ListLiteral):
+            return ListLiteral([self.expr(e, scopes) for e in node.elements])
+        if isinstance(node, DictLiteral):
+            return DictLiteral([(self.expr(k, scopes), self.expr(v, scopes)) for k, v in node.items])
+        if isinstance(node, Cond):
+            return Cond(self.expr(node.test, scopes), self.expr(node.then, scopes), self.expr(node.else_, scopes))
+        if isinstance(node, ForLoop):
+            inner = (FOR_NAMES,) + scopes
+            return ForLoop(
+                self.expr(node.start, scopes),
+                self.expr(node.end, scopes),
+                self.expr(node.step, scopes),
+                self.expr(node.init, scopes),
+                self.expr(node.body, inner),
+            )
+        if isinstance(node, WhileLoop):
+            inner = (WHILE_NAMES,) + scopes
+            return WhileLoop(self.expr(node.test, inner), self.expr(node.init, scopes), self.expr(node.body, inner))
+        return node
+
+
+def resolve_program(program: Program) -> ResolvedProgram:
+    """Rewrite ``program`` so that every variable access is slot addressed.
+
+    ``let`` targets get the first slots, in statement order, so that
+    :meth:`Frame.bindings` yields names in the order they were first bound.
+    """
+
+    let_names = dict.fromkeys(s.name for s in program.statements if isinstance(s, LetStmt))
+    resolver = _Resolver(list(let_names))
+    statements: List[Any] = []
+    for stmt in program.statements:
+        if isinstance(stmt, LetStmt):
+            statements.append(SlotLet(stmt.name, resolver.slots[stmt.name], resolver.expr(stmt.expr, ())))
+        else:
+            statements.append(resolver.expr(stmt, ()))
+    return ResolvedProgram(statements, resolver.names)
@@ -3,15 +3,21 @@ from __future__ import annotations
 
 import argparse
 import json
-from typing import Dict
+import sys
+from typing import Any, Dict
 
+from . import tracing
 from .parser import parse_program
 from .optimizer import optimizer
 from .executor import Executor, load_llm_defs
+from .compiler import compile_program
+from .cache import LLMCache
+from .replay import LATENCIES, CallLog
+from .artifacts import Artifact, artifact_key, build_artifact, load_artifact, store_artifact
 
 
-def main(argv: list[str] | None = None) -> None:
-    parser = argparse.ArgumentParser(description="Run Aissembly program")
+def _argument_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
     parser.add_argument("program", help="Path to program file")
     parser.add_argument("--llm", dest="llm", help="Path to LLM definition JSON", default=None)
     parser.add_argument("--accuracy_opt_passes", 
@@ -50,6 +56,25 @@ def main(argv: list[str] | None = None) -> None:
         default=0, 
         help="Condition to operation optimization"
     )
+    parser.add_argument("--constant_folding_opt_passes", 
+        dest="constant_folding_opt_passes", 
+        type=int, 
+        default=0, 
+        help="Constant folding and propagation"
+    )
+    parser.add_argument("--cse_opt_passes", 
+        dest="cse_opt_passes", 
+        type=int, 
+        default=0, 
+        help="Share repeated pure calls (common-subexpression elimination)"
+    )
+    parser.add_argument(
+        "--opt-concurrency",
+        dest="opt_concurrency",
+        type=int,
+        default=8,
+        help="Concurrent rewrite requests issued by the accuracy/decomposition passes",
+    )
     parser.add_argument(
         "--reparse-iterations",
         dest="reparse_iterations",
@@ -57,21 +82,232 @@ def main(argv: list[str] | None = None) -> None:
         default=1,
         help="Number of line-by-line re-parsing iterations to run",
     )
+    parser.add_argument(
+        "--hash-cons",
+        dest="hash_cons",
+        action="store_true",
+        help="Share structurally equal subtrees of the parsed program",
+    )
+    parser.add_argument(
+        "--parser-cache",
+        dest="parser_cache_dir",
+        default=None,
+        help="Directory for serialized parser tables (defaults to $AISSEMBLY_PARSER_CACHE or a temp dir)",
+    )
+    parser.add_argument(
+        "--engine",
+        dest="engine",
+        choices=("tree", "compiled"),
+        default="tree",
+        help="Execution engine: the reference tree-walker or compiled Python bytecode",
+    )
+    parser.add_argument(
+        "--bytecode-cache",
+        dest="bytecode_cache",
+        default=None,
+        help="Directory for cached bytecode of compiled programs",
+    )
+    parser.add_argument(
+        "--artifact-cache",
+        dest="artifact_cache",
+        default=None,
+        help="Directory of optimized program artifacts; unchanged programs skip parsing and optimization",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=None,
+        help="Directory of the persistent LLM response cache (disabled when omitted)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        dest="cache_ttl",
+        type=float,
+        default=None,
+        help="Default lifetime of cached LLM responses in seconds",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        dest="max_concurrency",
+        type=int,
+        default=1,
+        help="Run independent LLM-bound statements concurrently on up to N threads",
+    )
+    parser.add_argument(
+        "--batch-window",
+        dest="batch_window",
+        type=int,
+        default=64,
+        help="Loop iterations whose LLM calls are dispatched as one batch (0 disables batching)",
+    )
+    parser.add_argument(
+        "--lazy",
+        dest="lazy",
+        action="store_true",
+        help="Defer LLM calls until their results are needed (tree engine only)",
+    )
+    parser.add_argument(
+        "--select",
+        dest="select",
+        action="append",
+        default=None,
+        metavar="NAME",
+        help="Only output this binding (repeatable); with --lazy, only selected calls are forced",
+    )
+    calls = parser.add_mutually_exclusive_group()
+    calls.add_argument(
+        "--record",
+        dest="record",
+        default=None,
+        metavar="PATH",
+        help="Append every LLM adapter request and response to PATH",
+    )
+    calls.add_argument(
+        "--replay",
+        dest="replay",
+        default=None,
+        metavar="PATH",
+        help="Answer LLM calls from a log written by --record instead of the adapters",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        dest="replay_latency",
+        choices=list(LATENCIES),
+        default="instant",
+        help="Serve replayed responses at once or after their recorded latency",
+    )
+    parser.add_argument(
+        "--trace",
+        dest="trace",
+        default=None,
+        metavar="PATH",
+        help="Write a trace of parsing, optimizer passes, statements and LLM calls to PATH",
+    )
+    parser.add_argument(
+        "--trace-format",
+        dest="trace_format",
+        choices=["chrome", "otel"],
+        default="chrome",
+        help="Trace file format: Chrome trace events or OpenTelemetry OTLP/JSON",
+    )
+    return parser
+
+
+def _traced(args: argparse.Namespace, func, *func_args) -> None:
+    """Call ``func`` under a tracer when ``--trace`` is given, then write the trace."""
+
+    if not args.trace:
+        return func(*func_args)
+    tracing.start()
+    try:
+        return func(*func_args)
+    finally:
+        tracing.stop().write(args.trace, args.trace_format)
+
+
+def _report(stats: Dict[str, Any]) -> None:
+    if stats.get("loop_rewrites"):
+        print(f"loop_to_operation: rewrote {len(stats['loop_rewrites'])} loops", file=sys.stderr)
+        for line in stats["loop_rewrites"]:
+            print(f"  {line}", file=sys.stderr)
+    if stats.get("cse_removed_calls"):
+        print(
+            f"cse: removed {stats['cse_removed_calls']} calls "
+            f"({stats['cse_removed_llm_calls']} LLM calls)",
+            file=sys.stderr,
+        )
+
+
+def _front_end(source: str, args: argparse.Namespace) -> Artifact:
+    """Parse and optimize ``source``, through the artifact cache when enabled."""
+
+    if not args.artifact_cache:
+        prog = parse_program(source, options=args)
+        stats: Dict[str, int] = {}
+        prog = optimizer(prog, args, stats)
+        return Artifact("", prog, None, stats)
+    key = artifact_key(source, args)
+    artifact = load_artifact(args.artifact_cache, key)
+    if artifact is None:
+        artifact = build_artifact(source, args, key)
+        store_artifact(args.artifact_cache, artifact)
+    return artifact
+
+
+def compile_main(argv: list[str] | None = None) -> None:
+    """Build the artifact of a program ahead of time and print its path."""
+
+    parser = _argument_parser("Build an optimized Aissembly program artifact")
     args = parser.parse_args(argv)
+    if not args.artifact_cache:
+        parser.error("compile requires --artifact-cache")
+    _traced(args, _compile, args)
 
+
+def _compile(args: argparse.Namespace) -> None:
     with open(args.program, "r", encoding="utf-8") as f:
         source = f.read()
+    key = artifact_key(source, args)
+    artifact = build_artifact(source, args, key)
+    _report(artifact.stats)
+    print(store_artifact(args.artifact_cache, artifact))
 
-    prog = parse_program(source, options=args)
 
-    prog = optimizer(prog, args)
+def main(argv: list[str] | None = None) -> None:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["compile"]:
+        return compile_main(argv[1:])
+    parser = _argument_parser("Run Aissembly program")
+    args = parser.parse_args(argv)
+    if args.lazy and args.engine == "compiled":
+        parser.error("--lazy requires --engine tree")
+    _traced(args, _run, parser, args)
+
+
+def _run(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    with open(args.program, "r", encoding="utf-8") as f:
+        source = f.read()
+
+    artifact = _front_end(source, args)
+    prog = artifact.program
+    _report(artifact.stats)
 
     llm_defs: Dict[str, Dict] | None = None
     if args.llm:
         llm_defs = load_llm_defs(args.llm)
 
-    executor = Executor(llm_defs=llm_defs)
-    env = executor.run(prog)
+    cache = LLMCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
+    call_log = None
+    if args.record:
+        call_log = CallLog(args.record)
+    elif args.replay:
+        call_log = CallLog(args.replay, "replay", args.replay_latency)
+    executor = Executor(
+        llm_defs=llm_defs,
+        cache=cache,
+        max_concurrency=args.max_concurrency,
+        batch_window=args.batch_window,
+        lazy=args.lazy,
+        call_log=call_log,
+    )
+    with tracing.span("execute", "execute", engine=args.engine):
+        if args.engine == "compiled":
+            compiled = artifact.compiled or compile_program(prog, cache_dir=args.bytecode_cache)
+            env = compiled.run(executor)
+        else:
+            env = executor.run(prog)
+    # Bindings introduced by the optimizer are not part of the program's result.
+    for name in artifact.stats.get("cse_bindings", ()):
+        env.pop(name, None)
+    if args.select:
+        missing = [name for name in args.select if name not in env]
+        if missing:
+            parser.error(f"--select: unknown binding(s): {', '.join(missing)}")
+    if args.lazy:
+        env = executor.force_env(env, args.select)
+    elif args.select:
+        env = {name: env[name] for name in args.select}
     print(json.dumps(env, ensure_ascii=False, indent=2))
 
 
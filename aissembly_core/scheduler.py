@@ -0,0 +1,227 @@
+"""Concurrent execution of independent top-level statements.
+
+:class:`Scheduler` builds a def-use DAG over the resolved top-level statements
+of a program: a statement depends on the last writer of every slot it reads
+(read-after-write), on earlier readers and the last writer of the slot it
+binds (write-after-read, write-after-write), and on the previous ordering
+barrier.  Statements that call side-effecting builtins or streaming LLM
+functions are barriers: they wait for everything before them and everything
+after them waits for them, so output and mutations happen in program order.
+
+Statements that call LLM functions run on a thread pool, up to
+``max_concurrency`` at a time.  All other statements run on the calling thread
+as soon as their dependencies finish.  If a statement fails, statements after
+it are not started.  Bindings made by later statements that already ran are
+rolled back, so the environment and the raised error match sequential
+execution.
+"""
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from heapq import heapify, heappop, heappush
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .parser import (
+    ListLiteral,
+    DictLiteral,
+    Call,
+    ForLoop,
+    WhileLoop,
+    Cond,
+    Boolean,
+)
+from . import tracing
+from .executor import BUILTINS, SIDE_EFFECT_BUILTINS, statement_name
+from .resolver import Frame, ResolvedProgram, SlotLet, SlotVar
+
+
+@dataclass
+class _StmtInfo:
+    reads: Set[int] = field(default_factory=set)
+    writes: Optional[int] = None
+    barrier: bool = False
+    calls_llm: bool = False
+
+
+def may_stream(spec: Dict[str, Any], node: Call) -> bool:
+    """Whether a call to the LLM function ``spec`` can stream output."""
+
+    props = spec.get("parameters", {}).get("properties", {})
+    names = list(props)
+    value = node.kwargs.get("stream")
+    if value is None and "stream" in names and names.index("stream") < len(node.args):
+        value = node.args[names.index("stream")]
+    if value is None:
+        return bool(props.get("stream", {}).get("default"))
+    return not (isinstance(value, Boolean) and not value.value)
+
+
+class Scheduler:
+    def __init__(self, executor: Any, max_concurrency: int):
+        self.executor = executor
+        self.max_concurrency = max(max_concurrency, 1)
+
+    # --- analysis ---
+    def _scan(self, node: Any, level: int, info: _StmtInfo) -> None:
+        if isinstance(node, SlotVar):
+            if node.depth == level:
+                info.reads.add(node.slot)
+        elif isinstance(node, Call):
+            if node.name in SIDE_EFFECT_BUILTINS:
+                info.barrier = True
+            elif node.name not in BUILTINS and node.name in self.executor.llm_defs:
+                info.calls_llm = True
+                if may_stream(self.executor.llm_defs[node.name], node):
+                    info.barrier = True
+            for arg in node.args:
+                self._scan(arg, level, info)
+            for arg in node.kwargs.values():
+                self._scan(arg, level, info)
+        elif isinstance(node, ListLiteral):
+            for item in node.elements:
+                self._scan(item, level, info)
+        elif isinstance(node, DictLiteral):
+            for key, value in node.items:
+                self._scan(key, level, info)
+                self._scan(value, level, info)
+        elif isinstance(node, Cond):
+            for part in (node.test, node.then, node.else_):
+                self._scan(part, level, info)
+        elif isinstance(node, ForLoop):
+            for part in (node.start, node.end, node.step, node.init):
+                self._scan(part, level, info)
+            self._scan(node.body, level + 1, info)
+        elif isinstance(node, WhileLoop):
+            self._scan(node.init, level, info)
+            self._scan(node.test, level + 1, info)
+            self._scan(node.body, level + 1, info)
+
+    def analyze(self, statements: List[Any]) -> Tuple[List[_StmtInfo], List[Set[int]]]:
+        """Return per-statement effects and the dependency set of each statement."""
+
+        infos: List[_StmtInfo] = []
+        deps: List[Set[int]] = []
+        last_writer: Dict[int, int] = {}
+        readers: Dict[int, List[int]] = {}
+        last_barrier: Optional[int] = None
+        since_barrier: List[int] = []
+        for k, stmt in enumerate(statements):
+            info = _StmtInfo()
+            if isinstance(stmt, SlotLet):
+                info.writes = stmt.slot
+                self._scan(stmt.expr, 0, info)
+            else:
+                self._scan(stmt, 0, info)
+
+            d: Set[int] = set()
+            if last_barrier is not None:
+                d.add(last_barrier)
+            if info.barrier:
+                d.update(since_barrier)
+            for slot in info.reads:
+                if slot in last_writer:
+                    d.add(last_writer[slot])
+            if info.writes is not None:
+                if info.writes in last_writer:
+                    d.add(last_writer[info.writes])
+                d.update(readers.get(info.writes, ()))
+            d.discard(k)
+
+            for slot in info.reads:
+                readers.setdefault(slot, []).append(k)
+            if info.writes is not None:
+                last_writer[info.writes] = k
+                readers[info.writes] = []
+            if info.barrier:
+                last_barrier = k
+                since_barrier = []
+            else:
+                since_barrier.append(k)
+            infos.append(info)
+            deps.append(d)
+        return infos, deps
+
+    # --- execution ---
+    def _eval(self, k: int, stmt: Any, frame: Frame) -> Any:
+        expr = stmt.expr if isinstance(stmt, SlotLet) else stmt
+        tracer = tracing.active()
+        if tracer is None:
+            return self.executor.eval_expr(expr, frame)
+        with tracer.span(statement_name(stmt), "statement", index=k):
+            return self.executor.eval_expr(expr, frame)
+
+    def run(self, resolved: ResolvedProgram, frame: Frame) -> None:
+        statements = resolved.statements
+        infos, deps = self.analyze(statements)
+        remaining = [len(d) for d in deps]
+        dependents: List[List[int]] = [[] for _ in statements]
+        for k, d in enumerate(deps):
+            for j in d:
+                dependents[j].append(k)
+        ready = [k for k, count in enumerate(remaining) if count == 0]
+        heapify(ready)
+
+        initial = list(frame.values)
+        written: Dict[int, Any] = {}
+        failed: Optional[Tuple[int, BaseException]] = None
+        running: Dict[Future, int] = {}
+
+        def finish(k: int, value: Any = None, error: Optional[BaseException] = None) -> None:
+            nonlocal failed
+            if error is not None:
+                if failed is None or k < failed[0]:
+                    failed = (k, error)
+                return
+            stmt = statements[k]
+            if isinstance(stmt, SlotLet):
+                frame.values[stmt.slot] = value
+                written[k] = value
+            for m in dependents[k]:
+                remaining[m] -= 1
+                if remaining[m] == 0:
+                    heappush(ready, m)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            while ready or running:
+                deferred: List[int] = []
+                while ready:
+                    k = heappop(ready)
+                    if failed is not None and k > failed[0]:
+                        continue
+                    if infos[k].calls_llm:
+                        if len(running) >= self.max_concurrency:
+                            deferred.append(k)
+                        else:
+                            # Run in a copy of the context so the statement's span
+                            # nests under the span open around the program.
+                            ctx = contextvars.copy_context()
+                            running[pool.submit(ctx.run, self._eval, k, statements[k], frame)] = k
+                        continue
+                    try:
+                        value = self._eval(k, statements[k], frame)
+                    except Exception as e:
+                        finish(k, error=e)
+                    else:
+                        finish(k, value)
+                for k in deferred:
+                    heappush(ready, k)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    k = running.pop(fut)
+                    error = fut.exception()
+                    if error is not None:
+                        finish(k, error=error)
+                    else:
+                        finish(k, fut.result())
+
+        if failed is not None:
+            index, error = failed
+            frame.values[:] = initial
+            for k in sorted(written):
+                if k < index:
+                    frame.values[statements[k].slot] = written[k]
+            raise error
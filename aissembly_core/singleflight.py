@@ -0,0 +1,101 @@
+"""Coalescing of identical in-flight LLM calls.
+
+When a call is issued while an identical one (same function, model, adapter
+backend and resolved payload) is still running, :class:`SingleFlight` makes the
+later caller wait for the first one's result instead of sending a second
+request.  The first caller is the *leader*; everybody else is a *waiter*.  The
+outcome, result or exception, is delivered to every waiter.  Chunks the leader
+streams are replayed to a waiter that joins late and forwarded as they arrive,
+so every caller's token callback sees the complete stream.
+
+Flights are keyed like the response cache and work across threads, executors
+and event loops in one process: waiters block on, or await, a
+:class:`concurrent.futures.Future`.
+"""
+from __future__ import annotations
+
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+
+ChunkCallback = Callable[[Optional[str]], None]
+
+
+class Flight:
+    def __init__(self) -> None:
+        self.future: Future = Future()
+        self.chunks: List[Optional[str]] = []
+        self.subscribers: List[ChunkCallback] = []
+        self.waiters = 0
+        self._lock = threading.Lock()
+
+    def publish(self, chunk: Optional[str]) -> None:
+        """Record a chunk streamed by the leader and pass it to the waiters."""
+
+        with self._lock:
+            self.chunks.append(chunk)
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            callback(chunk)
+
+    def subscribe(self, callback: ChunkCallback) -> None:
+        """Replay the chunks streamed so far to ``callback`` and follow the rest."""
+
+        with self._lock:
+            replay = list(self.chunks)
+            self.subscribers.append(callback)
+        for chunk in replay:
+            callback(chunk)
+
+    def sink(self, on_token: Any) -> Any:
+        """Wrap the leader's token callback so chunks are also published."""
+
+        def forward(fn_name: str, call_id: int, chunk: Optional[str]) -> None:
+            if on_token is not None:
+                on_token(fn_name, call_id, chunk)
+            self.publish(chunk)
+
+        return forward
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """Return the flight for ``key`` and whether the caller leads it."""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def finish(self, key: str, flight: Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Complete the leader's flight; later callers start a new one."""
+
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+_default_flights = SingleFlight()
+
+
+def default_single_flight() -> SingleFlight:
+    """Return the flight table shared by executors that are not given one."""
+
+    return _default_flights
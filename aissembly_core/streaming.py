@@ -0,0 +1,116 @@
+"""Token streaming for LLM calls.
+
+Streaming adapters hand each chunk of generated text to the executor's
+``on_token(fn_name, call_id, chunk)`` callback as soon as it arrives and call
+it once more with ``chunk=None`` when the stream ends.  :func:`stdout_sink` is
+the default callback and prints the text, which is what the CLI shows.  Pass
+``on_token=None`` to an :class:`~aissembly_core.executor.Executor` to stream
+silently.
+
+Every adapter invocation also leaves a :class:`CallRecord` with its timings,
+including the time to the first token of streamed calls.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, List, Optional
+import json
+import time
+
+TokenCallback = Callable[[str, int, Optional[str]], None]
+
+
+def stdout_sink(fn_name: str, call_id: int, chunk: Optional[str]) -> None:
+    """Print streamed text as it arrives and end the line with the stream."""
+
+    if chunk is None:
+        print(flush=True)
+    else:
+        print(chunk, end="", flush=True)
+
+
+@dataclass
+class CallRecord:
+    name: str
+    call_id: int
+    started: float
+    first_token: Optional[float] = None
+    finished: Optional[float] = None
+    chunks: int = 0
+    cached: bool = False
+    # Set when the call waited for an identical call already in flight.
+    coalesced: bool = False
+    # Seconds spent waiting for the backend's rate/concurrency limits.
+    queue_wait: float = 0.0
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from the request to the first streamed token."""
+
+        return None if self.first_token is None else self.first_token - self.started
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.finished is None else self.finished - self.started
+
+
+def stream_text(
+    chunks: Iterable[str],
+    record: CallRecord,
+    on_token: Optional[TokenCallback],
+) -> str:
+    """Forward ``chunks`` to ``on_token`` and return the joined text."""
+
+    parts: List[str] = []
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if record.first_token is None:
+            record.first_token = time.perf_counter()
+        record.chunks += 1
+        parts.append(chunk)
+        if on_token is not None:
+            on_token(record.name, record.call_id, chunk)
+    if on_token is not None:
+        on_token(record.name, record.call_id, None)
+    return "".join(parts)
+
+
+async def astream_text(
+    chunks: AsyncIterable[str],
+    record: CallRecord,
+    on_token: Optional[TokenCallback],
+) -> str:
+    """Like :func:`stream_text` for an asynchronous source of chunks."""
+
+    parts: List[str] = []
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if record.first_token is None:
+            record.first_token = time.perf_counter()
+        record.chunks += 1
+        parts.append(chunk)
+        if on_token is not None:
+            on_token(record.name, record.call_id, chunk)
+    if on_token is not None:
+        on_token(record.name, record.call_id, None)
+    return "".join(parts)
+
+
+def ndjson_chunks(lines: Iterable[bytes], field: str = "response") -> Iterable[str]:
+    """Yield the ``field`` of each object in a newline-delimited JSON stream."""
+
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line.decode("utf-8")).get(field, "")
+
+
+async def andjson_chunks(lines: AsyncIterable[bytes], field: str = "response") -> AsyncIterator[str]:
+    """Like :func:`ndjson_chunks` for an asynchronous source of lines."""
+
+    async for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line.decode("utf-8")).get(field, "")
@@ -0,0 +1,206 @@
+"""Structured tracing of parsing, optimization and execution.
+
+Tracing is off unless a :class:`Tracer` is installed with :func:`start` (the
+CLI's ``--trace out.json``).  While it is active, spans are recorded around
+:func:`~aissembly_core.parser.parse_program`, every optimizer pass iteration,
+every top-level statement run by :class:`~aissembly_core.executor.Executor`
+and every adapter call.  Adapter-call spans carry the function name, model,
+payload and response size in bytes, time to first token, time spent waiting
+for backend limits and the cache outcome (``hit``, ``miss``, ``coalesced``
+or ``off``).
+
+A span's parent is the span open in the same thread or asyncio task when it
+started.  :meth:`Tracer.to_chrome` exports Chrome trace-event JSON (load it
+in ``chrome://tracing`` or Perfetto) and :meth:`Tracer.to_otel` exports
+OpenTelemetry OTLP/JSON ``resourceSpans``.
+
+When no tracer is installed the instrumented code pays one global lookup per
+parse, pass, program run or adapter call.
+"""
+from __future__ import annotations
+
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+
+from . import __version__
+
+_active: Optional["Tracer"] = None
+_current: ContextVar[Optional[int]] = ContextVar("aissembly_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    span_id: int
+    parent_id: Optional[int]
+    # ``time.perf_counter()`` seconds, the clock of ``CallRecord``.
+    start: float
+    end: Optional[float] = None
+    thread_id: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+
+class Tracer:
+    """Collects spans from every thread of the process."""
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self.trace_id = os.urandom(16).hex()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        # Wall-clock time of ``perf_counter() == 0``, for OTLP timestamps.
+        self._epoch = time.time() - self._origin
+
+    def _new(self, name: str, category: str, start: float, attributes: Dict[str, Any]) -> Span:
+        with self._lock:
+            span_id = next(self._ids)
+        span = Span(name, category, span_id, _current.get(), start, None, threading.get_ident(), attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **attributes: Any) -> Iterator[Span]:
+        """Record the enclosed block; spans opened inside become its children."""
+
+        span = self._new(name, category, time.perf_counter(), attributes)
+        token = _current.set(span.span_id)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end = time.perf_counter()
+
+    def record(self, name: str, category: str, start: float, end: float, **attributes: Any) -> Span:
+        """Add a span measured elsewhere, as a child of the currently open span."""
+
+        span = self._new(name, category, start, attributes)
+        span.end = end
+        return span
+
+    # --- export ---
+    def to_chrome(self) -> Dict[str, Any]:
+        """Chrome trace-event JSON: one complete (``"X"``) event per span."""
+
+        pid = os.getpid()
+        events = []
+        for s in list(self.spans):
+            end = s.end if s.end is not None else time.perf_counter()
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.category,
+                    "ph": "X",
+                    "ts": (s.start - self._origin) * 1e6,
+                    "dur": (end - s.start) * 1e6,
+                    "pid": pid,
+                    "tid": s.thread_id,
+                    "args": dict(s.attributes, span_id=s.span_id, parent_id=s.parent_id),
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otel(self) -> Dict[str, Any]:
+        """OpenTelemetry OTLP/JSON export of the spans."""
+
+        spans = []
+        for s in list(self.spans):
+            end = s.end if s.end is not None else time.perf_counter()
+            item = {
+                "traceId": self.trace_id,
+                "spanId": f"{s.span_id:016x}",
+                "name": s.name,
+                # SPAN_KIND_CLIENT for adapter calls, SPAN_KIND_INTERNAL otherwise.
+                "kind": 3 if s.category == "llm" else 1,
+                "startTimeUnixNano": str(int((self._epoch + s.start) * 1e9)),
+                "endTimeUnixNano": str(int((self._epoch + end) * 1e9)),
+                "attributes": [_otel_attribute("aissembly.category", s.category)]
+                + [_otel_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+                "status": {"code": 2 if "error" in s.attributes else 0},
+            }
+            if s.parent_id is not None:
+                item["parentSpanId"] = f"{s.parent_id:016x}"
+            spans.append(item)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otel_attribute("service.name", "aissembly")]},
+                    "scopeSpans": [
+                        {"scope": {"name": "aissembly_core", "version": __version__}, "spans": spans}
+                    ],
+                }
+            ]
+        }
+
+    def write(self, path: str, format: str = "chrome") -> None:
+        data = self.to_otel() if format == "otel" else self.to_chrome()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+
+def _otel_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def start(tracer: Optional[Tracer] = None) -> Tracer:
+    """Install ``tracer`` (a new one by default) for the whole process."""
+
+    global _active
+    _active = tracer or Tracer()
+    return _active
+
+
+def stop() -> Optional[Tracer]:
+    """Uninstall and return the active tracer."""
+
+    global _active
+    tracer, _active = _active, None
+    return tracer
+
+
+def active() -> Optional[Tracer]:
+    return _active
+
+
+def span(name: str, category: str, **attributes: Any) -> Any:
+    """:meth:`Tracer.span` on the active tracer, or a no-op context."""
+
+    tracer = _active
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.span(name, category, **attributes)
+
+
+def size_of(value: Any) -> int:
+    """Size in bytes of ``value`` as UTF-8 text or JSON."""
+
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(str(value).encode("utf-8"))
@@ -0,0 +1,269 @@
+"""Pooled keep-alive HTTP transport for ``http`` adapters.
+
+:class:`HTTPTransport` keeps a pool of persistent ``http.client`` connections
+per host and hands them out to :meth:`HTTPTransport.send`.  Each pool holds at
+most ``max_connections`` connections, as set by the first endpoint of that host;
+further requests wait for one to be released.  Responses are decoded from gzip when the server compresses them, and
+a connection goes back to the pool once its response has been read to the end.
+A request on a reused connection that the server has meanwhile closed is
+retried once on a fresh connection.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+import http.client
+import io
+import socket
+import threading
+import zlib
+
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0
+
+# Errors that show a pooled connection was closed by the server while idle.
+_STALE = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+@dataclass
+class Endpoint:
+    """A prepared request target: parsed URL, encoded headers and limits."""
+
+    url: str
+    method: str = "POST"
+    headers: Dict[str, str] = field(default_factory=dict)
+    connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT
+    read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT
+    max_connections: int = DEFAULT_MAX_CONNECTIONS
+
+    def __post_init__(self) -> None:
+        parts = urlsplit(self.url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {self.url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.method = self.method.upper()
+
+    @classmethod
+    def from_adapter(cls, adapter: Dict[str, Any], url: Optional[str] = None) -> "Endpoint":
+        """Build the endpoint described by an ``http`` adapter spec.
+
+        ``timeout`` is either one number for both phases or
+        ``{"connect": seconds, "read": seconds}``.
+        """
+
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        headers.update(adapter.get("headers", {}))
+        timeout = adapter.get("timeout", {})
+        if not isinstance(timeout, dict):
+            timeout = {"connect": timeout, "read": timeout}
+        return cls(
+            url or adapter.get("url"),
+            adapter.get("method", "POST"),
+            headers,
+            timeout.get("connect", DEFAULT_CONNECT_TIMEOUT),
+            timeout.get("read", DEFAULT_READ_TIMEOUT),
+            adapter.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+        )
+
+
+class _Pool:
+    def __init__(self, scheme: str, host: str, port: int, max_connections: int):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.idle: List[http.client.HTTPConnection] = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max(max_connections, 1))
+        self.opened = 0
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return a connection and whether it was used before."""
+
+        self.slots.acquire()
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+            self.opened += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port), False
+        return http.client.HTTPConnection(self.host, self.port), False
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class Response:
+    """A response whose connection returns to its pool once fully read.
+
+    Iterating yields the body line by line as it arrives, which suits
+    newline-delimited streaming APIs; :meth:`read` returns the whole body.
+    """
+
+    def __init__(self, pool: _Pool, conn: http.client.HTTPConnection, raw: http.client.HTTPResponse):
+        self.status = raw.status
+        self.headers = raw.headers
+        self._pool = pool
+        self._conn = conn
+        self._raw = raw
+        self._done = False
+        encoding = (raw.getheader("Content-Encoding") or "").lower()
+        self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding == "gzip" else None
+
+    def __enter__(self) -> "Response":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _decode(self, data: bytes, final: bool = False) -> bytes:
+        if self._decoder is None:
+            return data
+        out = self._decoder.decompress(data)
+        if final:
+            out += self._decoder.flush()
+        return out
+
+    def read(self) -> bytes:
+        try:
+            body = self._decode(self._raw.read(), final=True)
+        except BaseException:
+            self._finish(False)
+            raise
+        self._finish(not self._raw.will_close)
+        return body
+
+    def __iter__(self) -> Iterator[bytes]:
+        # Pieces of the current line; only newly received data is scanned.
+        pending: List[bytes] = []
+        try:
+            while True:
+                data = self._raw.read1(65536)
+                if not data:
+                    break
+                *lines, rest = self._decode(data).split(b"\n")
+                for line in lines:
+                    pending.append(line)
+                    yield b"".join(pending) + b"\n"
+                    pending = []
+                if rest:
+                    pending.append(rest)
+            pending.append(self._decode(b"", final=True))
+        except BaseException:
+            self._finish(False)
+            raise
+        self._finish(not self._raw.will_close)
+        tail = b"".join(pending)
+        if tail:
+            yield tail
+
+    def _finish(self, reusable: bool) -> None:
+        if not self._done:
+            self._done = True
+            self._pool.release(self._conn, reusable)
+
+    def close(self) -> None:
+        # A partly read body would corrupt the next response on the connection.
+        self._finish(False)
+
+
+class HTTPTransport:
+    """Per-host pools of persistent HTTP connections."""
+
+    def __init__(self) -> None:
+        self._pools: Dict[Tuple[str, str, int], _Pool] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, endpoint: Endpoint) -> _Pool:
+        # One pool per host, so its cap holds across endpoints; the first
+        # endpoint seen for a host sets ``max_connections``.
+        key = (endpoint.scheme, endpoint.host, endpoint.port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _Pool(
+                    endpoint.scheme, endpoint.host, endpoint.port, endpoint.max_connections
+                )
+            return pool
+
+    def send(self, endpoint: Endpoint, body: Optional[bytes] = None) -> Response:
+        """Send ``body`` to ``endpoint`` and return the open response.
+
+        Raises :class:`urllib.error.HTTPError` for 4xx/5xx statuses, like
+        ``urllib.request.urlopen``.
+        """
+
+        pool = self._pool(endpoint)
+        while True:
+            conn, reused = pool.acquire()
+            try:
+                if conn.sock is None:
+                    conn.timeout = endpoint.connect_timeout
+                    conn.connect()
+                    # Small JSON requests must not wait for delayed ACKs.
+                    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                conn.sock.settimeout(endpoint.read_timeout)
+                conn.request(endpoint.method, endpoint.path, body=body, headers=endpoint.headers)
+                raw = conn.getresponse()
+            except _STALE:
+                pool.release(conn, False)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                pool.release(conn, False)
+                raise
+            break
+
+        resp = Response(pool, conn, raw)
+        if resp.status >= 400:
+            detail = resp.read()
+            raise HTTPError(endpoint.url, resp.status, raw.reason, resp.headers, io.BytesIO(detail))
+        return resp
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pools = list(self._pools.values())
+        return {
+            "pools": len(pools),
+            "connections_opened": sum(p.opened for p in pools),
+            "idle_connections": sum(len(p.idle) for p in pools),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+
+_default_transport: Optional[HTTPTransport] = None
+_default_lock = threading.Lock()
+
+
+def default_transport() -> HTTPTransport:
+    """Return the transport shared by executors that are not given one."""
+
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HTTPTransport()
+        return _default_transport
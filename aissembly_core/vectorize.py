@@ -0,0 +1,242 @@
+"""NumPy execution of arithmetic ``for`` loops.
+
+The tree-walker evaluates a loop body once per iteration.  When the body is
+one of the shapes below and ``E`` is built only from numbers, ``i``, variables
+of enclosing scopes and ``+ - * / %``, ``abs``, ``min`` and ``max``,
+:func:`run_loop` evaluates ``E`` for all iterations at once over a NumPy array
+of ``i``:
+
+- ``op.append(acc, E)`` and ``acc + [E]`` build a list, element-wise.
+- ``acc + E``, ``E + acc``, ``acc - E``, ``acc * E``, ``E * acc``,
+  ``min(acc, E)`` and ``max(acc, E)`` reduce ``E`` into ``acc``.
+
+Results are the ones the interpreter computes.  Integer arithmetic is only
+vectorized when interval bounds prove every intermediate stays below 2**53, so
+it neither overflows ``int64`` nor loses precision when mixed with floats.
+Integer sums and products are accumulated as Python ints.  Float reductions
+are accumulated in iteration order (``ufunc.accumulate``), never pairwise.
+``%`` on floats and ``min``/``max`` on floats are left to the interpreter,
+since NumPy differs on signed zeros and NaN.  A zero divisor, a value that is
+not an ``int``/``float``, or any other case outside these rules returns
+:data:`NOT_VECTORIZED` and the loop runs in the interpreter as before, raising
+where it always did.
+
+NumPy is optional; without it every loop is interpreted.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+import math
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .parser import Call, ListLiteral, Number
+from .resolver import SlotVar
+
+# Shorter loops are cheaper to interpret than to set up arrays for.
+MIN_ITERATIONS = 32
+# Iterations evaluated per array, to bound memory on very long loops.
+CHUNK = 1 << 16
+# Integers below this are exact both as int64 and as float64.
+_EXACT = 2 ** 53
+_INT64 = 2 ** 63
+
+_UNARY = {"abs"}
+_BINARY = {"op.add", "op.sub", "op.mul", "op.div", "op.mod", "min", "max"}
+_REDUCTIONS = {"op.add", "op.sub", "op.mul", "min", "max"}
+# Reductions where ``E op acc`` equals ``acc op E``.
+_COMMUTATIVE = {"op.add", "op.mul", "min", "max"}
+
+
+class _NotVectorized:
+    def __repr__(self) -> str:
+        return "<not vectorized>"
+
+
+NOT_VECTORIZED = _NotVectorized()
+
+
+class _Fallback(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class LoopPlan:
+    # ``"append"``, ``"concat"`` or the ``op.*``/builtin name of a reduction.
+    kind: str
+    element: Any
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _is_i(node: Any) -> bool:
+    return isinstance(node, SlotVar) and node.depth == 0 and node.slot == 0
+
+
+def _is_acc(node: Any) -> bool:
+    return isinstance(node, SlotVar) and node.depth == 0 and node.slot == 1
+
+
+def _element(node: Any) -> bool:
+    """Whether ``node`` is arithmetic over ``i`` and loop invariants."""
+
+    if isinstance(node, Number):
+        return type(node.value) in (int, float)
+    if isinstance(node, SlotVar):
+        return node.depth > 0 or node.slot == 0
+    if isinstance(node, Call) and not node.kwargs:
+        if node.name in _UNARY:
+            return len(node.args) == 1 and _element(node.args[0])
+        if node.name in _BINARY:
+            return len(node.args) == 2 and all(_element(a) for a in node.args)
+    return False
+
+
+def analyze(body: Any) -> Optional[LoopPlan]:
+    """Return the vectorizable shape of a resolved ``for`` body, or ``None``."""
+
+    if not isinstance(body, Call) or body.kwargs or len(body.args) != 2:
+        return None
+    a, b = body.args
+    name = body.name
+    if name == "op.append" and _is_acc(a) and _element(b):
+        return LoopPlan("append", b)
+    if (
+        name in ("op.add", "op.concat")
+        and _is_acc(a)
+        and isinstance(b, ListLiteral)
+        and len(b.elements) == 1
+        and _element(b.elements[0])
+    ):
+        return LoopPlan("concat", b.elements[0])
+    if name in _REDUCTIONS:
+        if _is_acc(a) and _element(b):
+            return LoopPlan(name, b)
+        if name in _COMMUTATIVE and _is_acc(b) and _element(a):
+            return LoopPlan(name, a)
+    return None
+
+
+# A value of ``E``: (is_float, scalar or array, bound on |value| for ints).
+_Value = Tuple[bool, Any, int]
+
+
+def _scalar(value: Any) -> _Value:
+    if type(value) is int:
+        return False, value, abs(value)
+    if type(value) is float:
+        return True, value, 0
+    raise _Fallback
+
+
+def _evaluate(node: Any, i: Any, i_bound: int, executor: Any, frame: Any) -> _Value:
+    if _is_i(node):
+        return False, i, i_bound
+    if isinstance(node, Number):
+        return _scalar(node.value)
+    if isinstance(node, SlotVar):
+        return _scalar(executor.eval_expr(node, frame))
+    args = [_evaluate(a, i, i_bound, executor, frame) for a in node.args]
+    if not any(isinstance(v, np.ndarray) for _, v, _ in args):
+        # Loop invariant: Python computes it exactly as the interpreter does.
+        values = [v for _, v, _ in args]
+        if node.name in ("op.div", "op.mod") and values[1] == 0:
+            raise _Fallback
+        from .executor import BUILTINS
+
+        return _scalar(BUILTINS[node.name](*values))
+    for is_float, _, bound in args:
+        if not is_float and bound >= _EXACT:
+            raise _Fallback
+    if node.name == "abs":
+        is_float, v, bound = args[0]
+        return is_float, np.abs(v), bound
+    (fa, va, ba), (fb, vb, bb) = args
+    is_float = fa or fb
+    name = node.name
+    if name in ("op.div", "op.mod") and np.any(vb == 0):
+        raise _Fallback
+    if name == "op.div":
+        return True, np.true_divide(va, vb), 0
+    if is_float and name in ("op.mod", "min", "max"):
+        raise _Fallback
+    if name == "op.add":
+        return is_float, va + vb, ba + bb
+    if name == "op.sub":
+        return is_float, va - vb, ba + bb
+    if name == "op.mul":
+        return is_float, va * vb, ba * bb
+    if name == "op.mod":
+        return False, np.remainder(va, vb), bb
+    if name == "min":
+        return False, np.minimum(va, vb), max(ba, bb)
+    return False, np.maximum(va, vb), max(ba, bb)
+
+
+def _elements(plan: LoopPlan, iterations: range, executor: Any, frame: Any) -> Any:
+    i_bound = max(abs(iterations[0]), abs(iterations[-1]))
+    if i_bound >= _EXACT:
+        raise _Fallback
+    for pos in range(0, len(iterations), CHUNK):
+        chunk = iterations[pos:pos + CHUNK]
+        i = np.arange(chunk.start, chunk.stop, chunk.step, dtype=np.int64)
+        is_float, value, bound = _evaluate(plan.element, i, i_bound, executor, frame)
+        if not is_float and bound >= _EXACT:
+            raise _Fallback
+        if not isinstance(value, np.ndarray):
+            value = np.full(len(chunk), value, dtype=np.float64 if is_float else np.int64)
+        yield is_float, value, bound
+
+
+def _reduce(kind: str, acc: Any, is_float: bool, x: Any, bound: int) -> Any:
+    if type(acc) not in (int, float):
+        raise _Fallback
+    if type(acc) is int and not is_float:
+        if kind == "op.mul":
+            return math.prod(x.tolist(), start=acc)
+        if kind == "min":
+            return min(acc, int(x.min()))
+        if kind == "max":
+            return max(acc, int(x.max()))
+        if len(x) * bound >= _INT64:
+            raise _Fallback
+        total = int(x.sum())
+        return acc + total if kind == "op.add" else acc - total
+    if kind in ("min", "max") or (type(acc) is int and abs(acc) >= _EXACT):
+        raise _Fallback
+    ufunc = {"op.add": np.add, "op.sub": np.subtract, "op.mul": np.multiply}[kind]
+    steps = np.concatenate((np.array([acc], dtype=np.float64), x.astype(np.float64)))
+    return float(ufunc.accumulate(steps)[-1])
+
+
+def run_loop(plan: LoopPlan, iterations: range, acc: Any, executor: Any, frame: Any) -> Any:
+    """Return the value of the loop, or :data:`NOT_VECTORIZED`.
+
+    ``frame`` is the loop's own frame; it resolves the enclosing variables.
+    """
+
+    if np is None or len(iterations) == 0:
+        return NOT_VECTORIZED
+    if plan.kind in ("append", "concat") and type(acc) is not list:
+        return NOT_VECTORIZED
+    try:
+        with np.errstate(all="ignore"):
+            if plan.kind in ("append", "concat"):
+                items: List[Any] = []
+                for _, value, _ in _elements(plan, iterations, executor, frame):
+                    items.extend(value.tolist())
+                if plan.kind == "concat":
+                    return acc + items
+                acc.extend(items)
+                return acc
+            for is_float, value, bound in _elements(plan, iterations, executor, frame):
+                acc = _reduce(plan.kind, acc, is_float, value, bound)
+            return acc
+    except (_Fallback, KeyError):
+        return NOT_VECTORIZED
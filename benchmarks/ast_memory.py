@@ -0,0 +1,134 @@
+"""Memory and traversal cost of the AST node representation.
+
+Run with ``python benchmarks/ast_memory.py``.  A synthetic program of about
+100k nodes is parsed and measured in three forms:
+
+- ``dataclass``: the previous representation, plain ``@dataclass`` nodes with
+  a per-instance ``__dict__``, a fresh ``kwargs`` dict per call and one string
+  object per name occurrence.
+- ``slotted``: the current nodes, with interned names and the shared empty
+  ``kwargs``.
+- ``hash_consed``: ``slotted`` after :func:`~aissembly_core.parser.hash_cons`.
+
+Sizes are the deep ``sys.getsizeof`` of every distinct object reachable from
+the program.  ``find_key_with_path`` times a full traversal of each form
+(best of three).
+"""
+import os
+import sys
+import time
+from dataclasses import fields, make_dataclass
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aissembly_core.artifacts import NODE_TYPES
+from aissembly_core.optimizations.accuracy_opt_passes import find_key_with_path
+from aissembly_core.parser import Node, ParserOptions, parse_program
+
+TARGET_NODES = 100_000
+
+STATEMENT = (
+    'let v{n} = chat(prompt="Summarize " + get(xs, {a}), model="m") + str({b})\n'
+    "let w{n} = cond(test=v{n} == \"\") -> [1, 2, {a}] ::else-> for(range(0, {b}), init=0) -> acc + i\n"
+)
+
+_LEGACY = {
+    cls: make_dataclass(f"Legacy{cls.__name__}", [f.name for f in fields(cls)])
+    for cls in NODE_TYPES
+}
+
+
+HEADER = 'let xs = ["a", "b", "c", "d", "e", "f", "g", "h", "i", "j"]\n'
+
+
+def _source() -> str:
+    one = STATEMENT.format(n=0, a=0, b=0)
+    per = _count(parse_program(HEADER + one)) - _count(parse_program(HEADER))
+    body = (STATEMENT.format(n=n, a=n % 10, b=n % 7) for n in range(TARGET_NODES // per + 1))
+    return HEADER + "".join(body)
+
+
+def _count(program) -> int:
+    seen = 0
+    stack = [program]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, Node):
+            seen += 1
+            stack.extend(getattr(obj, f) for f in obj.__slots__)
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif hasattr(obj, "values"):
+            stack.extend(obj.values())
+    return seen
+
+
+def _legacy(value):
+    if isinstance(value, list):
+        return [_legacy(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_legacy(v) for v in value)
+    if hasattr(value, "items") and not isinstance(value, Node):
+        return {k: _legacy(v) for k, v in value.items()}
+    if isinstance(value, str):
+        # The old builder made a new string for every token.
+        return value.encode().decode()
+    cls = _LEGACY.get(type(value))
+    if cls is None:
+        return value
+    return cls(*(_legacy(getattr(value, f)) for f in value.__slots__))
+
+
+def deep_size(root) -> int:
+    seen = set()
+    total = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, Node):
+            stack.extend(getattr(obj, f) for f in obj.__slots__)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            stack.append(obj.__dict__)
+    return total
+
+
+def _traverse(program, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in find_key_with_path(program, "prompt"):
+            pass
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    source = _source()
+    slotted = parse_program(source)
+    forms = {
+        "dataclass": _legacy(slotted),
+        "slotted": slotted,
+        "hash_consed": parse_program(source, ParserOptions(hash_cons=True)),
+    }
+    nodes = _count(slotted)
+    base = deep_size(forms["dataclass"])
+    print(f"{nodes} nodes")
+    for name, program in forms.items():
+        size = deep_size(program)
+        print(
+            f"{name:>12}: {size / 2**20:7.2f} MiB  ({size / base:5.2f}x)"
+            f"  find_key_with_path {_traverse(program) * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
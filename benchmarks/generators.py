@@ -0,0 +1,81 @@
+"""Synthetic Aissembly programs for the benchmark suite.
+
+Every generator returns program source.  Sizes are parameters so the same
+shapes serve both the quick and the full profile of ``benchmarks/suite.py``.
+"""
+
+# Statement shapes cycled through by :func:`flat_program`.  ``{n}`` is the
+# statement number and ``{p}`` the previous binding.
+_SHAPES = (
+    "let v{n} = ({p} * 3 + {n}) % 1000",
+    'let v{n} = "s{n}" + "-" + "t"',
+    "let v{n} = [{p}, {n}, {p} + 1]",
+    "let v{n} = if ({p} > 10) ? {p} - 1 : {p} + 1",
+    'let v{n} = {{"k": {n}, "v": {p}}}',
+    "let v{n} = max({p}, {n}) - min({p}, 3)",
+)
+
+
+def flat_program(statements: int) -> str:
+    """``statements`` top-level ``let`` statements of mixed shapes.
+
+    Numeric bindings chain through the previous numeric binding, so the
+    program also exercises variable lookup.
+    """
+
+    lines = ["let v0 = 1"]
+    prev = "v0"
+    for n in range(1, statements):
+        shape = _SHAPES[n % len(_SHAPES)]
+        lines.append(shape.format(n=n, p=prev))
+        if shape.startswith(("let v{n} = ({p}", "let v{n} = if", "let v{n} = max")):
+            prev = f"v{n}"
+    return "\n".join(lines) + "\n"
+
+
+def deep_expression(depth: int) -> str:
+    """One binding whose right-hand side is a left-leaning chain of ``depth`` operators."""
+
+    ops = ("+", "*", "-", "%")
+    terms = ["1"]
+    for n in range(depth):
+        op = ops[n % len(ops)]
+        terms.append(f"{op} {n % 5 + 2}")
+    return "let x = " + " ".join(terms) + "\n"
+
+
+def big_loop(iterations: int) -> str:
+    """A ``for`` loop of ``iterations`` arithmetic-only iterations."""
+
+    return f"let total = for(range(0, {iterations}), init=0) -> acc + i * 2 % 7\n"
+
+
+def map_loop(iterations: int) -> str:
+    """A ``for`` loop building a list of ``iterations`` arithmetic results."""
+
+    return f"let out = for(range(0, {iterations}), init=[]) -> op.append(acc, (i * i + 3) / 7 - i % 5)\n"
+
+
+def llm_loop(iterations: int, function: str = "chat") -> str:
+    """A ``for`` loop calling the LLM function ``function`` once per iteration."""
+
+    return (
+        'let words = ["a", "b", "c", "d", "e", "f", "g", "h", "i", "j"]\n'
+        f"let out = for(range(0, {iterations}), init=[]) -> "
+        f"op.append(acc, {function}(get(words, i % 10), i))\n"
+    )
+
+
+def prompt_program(calls: int, function: str = "chat") -> str:
+    """``calls`` statements each calling ``function`` with a distinct prompt."""
+
+    return "".join(f'let r{n} = {function}(prompt="question {n}")\n' for n in range(calls))
+
+
+def repeated_calls(statements: int) -> str:
+    """Statements that repeat the same pure subexpressions, for CSE."""
+
+    lines = ["let xs = [1, 2, 3, 4]"]
+    for n in range(statements):
+        lines.append(f"let r{n} = len(xs) * max(len(xs), {n % 3}) + len(xs)")
+    return "\n".join(lines) + "\n"
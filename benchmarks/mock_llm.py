@@ -0,0 +1,45 @@
+"""Stand-in LLM backend for benchmarks, loaded as a Python adapter.
+
+Every call sleeps for ``AISSEMBLY_MOCK_LATENCY`` seconds plus a uniform
+random ``[0, AISSEMBLY_MOCK_JITTER)`` and returns a deterministic reply.
+A batch call sleeps once for the whole batch.  Both variables are read on
+every call, so one process can benchmark several latency profiles.  The
+jitter is drawn from a generator seeded by ``AISSEMBLY_MOCK_SEED`` (default
+0) so runs are repeatable.
+"""
+import os
+import random
+import threading
+import time
+
+_rng = random.Random(int(os.environ.get("AISSEMBLY_MOCK_SEED", "0")))
+_lock = threading.Lock()
+
+
+def _wait() -> None:
+    latency = float(os.environ.get("AISSEMBLY_MOCK_LATENCY", "0"))
+    jitter = float(os.environ.get("AISSEMBLY_MOCK_JITTER", "0"))
+    with _lock:
+        delay = latency + (_rng.random() * jitter if jitter else 0.0)
+    if delay > 0:
+        time.sleep(delay)
+
+
+def complete(*args, **kwargs):
+    _wait()
+    text = kwargs.get("prompt", args[0] if args else "")
+    return f"reply to {text}"
+
+
+def complete_batch(payloads):
+    _wait()
+    return [f"reply to {p['kwargs'].get('prompt', (p['args'] or [''])[0])}" for p in payloads]
+
+
+def rewrite(system, prompt):
+    """Answer a prompt-rewriting request of the accuracy/decomposition passes."""
+
+    _wait()
+    given = prompt.rsplit("GIVEN PROMPT: ", 1)[-1].strip().strip('"')
+    return f'"{given}, precisely"'
+
@@ -0,0 +1,64 @@
+"""Cold vs warm parser construction benchmark.
+
+Run with ``python benchmarks/parser_cache.py``.  Three scenarios are measured
+for a short program:
+
+- ``cold``: grammar analysed from scratch (the behaviour before caching).
+- ``warm_disk``: a new process loading the serialized LALR tables.
+- ``warm_process``: the in-process parser singleton.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lark import Lark
+
+from aissembly_core import parser as parser_mod
+from aissembly_core.parser import GRAMMAR, ParserOptions, TreeIndenter, parse_program
+
+SOURCE = """
+let x = 7 + 6
+let tag = cond(test=x >= 10) -> "ok" ::else-> "ng"
+let total = for(range(1, 4), init=0) -> acc + i
+"""
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(repeat: int = 20) -> None:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        opts = ParserOptions(parser_cache_dir=cache_dir)
+
+        def cold():
+            Lark(GRAMMAR, parser="lalr", postlex=TreeIndenter(), start="start").parse(SOURCE.strip() + "\n")
+
+        def warm_disk():
+            parser_mod._parsers = type(parser_mod._parsers)()
+            parse_program(SOURCE, opts)
+
+        def warm_process():
+            parse_program(SOURCE, opts)
+
+        parse_program(SOURCE, opts)  # prime the disk cache
+        results = {
+            "cold": _best(cold, repeat),
+            "warm_disk": _best(warm_disk, repeat),
+            "warm_process": _best(warm_process, repeat),
+        }
+
+    for name, secs in results.items():
+        print(f"{name:>13}: {secs * 1000:8.3f} ms  ({results['cold'] / secs:6.1f}x vs cold)")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
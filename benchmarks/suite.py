@@ -0,0 +1,356 @@
+"""Performance suite for parsing, optimizing and executing programs.
+
+Run every benchmark with one command::
+
+    python benchmarks/suite.py                 # quick profile
+    python benchmarks/suite.py --profile full  # 100k statements, 1M iterations
+
+The programs come from :mod:`generators`.  LLM functions are served by
+:mod:`mock_llm`, a Python adapter that sleeps for ``--latency`` seconds plus a
+random ``--jitter`` per request, so runs measure the runtime rather than a
+model.  Each case reports the best and the median of its repetitions.
+
+Results are written as JSON to ``--output`` and compared with ``--baseline``
+(``benchmarks/baseline.json`` by default).  A case regresses when its best
+time exceeds the baseline by more than ``--threshold`` (a fraction; a
+baseline entry may set its own ``threshold``) and by more than ``--min-delta``
+seconds.  Regressions make the command exit with status 1.
+``--update-baseline`` stores the results as the new baseline instead.
+Baselines are only comparable on the machine and profile that produced them.
+"""
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(HERE))
+sys.path.append(HERE)
+
+import generators
+from aissembly_core import __version__
+from aissembly_core.compiler import compile_program
+from aissembly_core.executor import Executor
+from aissembly_core.optimizer import optimizer
+from aissembly_core.parser import ParserOptions, parse_program
+from aissembly_core.unparser import program_to_source
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(HERE), "bench_results.json")
+
+PROFILES: Dict[str, Dict[str, int]] = {
+    "quick": {
+        "statements": 1_000,
+        "large_statements": 10_000,
+        "depth": 300,
+        "iterations": 100_000,
+        "llm_iterations": 100,
+        "prompts": 32,
+        "repeat": 3,
+    },
+    "full": {
+        "statements": 10_000,
+        "large_statements": 100_000,
+        "depth": 500,
+        "iterations": 1_000_000,
+        "llm_iterations": 1_000,
+        "prompts": 256,
+        "repeat": 3,
+    },
+}
+
+
+@dataclass
+class Case:
+    name: str
+    # Builds the inputs (untimed) and returns the function to time.
+    setup: Callable[["Context"], Callable[[], Any]]
+    # Large cases run once whatever the profile's ``repeat``.
+    once: bool = False
+
+
+class Context:
+    """Profile sizes, the mock LLM definitions and memoized inputs."""
+
+    def __init__(self, sizes: Dict[str, int], workdir: str):
+        self.sizes = sizes
+        self.workdir = workdir
+        self._memo: Dict[Any, Any] = {}
+        adapter = os.path.join(HERE, "mock_llm.py")
+
+        def spec(name: str, function: str, batch: bool = False) -> Dict[str, Any]:
+            item = {"name": name, "model": "mock", "adapter": {"type": "python", "path": adapter, "function": function}}
+            if batch:
+                item["adapter"]["batch"] = {"mode": "array", "function": "complete_batch"}
+            return item
+
+        self.llm_defs = {
+            d["name"]: d
+            for d in (
+                spec("chat", "complete"),
+                spec("chat_batched", "complete", batch=True),
+                spec("accuracy_opt_passes", "rewrite"),
+                spec("decomposition_opt_passes", "rewrite"),
+            )
+        }
+        self.llm_path = os.path.join(workdir, "llm_functions.json")
+        with open(self.llm_path, "w", encoding="utf-8") as f:
+            json.dump(list(self.llm_defs.values()), f)
+
+    def source(self, generator: Callable[..., str], *args: Any) -> str:
+        key = ("source", generator.__name__) + args
+        if key not in self._memo:
+            self._memo[key] = generator(*args)
+        return self._memo[key]
+
+    def program(self, generator: Callable[..., str], *args: Any) -> Any:
+        key = ("program", generator.__name__) + args
+        if key not in self._memo:
+            self._memo[key] = parse_program(self.source(generator, *args))
+        return self._memo[key]
+
+    def executor(self, **kwargs: Any) -> Executor:
+        return Executor(self.llm_defs, on_token=None, **kwargs)
+
+    def options(self, **kwargs: Any) -> SimpleNamespace:
+        base = vars(ParserOptions()).copy()
+        base.update(llm=self.llm_path, **kwargs)
+        return SimpleNamespace(**base)
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, once: bool = False) -> Callable:
+    def register(setup: Callable[[Context], Callable[[], Any]]) -> Callable:
+        CASES.append(Case(name, setup, once))
+        return setup
+
+    return register
+
+
+# --- parse / unparse ---
+
+@case("parse.flat")
+def _parse_flat(ctx: Context):
+    src = ctx.source(generators.flat_program, ctx.sizes["statements"])
+    return lambda: parse_program(src)
+
+
+@case("parse.flat_large", once=True)
+def _parse_flat_large(ctx: Context):
+    src = ctx.source(generators.flat_program, ctx.sizes["large_statements"])
+    return lambda: parse_program(src)
+
+
+@case("parse.deep_expression")
+def _parse_deep(ctx: Context):
+    src = ctx.source(generators.deep_expression, ctx.sizes["depth"])
+    return lambda: parse_program(src)
+
+
+@case("unparse.flat_large")
+def _unparse_flat_large(ctx: Context):
+    prog = ctx.program(generators.flat_program, ctx.sizes["large_statements"])
+    return lambda: program_to_source(prog)
+
+
+# --- execute ---
+
+@case("execute.flat")
+def _execute_flat(ctx: Context):
+    prog = ctx.program(generators.flat_program, ctx.sizes["statements"])
+    return lambda: ctx.executor().run(prog, {"seed": 0})
+
+
+@case("execute.deep_expression")
+def _execute_deep(ctx: Context):
+    prog = ctx.program(generators.deep_expression, ctx.sizes["depth"])
+    return lambda: ctx.executor().run(prog, {"seed": 0})
+
+
+@case("execute.for_loop")
+def _execute_loop(ctx: Context):
+    prog = ctx.program(generators.big_loop, ctx.sizes["iterations"])
+    return lambda: ctx.executor(vectorize=False).run(prog, {"seed": 0})
+
+
+@case("execute.for_loop_vectorized")
+def _execute_loop_vectorized(ctx: Context):
+    prog = ctx.program(generators.big_loop, ctx.sizes["iterations"])
+    return lambda: ctx.executor().run(prog, {"seed": 0})
+
+
+@case("execute.map_loop")
+def _execute_map_loop(ctx: Context):
+    prog = ctx.program(generators.map_loop, ctx.sizes["iterations"])
+    return lambda: ctx.executor(vectorize=False).run(prog, {"seed": 0})
+
+
+@case("execute.map_loop_vectorized")
+def _execute_map_loop_vectorized(ctx: Context):
+    prog = ctx.program(generators.map_loop, ctx.sizes["iterations"])
+    return lambda: ctx.executor().run(prog, {"seed": 0})
+
+
+@case("execute.for_loop_compiled")
+def _execute_loop_compiled(ctx: Context):
+    compiled = compile_program(ctx.program(generators.big_loop, ctx.sizes["iterations"]))
+    return lambda: compiled.run(ctx.executor())
+
+
+@case("execute.llm_loop_sequential")
+def _execute_llm_loop(ctx: Context):
+    prog = ctx.program(generators.llm_loop, ctx.sizes["llm_iterations"])
+    return lambda: ctx.executor(batch_window=0).run(prog, {"seed": 0})
+
+
+@case("execute.llm_loop_batched")
+def _execute_llm_loop_batched(ctx: Context):
+    prog = ctx.program(generators.llm_loop, ctx.sizes["llm_iterations"], "chat_batched")
+    return lambda: ctx.executor().run(prog, {"seed": 0})
+
+
+@case("execute.llm_statements_concurrent")
+def _execute_llm_statements(ctx: Context):
+    prog = ctx.program(generators.prompt_program, ctx.sizes["prompts"])
+    return lambda: ctx.executor(max_concurrency=8).run(prog, {"seed": 0})
+
+
+# --- optimize ---
+
+@case("optimize.constant_folding")
+def _optimize_folding(ctx: Context):
+    prog = ctx.program(generators.flat_program, ctx.sizes["statements"])
+    options = ctx.options(constant_folding_opt_passes=3)
+    return lambda: optimizer(prog, options)
+
+
+@case("optimize.cse")
+def _optimize_cse(ctx: Context):
+    prog = ctx.program(generators.repeated_calls, ctx.sizes["statements"])
+    options = ctx.options(cse_opt_passes=3)
+    return lambda: optimizer(prog, options)
+
+
+@case("optimize.accuracy")
+def _optimize_accuracy(ctx: Context):
+    prog = ctx.program(generators.prompt_program, ctx.sizes["prompts"])
+    runs = iter(range(1_000_000))
+
+    def run():
+        # A fresh rewrite memo per repetition, so every prompt hits the mock.
+        cache_dir = os.path.join(ctx.workdir, f"rewrites{next(runs)}")
+        return optimizer(prog, ctx.options(accuracy_opt_passes=1, opt_concurrency=8, cache_dir=cache_dir))
+
+    return run
+
+
+def run_cases(profile: str, pattern: Optional[str] = None, log: Callable[[str], None] = print) -> Dict[str, Any]:
+    sizes = PROFILES[profile]
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = Context(sizes, workdir)
+        for c in CASES:
+            if pattern and not fnmatch.fnmatch(c.name, pattern):
+                continue
+            fn = c.setup(ctx)
+            times = []
+            for _ in range(1 if c.once else sizes["repeat"]):
+                # Some passes print the rewritten program; keep the report readable.
+                with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+                    t0 = time.perf_counter()
+                    fn()
+                    times.append(time.perf_counter() - t0)
+            results[c.name] = {
+                "seconds": min(times),
+                "median": statistics.median(times),
+                "repeat": len(times),
+            }
+            log(f"{c.name:>34}: {min(times) * 1000:10.2f} ms")
+    return {
+        "meta": {
+            "profile": profile,
+            "sizes": sizes,
+            "latency": float(os.environ.get("AISSEMBLY_MOCK_LATENCY", "0")),
+            "jitter": float(os.environ.get("AISSEMBLY_MOCK_JITTER", "0")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "version": __version__,
+        },
+        "results": results,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float) -> List[str]:
+    """Return a report line for every case slower than its baseline allows."""
+
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        current = results["results"].get(name)
+        if current is None:
+            continue
+        limit = base.get("threshold", threshold)
+        old, new = base["seconds"], current["seconds"]
+        if new > old * (1 + limit) and new - old > min_delta:
+            regressions.append(
+                f"{name}: {new * 1000:.2f} ms vs baseline {old * 1000:.2f} ms "
+                f"(+{(new / old - 1) * 100:.0f}%, allowed +{limit * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the Aissembly benchmark suite")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--case", dest="pattern", default=None, help="Only run cases matching this glob")
+    parser.add_argument("--latency", type=float, default=0.002, help="Mock LLM latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.001, help="Extra uniform random latency in seconds")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown as a fraction")
+    parser.add_argument("--min-delta", dest="min_delta", type=float, default=0.005,
+                        help="Ignore slowdowns smaller than this many seconds")
+    parser.add_argument("--update-baseline", dest="update_baseline", action="store_true",
+                        help="Store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    os.environ["AISSEMBLY_MOCK_LATENCY"] = str(args.latency)
+    os.environ["AISSEMBLY_MOCK_JITTER"] = str(args.jitter)
+    results = run_cases(args.profile, args.pattern)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("profile") != args.profile:
+        print(f"baseline was recorded with profile {baseline.get('meta', {}).get('profile')!r}; not compared")
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("no regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.adapters import CallPlan, load_adapter_module
+
+ADAPTER = """
+with open(__file__ + ".imports", "a") as f:
+    f.write("import\\n")
+
+VERSION = {version}
+
+def tag(text):
+    return f"{{text}}-v{{VERSION}}"
+"""
+
+
+def _write(path, version):
+    path.write_text(ADAPTER.format(version=version))
+    os.utime(path, ns=(version * 10**9, version * 10**9))
+
+
+def test_module_is_imported_once_and_reloaded_on_change(tmp_path):
+    adapter = tmp_path / "adapter.py"
+    imports = tmp_path / "adapter.py.imports"
+    _write(adapter, 1)
+    defs = {
+        "tag": {
+            "name": "tag",
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": "tag"},
+        }
+    }
+    exe = Executor(defs)
+    prog = parse_program('let out = for (range(0, 50), init="") -> tag("x")')
+    assert exe.run(prog)["out"] == "x-v1"
+    assert Executor(defs).run(prog)["out"] == "x-v1"
+    assert imports.read_text().count("import") == 1
+
+    _write(adapter, 2)
+    assert exe.run(prog)["out"] == "x-v2"
+    assert imports.read_text().count("import") == 2
+
+
+def test_http_plan_precomputes_names_defaults_and_headers():
+    spec = {
+        "name": "gen",
+        "model": "m",
+        "adapter": {"type": "http", "url": "http://localhost:9/api", "headers": {"X-Key": "k"}},
+        "parameters": {
+            "properties": {
+                "system": {"default": "be brief"},
+                "prompt": {},
+                "stream": {"default": False},
+            }
+        },
+    }
+    plan = CallPlan.from_spec(spec)
+    assert plan.param_names == ("system", "prompt", "stream")
+    assert plan.defaults == (("system", "be brief"), ("stream", False))
+    assert plan.endpoint.headers["X-Key"] == "k"
+    assert plan.endpoint.path == "/api"
+    assert plan.payload(["s", "p"], {"stream": True}) == {
+        "model": "m",
+        "system": "s",
+        "prompt": "p",
+        "stream": True,
+    }
+    assert plan.payload([], {"prompt": "p"}) == {
+        "model": "m",
+        "prompt": "p",
+        "system": "be brief",
+        "stream": False,
+    }
+
+    exe = Executor({"gen": spec})
+    assert exe.plan("gen") is exe.plan("gen")
+    # Replacing the definition compiles a new plan.
+    exe.llm_defs["gen"] = dict(spec, model="other")
+    assert exe.plan("gen").model == "other"
+
+
+def test_adapters_load_outside_a_global_lock(tmp_path):
+    slow = tmp_path / "slow.py"
+    slow.write_text("import time\ntime.sleep(0.5)\n")
+    inner = tmp_path / "inner.py"
+    inner.write_text("VALUE = 1\n")
+    outer = tmp_path / "outer.py"
+    outer.write_text(
+        "from aissembly_core.adapters import load_adapter_module\n"
+        f"VALUE = load_adapter_module({str(inner)!r})[0].VALUE + 1\n"
+    )
+    loaded = {}
+
+    def load(path):
+        loaded[path] = load_adapter_module(str(path))[0]
+
+    threads = [threading.Thread(target=load, args=(p,), daemon=True) for p in (slow, outer)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    threads[1].join(5)
+    # The nested load neither deadlocks nor waits for the slow import.
+    assert loaded[outer].VALUE == 2
+    assert time.monotonic() - start < 0.4
+    threads[0].join(5)
+    assert slow in loaded
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import artifacts
+from aissembly_core.artifacts import artifact_key, decode_program, encode_program
+from aissembly_core.parser import parse_program
+from aissembly_core.runtime import main
+
+SOURCE = """
+let xs = [1, 2.5, "a", true]
+let d = {"k": xs}
+let n = for(range(1, 4), init=0) -> acc + i
+let w = while(test=acc < 10, init=1) -> acc * 2
+let c = cond(test=n > 3) -> "big" ::else-> "small"
+let s = chat(prompt="hi", seed=1)
+"""
+
+
+def test_encoding_round_trips_every_node_type():
+    prog = parse_program(SOURCE)
+    data = encode_program(prog)
+    assert decode_program(data) == prog
+    assert "LetStmt" not in repr(data)
+
+
+def test_key_covers_source_defs_and_pass_options(tmp_path):
+    llm = tmp_path / "llm.json"
+    llm.write_text("[]")
+    options = SimpleNamespace(llm=str(llm), cse_opt_passes=0)
+    key = artifact_key(SOURCE, options)
+    assert artifact_key(SOURCE, options) == key
+    assert artifact_key(SOURCE + "\n", options) != key
+    assert artifact_key(SOURCE, SimpleNamespace(llm=str(llm), cse_opt_passes=1)) != key
+    # Options that cannot change the optimized program do not matter.
+    assert artifact_key(SOURCE, SimpleNamespace(llm=str(llm), max_concurrency=4)) == key
+    llm.write_text('[{"name": "f", "model": "m"}]')
+    assert artifact_key(SOURCE, options) != key
+
+
+def test_repeat_runs_skip_parsing_and_optimization(tmp_path, capsys, monkeypatch):
+    program = tmp_path / "prog.asl"
+    program.write_text("let a = 1 + 2\nlet b = a * 2\n")
+    cache = tmp_path / "artifacts"
+    argv = [str(program), "--artifact-cache", str(cache), "--constant_folding_opt_passes", "2"]
+    main(argv)
+    first = capsys.readouterr().out
+    assert len(os.listdir(cache)) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("front end ran on a cached program")
+
+    monkeypatch.setattr(artifacts, "parse_program", fail)
+    monkeypatch.setattr(artifacts, "optimizer", fail)
+    main(argv)
+    assert capsys.readouterr().out == first
+    main(argv + ["--engine", "compiled"])
+    assert json.loads(capsys.readouterr().out) == {"a": 3, "b": 6}
+
+
+def test_compile_builds_artifacts_ahead_of_time(tmp_path, capsys, monkeypatch):
+    program = tmp_path / "prog.asl"
+    program.write_text('let a = "x" + "y"\n')
+    cache = tmp_path / "artifacts"
+    main(["compile", str(program), "--artifact-cache", str(cache)])
+    path = capsys.readouterr().out.strip()
+    assert os.path.dirname(path) == str(cache) and os.path.exists(path)
+
+    monkeypatch.setattr(artifacts, "parse_program", None)
+    main([str(program), "--artifact-cache", str(cache), "--engine", "compiled"])
+    assert json.loads(capsys.readouterr().out) == {"a": "xy"}
+
+
+def test_corrupt_artifacts_are_rebuilt(tmp_path, capsys):
+    program = tmp_path / "prog.asl"
+    program.write_text("let a = 1\n")
+    cache = tmp_path / "artifacts"
+    main(["compile", str(program), "--artifact-cache", str(cache)])
+    path = capsys.readouterr().out.strip()
+    with open(path, "wb") as f:
+        f.write(b"garbage")
+    main([str(program), "--artifact-cache", str(cache)])
+    assert json.loads(capsys.readouterr().out) == {"a": 1}
+    assert artifacts.load_artifact(str(cache), os.path.basename(path)[:-5]) is not None
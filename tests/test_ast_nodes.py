@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.artifacts import decode_program, encode_program
+from aissembly_core.executor import Executor
+from aissembly_core.optimizations.accuracy_opt_passes import find_key_with_path
+from aissembly_core.optimizations.cse_opt_passes import eliminate_common_subexpressions
+from aissembly_core.parser import EMPTY_KWARGS, Call, Number, ParserOptions, Var, hash_cons, parse_program
+
+SOURCE = """
+let x = 2
+let a = chat(prompt="hi " + str(x + 1))
+let b = [x + 1, 1.0, 1, true]
+let c = for(range(0, 3), init=0) -> acc + (x + 1)
+let d = chat(prompt="hi " + str(x + 1))
+"""
+
+
+def test_nodes_are_slotted_with_interned_names_and_shared_empty_kwargs():
+    prog = parse_program(SOURCE)
+    add = prog.statements[1].expr.kwargs["prompt"].args[1].args[0]
+    assert not hasattr(add, "__dict__")
+    assert add.kwargs is EMPTY_KWARGS
+    assert add == Call("op.add", [Var("x"), Number(1)], {})
+    names = [s.name for s in prog.statements] + [add.args[0].name]
+    assert names[0] is names[-1]
+
+
+def test_structural_hash_and_equality():
+    one, two = parse_program(SOURCE), parse_program(SOURCE)
+    assert one == two and hash(one) == hash(two)
+    assert len({one.statements[1].expr, two.statements[4].expr}) == 1
+    assert Number(1) != Var("x")
+
+    # Equality does not depend on which side has cached its hash.
+    a, b = parse_program(SOURCE), parse_program(SOURCE)
+    hash(a)
+    assert a == b and b == a
+    hash(b)
+    assert a == b and a != parse_program(SOURCE + "let z = 1\n")
+    # Keyword arguments are equal, and hash alike, in any order.
+    ab, ba = parse_program("let x = f(a=1, b=2)"), parse_program("let x = f(b=2, a=1)")
+    assert ab == ba and hash(ab) == hash(ba)
+
+
+def test_hash_consing_shares_equal_subtrees_but_keeps_scalar_types():
+    prog = parse_program(SOURCE, ParserOptions(hash_cons=True))
+    assert prog == parse_program(SOURCE)
+    a, b, d = (prog.statements[i].expr for i in (1, 2, 4))
+    assert a is d
+    assert b.elements[0] is a.kwargs["prompt"].args[1].args[0]
+    assert type(b.elements[1].value) is float and type(b.elements[2].value) is int
+    assert hash_cons(prog) is prog
+    loop = parse_program("let x = 2\nlet c = for(range(0, 3), init=0) -> acc + (x + 1) + (x + 1)", ParserOptions(hash_cons=True))
+    assert Executor({}).run(loop, {"seed": 0})["c"] == 18
+
+
+def test_passes_and_serialization_handle_shared_subtrees():
+    plain = parse_program(SOURCE)
+    shared = hash_cons(plain)
+    assert eliminate_common_subexpressions(shared, set()) == eliminate_common_subexpressions(plain, set())
+    found = [path for path, _ in find_key_with_path(shared, "prompt")]
+    assert len(found) == 2 and found == [path for path, _ in find_key_with_path(plain, "prompt")]
+    restored = decode_program(encode_program(shared))
+    assert restored == plain
+    assert restored.statements[1].expr is restored.statements[4].expr
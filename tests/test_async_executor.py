@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.async_executor import AsyncExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ADAPTER = """
+import asyncio
+import time
+
+async def think(text, delay=0.2):
+    await asyncio.sleep(delay)
+    return text.upper()
+
+async def tokens(text):
+    for word in text.split():
+        await asyncio.sleep(0)
+        yield word + " "
+
+def blocking(text):
+    time.sleep(0.2)
+    return text[::-1]
+"""
+
+
+def _defs(tmp_path):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    return {
+        name: {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": name},
+        }
+        for name in ("think", "tokens", "blocking")
+    }
+
+
+PROGRAM = """
+let xs = for (range(0, 3), init=[]) -> op.append(acc, think("w" + get(["a", "b", "c"], i), 0.01))
+let n = while (test=acc < 20, init=1) -> acc * 2
+let pick = if (n > 10) ? think("big", 0.01) : think("small", 0.01)
+let d = {"k": blocking("abc"), "n": n}
+"""
+
+
+@pytest.mark.parametrize("path", sorted((ROOT / "examples" / "builtins").glob("*.asl")))
+def test_examples_match_sync_executor(path, capsys):
+    prog = parse_program(path.read_text())
+    expected = Executor().run(prog)
+    sync_out = capsys.readouterr().out
+    assert asyncio.run(AsyncExecutor().run_async(prog)) == expected
+    assert capsys.readouterr().out == sync_out
+
+
+def test_llm_program_matches_sync_executor(tmp_path):
+    defs = _defs(tmp_path)
+    prog = parse_program(PROGRAM)
+    expected = Executor(defs).run(prog)
+    assert asyncio.run(AsyncExecutor(defs).run_async(prog)) == expected
+    assert expected["xs"] == ["WA", "WB", "WC"]
+    assert expected["pick"] == "BIG"
+
+
+def test_sync_executor_inside_a_running_loop(tmp_path):
+    defs = _defs(tmp_path)
+
+    async def main():
+        return Executor(defs).run(parse_program('let a = think("x", 0.01)'))
+
+    assert asyncio.run(main()) == {"a": "X"}
+
+
+def test_many_programs_share_one_event_loop(tmp_path):
+    exe = AsyncExecutor(_defs(tmp_path))
+    prog = parse_program('let a = think("x")\nlet b = think(a)')
+
+    async def main():
+        return await asyncio.gather(*(exe.run_async(prog) for _ in range(500)))
+
+    start = time.perf_counter()
+    envs = asyncio.run(main())
+    assert time.perf_counter() - start < 2.0  # two sequential awaits, not 1000
+    assert envs == [{"a": "X", "b": "X"}] * 500
+
+
+def test_async_generator_streams_tokens(tmp_path):
+    seen = []
+    exe = AsyncExecutor(_defs(tmp_path), on_token=lambda fn, cid, c: seen.append(c))
+    env = asyncio.run(exe.run_async(parse_program('let s = tokens("a b")')))
+    assert env == {"s": "a b "}
+    assert seen == ["a ", "b ", None]
+    assert exe.call_records[-1].ttft is not None
+
+
+def test_errors_leave_the_same_environment(tmp_path):
+    prog = parse_program('let a = think("x", 0)\nlet b = missing(a)\nlet c = 1')
+    defs = _defs(tmp_path)
+    sync_env, async_env = {"seed": 0}, {"seed": 0}
+    with pytest.raises(ValueError, match="Unknown function: missing"):
+        Executor(defs).run(prog, sync_env)
+    with pytest.raises(ValueError, match="Unknown function: missing"):
+        asyncio.run(AsyncExecutor(defs).run_async(prog, async_env))
+    assert async_env == sync_env == {"seed": 0, "a": "X"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.peers.add(self.client_address)
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for word in body["prompt"].split():
+                line = json.dumps({"response": word}).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        data = json.dumps({"echo": body["prompt"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def test_http_adapter_over_async_transport(capsys):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.peers = set()
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    try:
+        defs = {
+            "gen": {
+                "name": "gen",
+                "model": "m",
+                "adapter": {"type": "http", "url": f"http://127.0.0.1:{srv.server_address[1]}/g"},
+                "parameters": {"properties": {"prompt": {}, "stream": {"default": False}}},
+            }
+        }
+        exe = AsyncExecutor(defs)
+        src = 'let xs = for (range(0, 10), init=[]) -> op.append(acc, gen("p"))\nlet s = gen("x y", true)'
+        env = asyncio.run(exe.run_async(parse_program(src)))
+        assert env == {"xs": [{"echo": "p"}] * 10, "s": "xy"}
+        assert capsys.readouterr().out == "xy\n"
+        assert len(srv.peers) == 1
+        assert exe.async_transport.stats()["connections_opened"] == 1
+    finally:
+        srv.shutdown()
+        srv.server_close()
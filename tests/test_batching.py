@@ -0,0 +1,167 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.cache import LLMCache
+
+ADAPTER = """
+import json
+
+def _log(entry):
+    with open(__file__ + ".calls", "a") as f:
+        f.write(json.dumps(entry) + "\\n")
+
+def shout(text):
+    _log(["one", text])
+    if text == "bad":
+        raise ValueError("bad input")
+    return text.upper()
+
+def shout_batch(payloads):
+    _log(["batch", [p["args"][0] for p in payloads]])
+    return [p["args"][0].upper() for p in payloads]
+"""
+
+
+def _defs(tmp_path, batch):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    spec = {
+        "name": "shout",
+        "model": "local",
+        "adapter": {"type": "python", "path": str(adapter), "function": "shout"},
+    }
+    if batch is not None:
+        spec["adapter"]["batch"] = batch
+    return {"shout": spec}, tmp_path / "adapter.py.calls"
+
+
+def _calls(log):
+    return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+
+LOOP = """
+let words = ["a", "b", "c", "d", "e"]
+let out = for (range(0, 5), init=[]) -> op.append(acc, shout(get(words, i)))
+"""
+
+
+def test_array_batches_are_split_by_window_and_max_size(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch", "max_size": 2})
+    env = Executor(defs, batch_window=4).run(parse_program(LOOP))
+    assert env["out"] == ["A", "B", "C", "D", "E"]
+    assert _calls(log) == [
+        ["batch", ["a", "b"]],
+        ["batch", ["c", "d"]],
+        ["batch", ["e"]],
+    ]
+
+
+def test_results_match_unbatched_execution(tmp_path):
+    src = """
+let prefix = "w"
+let digits = ["0", "1", "2", "3"]
+let out = for (range(0, 4), init="") -> acc + shout(prefix + get(digits, i)) + (if (i % 2 == 0) ? shout("e") : "-")
+"""
+    defs, log = _defs(tmp_path, {"mode": "fanout", "max_workers": 4})
+    expected = Executor(defs, batch_window=0).run(parse_program(src))
+    assert len(_calls(log)) == 6
+    env = Executor(defs).run(parse_program(src))
+    assert env == expected
+    assert env["out"] == "W0EW1-W2EW3-"
+    # Four prefetched calls plus the two conditional ones, evaluated in place.
+    assert len(_calls(log)) == 12
+
+
+def test_call_sites_that_read_acc_are_not_batched(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    src = 'let out = for (range(0, 3), init="x") -> shout(acc)'
+    env = Executor(defs).run(parse_program(src))
+    assert env["out"] == "X"
+    assert [c[0] for c in _calls(log)] == ["one", "one", "one"]
+
+
+def test_failing_call_raises_at_its_iteration(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "fanout"})
+    src = 'let words = ["a", "bad", "c"]\nlet out = for (range(0, 3), init=[]) -> op.append(op.append(acc, i), shout(get(words, i)))'
+    env = {}
+    with pytest.raises(ValueError, match="bad input"):
+        Executor(defs).run(parse_program(src), env)
+    assert "out" not in env
+
+
+def test_batched_results_use_the_response_cache(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    cache = LLMCache()
+    Executor(defs, cache=cache).run(parse_program('let x = shout("c")'))
+    env = Executor(defs, cache=cache).run(parse_program(LOOP))
+    assert env["out"] == ["A", "B", "C", "D", "E"]
+    assert _calls(log)[-1] == ["batch", ["a", "b", "d", "e"]]
+
+
+def test_loops_mutating_shared_values_are_not_batched(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    src = 'let words = ["a"]\nlet out = for (range(0, 3), init=0) -> push(words, shout(get(words, i)))'
+    env = Executor(defs).run(parse_program(src))
+    assert env["words"] == ["a", "A", "A", "A"]
+    assert [c[0] for c in _calls(log)] == ["one", "one", "one"]
+
+
+def test_duplicate_calls_in_a_batch_are_sent_once(tmp_path):
+    src = """
+let words = ["a", "b", "a", "a"]
+let out = for (range(0, 4), init=[]) -> op.append(acc, shout(get(words, i)))
+"""
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    env = Executor(defs).run(parse_program(src))
+    assert env["out"] == ["A", "B", "A", "A"]
+    # Each call may sample its own response unless the function opts in.
+    assert _calls(log) == [["batch", ["a", "b", "a", "a"]]]
+    defs["shout"]["single_flight"] = True
+    env = Executor(defs).run(parse_program(src))
+    assert env["out"] == ["A", "B", "A", "A"]
+    assert _calls(log)[1:] == [["batch", ["a", "b"]]]
+
+
+def test_no_calls_are_sent_past_a_failing_assert(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    src = 'let words = ["a", "b", "c", "d", "e"]\nlet out = for (range(0, 5), init=[]) -> [assert(i < 3, "stop"), shout(get(words, i))]'
+    with pytest.raises(AssertionError, match="stop"):
+        Executor(defs).run(parse_program(src))
+    assert _calls(log) == [["batch", ["a", "b", "c"]]]
+
+
+def test_loops_that_may_stop_unforeseeably_are_not_batched(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    src = 'let words = ["a", "b", "c"]\nlet out = for (range(0, 3), init=[]) -> [assert(len(acc) < 2, "stop"), shout(get(words, i))]'
+    with pytest.raises(AssertionError, match="stop"):
+        Executor(defs).run(parse_program(src))
+    assert _calls(log) == [["one", "a"]]
+    src = 'let words = ["a", "b", "c"]\nlet out = for (range(0, 3), init=[]) -> push(acc, shout(get(words, i)))'
+    with pytest.raises(AttributeError):
+        Executor(defs).run(parse_program(src))
+    assert _calls(log)[1:] == [["one", "a"], ["one", "b"]]
+
+
+def test_no_calls_are_sent_past_a_builtin_that_raises(tmp_path):
+    defs, log = _defs(tmp_path, {"mode": "array", "function": "shout_batch"})
+    src = 'let words = ["a", "b", "c", "d", "e"]\nlet out = for (range(0, 5), init=[]) -> [op.div(1, 2 - i), shout(get(words, i))]'
+    with pytest.raises(ZeroDivisionError):
+        Executor(defs).run(parse_program(src))
+    assert _calls(log) == [["batch", ["a", "b"]]]
+    # After the call site, the failing iteration still makes its own call.
+    src = 'let words = ["a", "b", "c", "d", "e"]\nlet out = for (range(0, 5), init=[]) -> [shout(get(words, i)), op.div(1, 2 - i)]'
+    with pytest.raises(ZeroDivisionError):
+        Executor(defs).run(parse_program(src))
+    assert _calls(log)[1:] == [["batch", ["a", "b"]], ["one", "c"]]
+    # A builtin reading ``acc`` before the call site cannot be checked ahead.
+    src = 'let words = ["a", "b", "c"]\nlet out = for (range(0, 3), init=[]) -> [op.div(1, 2 - len(acc)), shout(get(words, i))]'
+    with pytest.raises(ZeroDivisionError):
+        Executor(defs).run(parse_program(src))
+    assert _calls(log)[3:] == [["one", "a"]]
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks"))
+
+import generators
+import suite
+from aissembly_core.executor import Executor
+from aissembly_core.parser import parse_program
+
+
+def test_generated_programs_parse_and_run():
+    env = Executor({}).run(parse_program(generators.flat_program(13)), {"seed": 0})
+    assert list(env)[-1] == "v12"
+    assert Executor({}).run(parse_program(generators.deep_expression(40)), {"seed": 0})["x"] >= 0
+    assert Executor({}).run(parse_program(generators.big_loop(10)), {"seed": 0})["total"] == sum(i * 2 % 7 for i in range(10))
+
+
+def test_cases_run_against_the_mock_llm(monkeypatch):
+    sizes = dict(statements=20, large_statements=20, depth=10, iterations=10, llm_iterations=3, prompts=2, repeat=1)
+    monkeypatch.setitem(suite.PROFILES, "tiny", sizes)
+    monkeypatch.setenv("AISSEMBLY_MOCK_LATENCY", "0")
+    results = suite.run_cases("tiny", log=lambda line: None)
+    assert set(results["results"]) == {c.name for c in suite.CASES}
+    assert results["meta"]["profile"] == "tiny"
+
+
+def test_compare_flags_slowdowns_beyond_threshold_and_min_delta():
+    baseline = {"results": {
+        "a": {"seconds": 1.0},
+        "b": {"seconds": 1.0, "threshold": 1.0},
+        "c": {"seconds": 0.001},
+        "gone": {"seconds": 1.0},
+    }}
+    results = {"results": {"a": {"seconds": 1.3}, "b": {"seconds": 1.3}, "c": {"seconds": 0.004}}}
+    regressions = suite.compare(results, baseline, threshold=0.25, min_delta=0.005)
+    assert len(regressions) == 1 and regressions[0].startswith("a:")
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.compiler import compile_program
+from aissembly_core import runtime
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROGRAMS = [
+    """
+let x = 7 + 6
+let tag = cond(test=x >= 10) -> "ok" ::else-> "ng"
+let total = for(range(1, 4), init=0) -> acc + i
+let steps = while(test=acc < 3, init=0) -> acc + 1
+""",
+    """
+let grid = for(range(0, 3), init=[]) -> op.append(acc, for(range(0, i + 1), init=0) -> acc + i * 2)
+let evens = for(range(0, 10, 2), init=[]) -> op.append(acc, i)
+let n = while(test=acc * 2 < 100, init=1) -> acc * 2
+let s = "abc"[0:2] + "d"
+let d = {"k": [1, 2, 3]}
+let v = d["k"][1] - -3
+let flags = [not (1 < 2), (1 < 2) == true, true and false, false or 1, 7 % 3, 1 / 4]
+let m = max(abs(-4), min(3, 9))
+""",
+]
+
+
+def _both(src):
+    prog = parse_program(src)
+    tree = Executor().run(prog)
+    compiled = compile_program(prog).run(Executor())
+    return tree, compiled
+
+
+@pytest.mark.parametrize("src", PROGRAMS)
+def test_compiled_matches_tree_walker(src):
+    tree, compiled = _both(src)
+    assert compiled == tree
+
+
+@pytest.mark.parametrize(
+    "path",
+    [p for p in sorted((ROOT / "examples").rglob("*.asl")) if "ollama" not in p.name],
+)
+def test_compiled_matches_examples(path, capsys):
+    src = path.read_text()
+    tree, compiled = _both(src)
+    out = capsys.readouterr().out
+    assert compiled == tree
+    assert out[: len(out) // 2] == out[len(out) // 2 :]
+
+
+def test_errors_match_tree_walker():
+    for src in ("let a = b", "let a = unknown_fn(1)", "let a = false and undefined"):
+        prog = parse_program(src)
+        with pytest.raises(Exception) as tree_err:
+            Executor().run(prog)
+        with pytest.raises(Exception) as compiled_err:
+            compile_program(prog).run(Executor())
+        assert type(compiled_err.value) is type(tree_err.value)
+
+
+def test_bytecode_cache_and_cli(tmp_path, capsys):
+    cache = tmp_path / "pyc"
+    prog_path = tmp_path / "prog.asl"
+    prog_path.write_text(PROGRAMS[0])
+    argv = [str(prog_path), "--engine", "compiled", "--bytecode-cache", str(cache)]
+    runtime.main(argv)
+    env = json.loads(capsys.readouterr().out)
+    assert env == {"x": 13, "tag": "ok", "total": 6, "steps": 3}
+    assert len(list(cache.glob("*.pyc"))) == 1
@@ -0,0 +1,92 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import (
+    Boolean,
+    Call,
+    Cond,
+    Number,
+    ParserOptions,
+    String,
+    Var,
+    parse_program,
+)
+from aissembly_core.executor import BUILTINS, Executor
+from aissembly_core.optimizer import optimizer
+from aissembly_core.optimizations.constant_folding_opt_passes import (
+    constant_folding_opt_passes_optimization as fold,
+)
+
+
+def _exprs(src):
+    return [s.expr for s in fold(parse_program(src)).statements]
+
+
+def test_literal_expressions_are_folded():
+    exprs = _exprs('let a = 2 * 3 + 1\nlet b = -4\nlet c = "ab" + "c"\nlet d = len([1, 2, 3]) >= 3')
+    assert exprs == [Number(7), Number(-4), String("abc"), Boolean(True)]
+
+
+def test_constant_lets_are_propagated_until_rebound():
+    src = 'let n = 10\nlet m = n * 2\nlet n = ask("q")\nlet k = n + 1'
+    exprs = _exprs(src)
+    assert exprs[1] == Number(20)
+    assert exprs[3] == Call("op.add", [Var("n"), Number(1)], {})
+
+
+def test_cond_with_constant_test_is_pruned():
+    src = 'let debug = false\nlet mode = if (debug) ? ask("a") : "prod"'
+    assert _exprs(src)[1] == String("prod")
+    kept = _exprs('let mode = if (ask("x")) ? 1 + 1 : 3')[0]
+    assert isinstance(kept, Cond) and kept.then == Number(2)
+
+
+def test_loop_variables_shadow_constants():
+    src = 'let i = 100\nlet acc = 5\nlet s = for (range(0, 3), init=acc) -> acc + i'
+    prog = fold(parse_program(src))
+    loop = prog.statements[2].expr
+    assert loop.init == Number(5)
+    assert loop.body == Call("op.add", [Var("acc"), Var("i")], {})
+    assert Executor().run(prog, {"seed": 0})["s"] == 8
+
+
+def test_side_effects_llm_calls_and_errors_are_not_folded():
+    exprs = _exprs('let a = print(1 + 1)\nlet b = ask(1 + 1)\nlet c = 1 / 0\nlet d = "x" * 100000')
+    assert exprs[0] == Call("print", [Number(2)], {})
+    assert exprs[1] == Call("ask", [Number(2)], {})
+    assert exprs[2].name == "op.div"
+    assert exprs[3].name == "op.mul"
+    with pytest.raises(ZeroDivisionError):
+        Executor().run(fold(parse_program("let c = 1 / 0")))
+
+
+def test_large_sequences_are_not_built(monkeypatch):
+    calls = []
+    for name in ("op.mul", "op.add"):
+        monkeypatch.setitem(BUILTINS, name, lambda a, b, f=BUILTINS[name]: calls.append((a, b)) or f(a, b))
+    big = "[" + ", ".join(["1"] * 5000) + "]"
+    exprs = _exprs(f'let a = [1] * 100000000\nlet b = 100000000 * [1, 2]\nlet c = {big} + {big}\nlet d = 2 * 3')
+    assert [e.name for e in exprs[:3]] == ["op.mul", "op.mul", "op.add"]
+    assert exprs[3] == Number(6)
+    assert calls == [(2, 3)]
+
+
+def test_results_match_unfolded_execution():
+    src = """
+let base = 3
+let scale = if (base > 2) ? "x" : "y"
+let words = ["a", "b"]
+let out = for (range(0, base), init="") -> acc + get(words, i % 2) + scale
+let t = max(base, 7) - abs(-2)
+"""
+    prog = parse_program(src)
+    opts = ParserOptions(constant_folding_opt_passes=1)
+    folded = optimizer(prog, opts)
+    assert folded.statements[1].expr == String("x")
+    assert Executor().run(folded, {"seed": 0}) == Executor().run(prog, {"seed": 0})
+    # The input program is not modified.
+    assert isinstance(prog.statements[1].expr, Cond)
@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import runtime
+from aissembly_core.parser import Call, LetStmt, Var, parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.optimizations.cse_opt_passes import cse_opt_passes_optimization
+
+ADAPTER = """
+calls = []
+
+def chat(prompt):
+    calls.append(prompt)
+    return "re:" + prompt
+
+def count():
+    return len(calls)
+"""
+
+
+def _defs(tmp_path, pure=True):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    defs = {}
+    for name in ("chat", "count"):
+        defs[name] = {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": name},
+        }
+    defs["chat"]["pure"] = pure
+    return defs
+
+
+def _cse(src, defs):
+    stats = {}
+    prog = cse_opt_passes_optimization(parse_program(src), llm_defs=defs, stats=stats)
+    return prog, stats
+
+
+def test_repeated_llm_calls_are_hoisted(tmp_path):
+    defs = _defs(tmp_path)
+    src = """
+let a = chat(prompt="x") + "!"
+let b = chat(prompt="x") + "?"
+let c = [chat(prompt="x"), chat(prompt="y")]
+let n = count()
+"""
+    prog, stats = _cse(src, defs)
+    assert prog.statements[0] == LetStmt("_cse0", Call("chat", [], {"prompt": parse_program('let t = "x"').statements[0].expr}))
+    assert stats == {"cse_removed_calls": 2, "cse_removed_llm_calls": 2, "cse_bindings": ["_cse0"]}
+    env = Executor(defs).run(prog, {"seed": 0})
+    assert (env["a"], env["b"], env["c"]) == ("re:x!", "re:x?", ["re:x", "re:y"])
+    assert env["n"] == 2
+
+
+def test_existing_let_is_reused(tmp_path):
+    defs = _defs(tmp_path)
+    src = 'let a = chat(prompt="x")\nlet b = chat(prompt="x") + chat(prompt="x")'
+    prog, stats = _cse(src, defs)
+    assert len(prog.statements) == 2
+    assert prog.statements[1].expr == Call("op.add", [Var("a"), Var("a")], {})
+    assert stats["cse_removed_calls"] == 2
+
+
+def test_impure_functions_are_not_shared(tmp_path):
+    src = 'let a = chat(prompt="x")\nlet b = chat(prompt="x")'
+    prog, stats = _cse(src, _defs(tmp_path, pure=False))
+    assert stats["cse_removed_calls"] == 0
+    assert prog.statements[1].expr.name == "chat"
+
+
+def test_conditional_first_occurrence_is_not_hoisted(tmp_path):
+    defs = _defs(tmp_path)
+    src = 'let flag = false\nlet a = if (flag) ? chat(prompt="x") : ""\nlet b = if (flag) ? chat(prompt="x") : ""'
+    prog, stats = _cse(src, defs)
+    assert stats["cse_removed_calls"] == 0
+    # An unconditional occurrence covers the later conditional ones.
+    src = 'let a = chat(prompt="x")\nlet b = if (true) ? chat(prompt="x") : ""'
+    prog, stats = _cse(src, defs)
+    assert prog.statements[1].expr.then == Var("a")
+
+
+def test_rebinding_and_loop_variables_stop_sharing(tmp_path):
+    defs = _defs(tmp_path)
+    src = """
+let p = "x"
+let a = chat(prompt=p)
+let b = chat(prompt=p)
+let p = "y"
+let c = chat(prompt=p)
+let d = for (range(0, 2), init="") -> acc + chat(prompt=p) + chat(prompt=acc)
+"""
+    prog, stats = _cse(src, defs)
+    assert stats["cse_removed_calls"] == 2
+    env = Executor(defs).run(prog, {"seed": 0})
+    expected = Executor(_defs(tmp_path)).run(parse_program(src), {"seed": 0})
+    assert {k: v for k, v in env.items() if not k.startswith("_cse")} == expected
+
+
+def test_programs_with_mutations_are_left_alone(tmp_path):
+    defs = _defs(tmp_path)
+    src = 'let xs = []\nlet a = len(xs)\nlet n = push(xs, 1)\nlet b = len(xs)'
+    prog, stats = _cse(src, defs)
+    assert stats["cse_removed_calls"] == 0
+    src = 'let a = for (range(0, 2), init=[]) -> op.append(acc, chat(prompt="x"))\nlet b = chat(prompt="x")'
+    prog, stats = _cse(src, defs)
+    assert stats["cse_removed_calls"] == 0  # the first occurrence is in a loop body
+    assert json.dumps(Executor(defs).run(prog, {"seed": 0})["a"]) == '["re:x", "re:x"]'
+
+
+def test_calls_are_not_hoisted_past_side_effects(tmp_path):
+    defs = _defs(tmp_path)
+    src = 'let x = 0\nlet a = [assert(x != 0, "x is zero"), 10 / x]\nlet b = 10 / x'
+    prog, stats = _cse(src, defs)
+    assert stats["cse_removed_calls"] == 0
+    with pytest.raises(AssertionError, match="x is zero"):
+        Executor(defs).run(prog)
+    # Side effects after the first occurrence do not matter.
+    src = 'let x = 2\nlet a = [10 / x, assert(x != 0, "x is zero")]\nlet b = 10 / x'
+    prog, stats = _cse(src, defs)
+    assert stats["cse_removed_calls"] == 1
+    assert Executor(defs).run(prog)["b"] == 5
+
+
+def test_cli_leaves_synthetic_bindings_out(tmp_path, capsys):
+    prog = tmp_path / "prog.asl"
+    prog.write_text('let a = len("abc") + 1\nlet b = len("abc") + 2\n')
+    cached = ["--artifact-cache", str(tmp_path / "artifacts")]
+    # Without artifacts, then building and loading one.
+    for extra in ([], cached, cached):
+        runtime.main([str(prog), "--cse_opt_passes", "1"] + extra)
+        assert json.loads(capsys.readouterr().out) == {"a": 4, "b": 5}
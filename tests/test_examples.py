@@ -1,7 +1,6 @@
 import os
 import sys
 from pathlib import Path
-import urllib.request
 
 import pytest
 
@@ -9,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from aissembly_core.parser import parse_program
 from aissembly_core.executor import Executor, load_llm_defs
+from aissembly_core.transport import HTTPTransport
 
 ROOT = Path(__file__).resolve().parent.parent
 EXAMPLES_DIR = ROOT / "examples"
@@ -34,7 +34,7 @@ class DummyResp:
 
 @pytest.mark.parametrize("path", sorted(EXAMPLES_DIR.rglob("*.asl")))
 def test_example_runs(path, monkeypatch):
-    monkeypatch.setattr(urllib.request, "urlopen", lambda req: DummyResp("{}"))
+    monkeypatch.setattr(HTTPTransport, "send", lambda self, endpoint, body=None: DummyResp("{}"))
     src = path.read_text()
     prog = parse_program(src)
     exe = Executor(llm_defs=load_llm_defs(str(LLM_DEFS)))
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import IncrementalParser, parse_program
+
+SOURCE = """let a = 1
+let tag = cond(test=a > 0):
+    then:
+        -> "pos"
+    else:
+        -> "neg"
+let b = a + 2
+print(b)
+"""
+
+
+def test_initial_parse_matches_parse_program():
+    inc = IncrementalParser(SOURCE)
+    assert inc.program == parse_program(SOURCE)
+    assert inc.changed == [0, 1, 2, 3]
+
+
+def test_edit_reparses_only_touched_statement():
+    inc = IncrementalParser(SOURCE)
+    before = list(inc.program.statements)
+    pos = SOURCE.index("a + 2")
+    program = inc.apply_edit(pos, pos + len("a + 2"), "a * 10")
+    assert inc.changed == [2]
+    assert program == parse_program(inc.source)
+    # Untouched statements keep their cached subtrees.
+    assert program.statements[1] is before[1]
+    assert program.statements[3] is before[3]
+
+
+def test_edit_inside_block_and_insertions():
+    inc = IncrementalParser(SOURCE)
+    pos = SOURCE.index('"neg"')
+    inc.apply_edit(pos, pos + len('"neg"'), '"zero"')
+    assert inc.changed == [1]
+    assert inc.program.statements[1].expr.else_.value == "zero"
+
+    inc.apply_edit(0, 0, "let first = 0\n")
+    assert inc.changed == [0]
+    assert [s.name for s in inc.program.statements[:3]] == ["first", "a", "tag"]
+
+    end = len(inc.source)
+    inc.apply_edit(end, end, "let last = b\n")
+    assert inc.changed == [5]
+    assert inc.program == parse_program(inc.source)
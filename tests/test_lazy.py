@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.lazy import Thunk
+from aissembly_core.runtime import main
+
+ADAPTER = """
+import time
+
+calls = []
+
+def slow(text):
+    calls.append(text)
+    time.sleep(0.2)
+    return text.upper()
+
+def fail(text):
+    calls.append(text)
+    raise RuntimeError("backend down")
+
+def count():
+    return len(calls)
+
+def log():
+    return list(calls)
+"""
+
+
+def _defs(tmp_path):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    return {
+        name: {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": name},
+        }
+        for name in ("slow", "fail", "count", "log")
+    }
+
+
+def test_unused_bindings_never_call_the_model(tmp_path):
+    defs = _defs(tmp_path)
+    src = 'let a = slow("a")\nlet b = slow("b")\nlet c = a + "!"'
+    exe = Executor(defs, lazy=True)
+    env = exe.run(parse_program(src), {"seed": 0})
+    assert isinstance(env["a"], Thunk) and isinstance(env["b"], Thunk)
+    assert env["c"] == "A!"
+    assert exe.call_llm("count", [], {}) == 1
+    assert exe.force_env(env, ["b"]) == {"b": "B"}
+    assert exe.call_llm("count", [], {}) == 2
+
+
+def test_values_needed_together_are_forced_concurrently(tmp_path):
+    defs = _defs(tmp_path)
+    src = 'let a = slow("a")\nlet b = slow("b")\nlet c = slow("c")\nlet d = [a, b, c]'
+    start = time.perf_counter()
+    env = Executor(defs, lazy=True).run(parse_program(src), {"seed": 0})
+    assert env["d"] == ["A", "B", "C"]
+    assert time.perf_counter() - start < 0.5
+
+
+def test_deferred_calls_see_arguments_at_binding_time(tmp_path):
+    defs = _defs(tmp_path)
+    src = """
+let p = "x"
+let xs = ["y"]
+let a = slow(p)
+let b = slow(get(xs, 0))
+let p = "z"
+let c = if (a == "X") ? slow(p) : "no"
+"""
+    prog = parse_program(src)
+    exe = Executor(defs, lazy=True)
+    env = exe.force_env(exe.run(prog, {"seed": 0}))
+    assert env == Executor(defs).run(prog, {"seed": 0})
+
+
+def test_print_order_is_preserved(tmp_path, capsys):
+    defs = _defs(tmp_path)
+    src = 'let a = slow("a")\nlet p = print("first")\nlet q = print(a)\nlet r = print("last")\nlet l = log()'
+    exe = Executor(defs, lazy=True)
+    env = exe.run(parse_program(src), {"seed": 0})
+    assert capsys.readouterr().out.splitlines() == ["first", "A", "last"]
+    assert exe.force_env(env, ["l"]) == {"l": ["a"]}
+
+
+def test_errors_surface_where_the_value_is_forced(tmp_path):
+    defs = _defs(tmp_path)
+    exe = Executor(defs, lazy=True)
+    env = exe.run(parse_program('let a = fail("x")\nlet b = 1'), {"seed": 0})
+    assert env["b"] == 1
+    with pytest.raises(RuntimeError):
+        exe.force_env(env, ["a"])
+    # The failure is remembered rather than retried.
+    with pytest.raises(RuntimeError):
+        env["a"].force()
+    assert exe.call_llm("count", [], {}) == 1
+
+
+def test_cli_selects_the_bindings_to_force(tmp_path, capsys):
+    defs = _defs(tmp_path)
+    llm = tmp_path / "llm.json"
+    llm.write_text(json.dumps(list(defs.values())))
+    program = tmp_path / "prog.asl"
+    program.write_text('let a = slow("a")\nlet b = slow("b")\nlet c = slow("c")\n')
+    main([str(program), "--llm", str(llm), "--lazy", "--select", "a", "--select", "c"])
+    assert json.loads(capsys.readouterr().out) == {"a": "A", "c": "C"}
+    assert Executor(defs).call_llm("log", [], {}) in (["a", "c"], ["c", "a"])
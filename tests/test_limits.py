@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.limits import Limiter, LimitRegistry, backend_key
+
+ADAPTER = """
+import threading
+import time
+
+lock = threading.Lock()
+active = 0
+peak = 0
+
+def work(text):
+    global active, peak
+    with lock:
+        active += 1
+        peak = max(peak, active)
+    time.sleep(0.05)
+    with lock:
+        active -= 1
+    return text
+
+def stats():
+    return peak
+"""
+
+
+def _defs(tmp_path, limits_a=None, limits_b=None):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    defs = {}
+    for name, limits in (("a", limits_a), ("b", limits_b)):
+        spec = {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": "work"},
+        }
+        if limits:
+            spec["adapter"]["limits"] = limits
+        defs[name] = spec
+    defs["peak"] = {
+        "name": "peak",
+        "model": "local",
+        "adapter": {"type": "python", "path": str(adapter), "function": "stats"},
+    }
+    return defs
+
+
+def test_max_in_flight_is_shared_by_functions_on_one_backend(tmp_path):
+    # Only "a" declares the limit; "b" targets the same backend.
+    defs = _defs(tmp_path, limits_a={"max_in_flight": 1})
+    src = 'let w = b("1")\nlet x = b("2")\nlet y = a("3")\nlet z = b("4")\nlet p = peak()'
+    exe = Executor(defs, max_concurrency=4)
+    env = exe.run(parse_program(src))
+    assert env["p"] == 1
+    stats = exe.limits.stats()
+    key = backend_key(defs["a"]["adapter"])
+    assert stats[key]["requests"] == 4
+    assert stats[key]["waits"] >= 1
+    assert any(r.queue_wait > 0 for r in exe.call_records)
+
+
+def test_executors_share_the_process_wide_registry(tmp_path):
+    defs = _defs(tmp_path, limits_a={"max_in_flight": 1})
+    prog = parse_program('let x = a("1")')
+    executors = [Executor(defs) for _ in range(3)]
+    threads = [threading.Thread(target=exe.run, args=(prog,)) for exe in executors]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert Executor(defs).run(parse_program("let p = peak()"))["p"] == 1
+    assert len({id(exe.limits) for exe in executors}) == 1
+    assert Executor(defs, limits=LimitRegistry()).limits is not executors[0].limits
+
+
+def test_token_bucket_spaces_requests(tmp_path):
+    defs = _defs(tmp_path, limits_a={"rate": 10, "burst": 1})
+    exe = Executor(defs)
+    start = time.perf_counter()
+    exe.run(parse_program('let xs = for (range(0, 5), init=[]) -> op.append(acc, a("x"))'))
+    # Five requests at 10/s without burst capacity start 100 ms apart.
+    assert time.perf_counter() - start >= 0.4
+    waits = [r.queue_wait for r in exe.call_records if r.name == "a"]
+    assert waits[0] == 0
+    assert all(w > 0.03 for w in waits[1:])
+
+
+def test_strictest_declared_limit_wins():
+    registry = LimitRegistry()
+    registry.limiter("u", {"rate": 10, "max_in_flight": 8})
+    limiter = registry.limiter("u", {"rate": 50, "max_in_flight": 2})
+    assert limiter.rate == 10
+    assert limiter.max_in_flight == 2
+
+
+def test_aimd_grows_on_fast_responses_and_halves_on_errors():
+    limiter = Limiter("u")
+    limiter.configure({"adaptive": {"target_latency": 0.5, "min": 1, "max": 8}})
+    assert limiter.limit == 1
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(0.01)
+    grown = limiter.limit
+    assert 4 < grown <= 8
+
+    limiter.acquire()
+    limiter.release(0.01, error=True)
+    assert limiter.limit == grown / 2
+    # A burst of failures only backs off once per target latency.
+    limiter.acquire()
+    limiter.release(2.0)
+    assert limiter.limit == grown / 2
+    assert limiter.stats()["errors"] == 1
+
+
+def test_async_waiters_are_woken_by_release():
+    limiter = Limiter("u")
+    limiter.configure({"max_in_flight": 1})
+    limiter.acquire()
+    attempts = []
+    try_enter = limiter._try_enter
+    limiter._try_enter = lambda now: attempts.append(now) or try_enter(now)
+
+    async def main():
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.2)
+        assert not waiter.done()
+        # A release from another thread wakes the coroutine.
+        threading.Thread(target=limiter.release, args=(0.2,)).start()
+        return await asyncio.wait_for(waiter, 1)
+
+    wait = asyncio.run(main())
+    assert wait >= 0.2
+    assert len(attempts) == 2
+    assert limiter.stats()["in_flight"] == 1
@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.cache import MISS, LLMCache
+from aissembly_core.transport import HTTPTransport
+
+ADAPTER = """
+def shout(text):
+    with open(__file__ + ".calls", "a") as f:
+        f.write(text + "\\n")
+    return text.upper()
+"""
+
+
+def _defs(tmp_path, cache=None):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    spec = {
+        "name": "shout",
+        "model": "local",
+        "adapter": {"type": "python", "path": str(adapter), "function": "shout"},
+    }
+    if cache is not None:
+        spec["cache"] = cache
+    return {"shout": spec}, tmp_path / "adapter.py.calls"
+
+
+def _calls(log):
+    return log.read_text().splitlines() if log.exists() else []
+
+
+def test_repeated_calls_hit_memory_then_disk(tmp_path):
+    defs, log = _defs(tmp_path)
+    prog = parse_program('let a = shout("hi")\nlet b = shout("hi")\nlet c = shout("yo")')
+    cache_dir = str(tmp_path / "cache")
+    env = Executor(defs, cache=LLMCache(cache_dir)).run(prog)
+    assert env == {"a": "HI", "b": "HI", "c": "YO"}
+    assert _calls(log) == ["hi", "yo"]
+
+    # A new process only shares the disk tier.
+    env = Executor(defs, cache=LLMCache(cache_dir)).run(prog)
+    assert env["b"] == "HI"
+    assert _calls(log) == ["hi", "yo"]
+
+
+def test_function_can_opt_out(tmp_path):
+    defs, log = _defs(tmp_path, cache={"enabled": False})
+    prog = parse_program('let a = shout("hi")\nlet b = shout("hi")')
+    Executor(defs, cache=LLMCache()).run(prog)
+    assert _calls(log) == ["hi", "hi"]
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path), memory_entries=2, max_entries=2, compress=True)
+    cache.set("expired", "x", ttl=-1)
+    assert cache.get("expired") is MISS
+    for key in ("a", "b", "c"):
+        cache.set(key, {"v": key})
+    assert cache.get("a") is MISS
+    assert cache.get("c") == {"v": "c"}
+    fresh = LLMCache(str(tmp_path))
+    assert fresh.get("a") is MISS
+    assert fresh.get("b") == {"v": "b"}
+
+
+def test_hits_do_not_share_mutable_results(tmp_path):
+    adapter = tmp_path / "tags.py"
+    adapter.write_text("def tags(text):\n    return ['a', 'b']\n")
+    defs = {"tags": {"name": "tags", "adapter": {"type": "python", "path": str(adapter), "function": "tags"}}}
+    prog = parse_program('let a = tags("q")\nlet n = push(a, "z")\nlet b = tags("q")')
+    env = Executor(defs, cache=LLMCache()).run(prog)
+    assert env["a"] == ["a", "b", "z"] and env["b"] == ["a", "b"]
+
+
+class _Resp:
+    def __init__(self, body):
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def read(self):
+        return self.body
+
+
+def test_key_uses_payload_after_defaults(monkeypatch):
+    sent = []
+
+    def fake_send(self, endpoint, body=None):
+        sent.append(json.loads(body))
+        return _Resp(b'{"ok": true}')
+
+    monkeypatch.setattr(HTTPTransport, "send", fake_send)
+    defs = {
+        "summarize": {
+            "name": "summarize",
+            "model": "m",
+            "adapter": {"type": "http", "url": "http://localhost:1/x"},
+            "parameters": {"properties": {"text": {}, "length": {"default": 3}}},
+        }
+    }
+    prog = parse_program('let a = summarize("t")\nlet b = summarize(text="t", length=3)')
+    env = Executor(defs, cache=LLMCache()).run(prog)
+    assert env == {"a": {"ok": True}, "b": {"ok": True}}
+    assert sent == [{"model": "m", "text": "t", "length": 3}]
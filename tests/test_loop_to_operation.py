@@ -0,0 +1,97 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import runtime
+from aissembly_core.executor import Executor
+from aissembly_core.optimizer import optimizer
+from aissembly_core.parser import ForLoop, ParserOptions, parse_program
+from aissembly_core.optimizations.loop_to_operation_opt_passes import rewrite_loops
+
+HEADER = "let k = 3\nlet flag = true\n"
+
+
+def _loops(node):
+    if isinstance(node, ForLoop):
+        return 1
+    children = getattr(node, "__slots__", ())
+    total = 0
+    for name in children:
+        value = getattr(node, name)
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            total += _loops(item)
+    return total
+
+
+@pytest.mark.parametrize(
+    "loop, kind",
+    [
+        ("for(range(0, 100), init=0) -> acc + i", "arithmetic"),
+        ("for(range(10, -7, -3), init=k) -> acc - 2 * i + k", "arithmetic"),
+        ("for(range(0, 50), init=k * 2) -> acc + max(k, 5)", "arithmetic"),
+        ("for(range(0, 30), init=1) -> acc * 3", "geometric"),
+        ("for(range(0, 30), init=k) -> 2 * acc + i - 1", "geometric"),
+        ("for(range(0, 31), init=5) -> acc * -1 + k", "geometric"),
+        ("for(range(0, 100), init=0) -> acc + (if (i % 3 == 1) ? 1 : 0)", "count"),
+        ("for(range(-20, 20), init=0) -> cond(test=i >= k) -> acc + 1 ::else-> acc - 1", "count"),
+        ("for(range(40, 0, -1), init=0) -> cond(test=5 > i) -> acc + k ::else-> acc", "count"),
+        ("for(range(0, 10), init=0) -> cond(test=flag) -> acc + 2 ::else-> acc", "invariant"),
+        ("for(range(0, 10), init=0) -> acc + (for(range(0, 5), init=i) -> acc + i)", "arithmetic"),
+        ('for(range(5, 5), init="anything") -> acc + 1', "empty"),
+    ],
+)
+def test_rewritten_loops_match_the_interpreter(loop, kind):
+    program = parse_program(HEADER + f"let t = {loop}\n")
+    rewritten, rewrites = rewrite_loops(program)
+    assert _loops(rewritten) == 0
+    assert rewrites and all(r.startswith("let t: ") for r in rewrites)
+    assert kind in rewrites[-1]
+    assert Executor().run(rewritten) == Executor().run(program)
+
+
+@pytest.mark.parametrize(
+    "loop",
+    [
+        # Float or unknown accumulators would round or change type differently.
+        "for(range(0, 10), init=0.5) -> acc + i",
+        'for(range(0, 10), init="") -> acc + "x"',
+        "for(range(0, 10), init=x) -> acc + 1",
+        # Bounds that are not known integers.
+        "for(range(0, x), init=0) -> acc + i",
+        # Not linear, or not pure.
+        "for(range(1, 10), init=1) -> acc * i",
+        "for(range(0, 10), init=0) -> acc + i * i",
+        "for(range(0, 10), init=0) -> acc + push([], i)",
+        "for(range(0, 10), init=0) -> acc + (if (acc > 3) ? 1 : 0)",
+        "for(range(0, 10), init=0) -> acc * k",
+        # 2 ** 10000 is too large to build.
+        "for(range(0, 10000), init=1) -> acc * 2",
+    ],
+)
+def test_other_loops_are_left_alone(loop):
+    program = parse_program(f"let x = len([1, 2])\nlet k = x + 1\nlet t = {loop}\n")
+    rewritten, rewrites = rewrite_loops(program)
+    assert rewrites == [] and rewritten is program
+
+
+def test_huge_ranges_take_constant_time():
+    program = parse_program("let t = for(range(0, 1000000000000), init=0) -> acc + 2 * i + 1")
+    env = Executor().run(rewrite_loops(program)[0])
+    assert env["t"] == 10 ** 24
+
+
+def test_optimizer_reports_rewrites(tmp_path, capsys):
+    stats = {}
+    options = ParserOptions(loop_to_operation_opt_passes=1)
+    optimizer(parse_program("let t = for(range(0, 4), init=0) -> acc + i\n"), options, stats)
+    assert stats["loop_rewrites"] == ["let t: arithmetic progression over 4 iterations"]
+
+    prog = tmp_path / "prog.asl"
+    prog.write_text("let t = for(range(0, 4), init=0) -> acc + i\n")
+    runtime.main([str(prog), "--loop_to_operation_opt_passes", "1"])
+    captured = capsys.readouterr()
+    assert '"t": 6' in captured.out
+    assert "let t: arithmetic progression over 4 iterations" in captured.err
@@ -0,0 +1,36 @@
+import os
+import sys
+
+from lark.parsers.lalr_analysis import LALR_Analyzer
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import parser as parser_mod
+from aissembly_core.parser import GRAMMAR_SHA256, ParserOptions, get_parser, parse_program
+
+
+def test_parser_is_built_once_per_cache_dir(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = get_parser(cache_dir)
+    assert get_parser(cache_dir) is first
+    files = os.listdir(cache_dir)
+    assert files == [f"aissembly_grammar_{GRAMMAR_SHA256[:16]}.lark"]
+
+
+def test_parse_reuses_serialized_tables(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    opts = ParserOptions(parser_cache_dir=cache_dir)
+    parse_program("let x = 1", opts)
+    (path,) = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    written = os.stat(path).st_mtime_ns
+    # A fresh thread-local slot behaves like a new process: the tables must be
+    # loaded from disk, not generated again, and still parse correctly.
+    monkeypatch.setattr(parser_mod, "_parsers", type(parser_mod._parsers)())
+
+    def compute_lalr(self):
+        raise AssertionError("LALR tables were regenerated")
+
+    monkeypatch.setattr(LALR_Analyzer, "compute_lalr", compute_lalr)
+    prog = parse_program("let y = 2 + 3", opts)
+    assert prog.statements[0].name == "y"
+    assert os.stat(path).st_mtime_ns == written
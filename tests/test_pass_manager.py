@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import Number, ParserOptions, parse_program
+from aissembly_core import optimizer as optimizer_module
+from aissembly_core.optimizer import Pass, PassContext, PassManager, text_pass
+
+
+def test_placeholder_passes_are_registered():
+    names = [p.name for p in PassManager().passes]
+    for name in ("loop_to_operation", "operation_to_loop", "condition_to_operation", "constant_folding", "cse"):
+        assert name in names
+
+
+def test_iteration_stops_at_a_fixed_point():
+    manager = PassManager()
+    prog = parse_program("let a = 1 + 2\nlet b = a * 2")
+    out = manager.run(prog, ParserOptions(constant_folding_opt_passes=5, loop_to_operation_opt_passes=3))
+    assert [s.expr for s in out.statements] == [Number(3), Number(6)]
+    assert [(r.name, r.iteration, r.changed) for r in manager.records] == [
+        ("loop_to_operation", 0, False),
+        ("constant_folding", 0, True),
+        ("constant_folding", 1, False),
+    ]
+    assert all(r.seconds >= 0 for r in manager.records)
+
+
+def test_only_text_passes_unparse_and_unchanged_text_is_not_reparsed(monkeypatch):
+    unparsed = []
+    real = optimizer_module.program_to_source
+    monkeypatch.setattr(optimizer_module, "program_to_source", lambda p: unparsed.append(p) or real(p))
+
+    def same(source, options, defs=None, executor=None):
+        return source
+
+    def shout(source, options, defs=None, executor=None):
+        return source.replace('"x"', '"X"')
+
+    manager = PassManager([
+        Pass("fold", "fold", lambda p, ctx: p),
+        text_pass("same", "same", same),
+        text_pass("shout", "shout", shout),
+        text_pass("again", "again", same),
+    ])
+    prog = parse_program('let a = "x"')
+    options = type("Options", (), {"fold": 1, "same": 1, "shout": 2, "again": 1})()
+    out = manager.run(prog, options)
+    assert out.statements[0].expr.value == "X"
+    # One unparse for the first text pass; later ones reuse the rewritten text.
+    assert unparsed == [prog]
+    assert [(r.name, r.changed) for r in manager.records] == [
+        ("fold", False),
+        ("same", False),
+        ("shout", True),
+        ("shout", False),
+        ("again", False),
+    ]
+
+
+def test_context_loads_definitions_once(tmp_path):
+    llm = tmp_path / "llm.json"
+    llm.write_text(json.dumps([{"name": "f", "model": "m"}]))
+    seen = []
+
+    def probe(program, ctx):
+        seen.append((id(ctx.llm_defs), id(ctx.executor)))
+        return program
+
+    manager = PassManager([Pass("a", "a", probe)])
+    manager.register(Pass("b", "b", probe), before="a")
+    options = type("Options", (), {"a": 1, "b": 1, "llm": str(llm)})()
+    ctx = PassContext(options)
+    manager.run(parse_program("let x = 1"), options, context=ctx)
+    assert [p.name for p in manager.passes] == ["b", "a"]
+    assert len(seen) == 2 and seen[0] == seen[1]
+    assert list(ctx.llm_defs) == ["f"]
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import runtime
+from aissembly_core.async_executor import AsyncExecutor
+from aissembly_core.executor import Executor
+from aissembly_core.parser import parse_program
+from aissembly_core.replay import CallLog, ReplayError
+
+ADAPTER = """
+import itertools
+import time
+
+_n = itertools.count()
+
+def shout(text):
+    if text == "bad":
+        raise ValueError("bad input")
+    time.sleep(0.05 if text == "slow" else 0)
+    return text.upper() + str(next(_n))
+
+def stream(text):
+    for word in text.split():
+        yield word + " "
+
+def shout_batch(payloads):
+    return [p["args"][0].upper() for p in payloads]
+"""
+
+PROGRAM = 'let a = shout("hi")\nlet b = stream("x y z")\nlet c = shout("hi")\n'
+
+
+def _defs(tmp_path, batch=None):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    defs = {}
+    for name in ("shout", "stream"):
+        spec = {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": name},
+            # Coalescing would hide the second, identical call.
+            "single_flight": False,
+        }
+        defs[name] = spec
+    if batch is not None:
+        defs["shout"]["adapter"]["batch"] = batch
+    return defs
+
+
+def _record(tmp_path, source=PROGRAM, **kwargs):
+    path = str(tmp_path / "calls.jsonl")
+    env = Executor(_defs(tmp_path, **kwargs), on_token=None, call_log=CallLog(path)).run(parse_program(source))
+    # Replays must not depend on the adapter.
+    os.remove(tmp_path / "adapter.py")
+    return path, env
+
+
+def test_replay_reproduces_recorded_run(tmp_path):
+    path, env = _record(tmp_path)
+    assert env == {"a": "HI0", "b": "x y z ", "c": "HI1"}
+    entries = [json.loads(line) for line in open(path)]
+    assert [e["function"] for e in entries] == ["shout", "stream", "shout"]
+    assert [c[1] for c in entries[1]["chunks"]] == ["x ", "y ", "z "]
+
+    tokens = []
+    exe = Executor(
+        _defs(tmp_path),
+        on_token=lambda name, call_id, chunk: tokens.append(chunk),
+        call_log=CallLog(path, "replay"),
+    )
+    os.remove(tmp_path / "adapter.py")
+    assert exe.run(parse_program(PROGRAM + 'let d = shout("hi")\n')) == dict(env, d="HI1")
+    assert tokens == ["x ", "y ", "z ", None]
+    assert [r.chunks for r in exe.call_records] == [0, 3, 0, 0]
+
+
+def test_replay_async(tmp_path):
+    path, env = _record(tmp_path)
+    exe = AsyncExecutor(_defs(tmp_path), on_token=None, call_log=CallLog(path, "replay"))
+    assert asyncio.run(exe.run_async(parse_program(PROGRAM))) == env
+
+
+def test_recorded_latency(tmp_path):
+    path, _ = _record(tmp_path, 'let a = shout("slow")\n')
+    prog = parse_program('let a = shout("slow")\n')
+    for latency, fast in (("instant", True), ("recorded", False)):
+        exe = Executor(_defs(tmp_path), call_log=CallLog(path, "replay", latency))
+        t0 = time.perf_counter()
+        assert exe.run(prog) == {"a": "SLOW0"}
+        assert (time.perf_counter() - t0 < 0.04) == fast
+
+
+def test_failures_and_unknown_requests(tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    with pytest.raises(ValueError):
+        Executor(_defs(tmp_path), call_log=CallLog(path)).run(parse_program('let a = shout("bad")\n'))
+    exe = Executor(_defs(tmp_path), call_log=CallLog(path, "replay"))
+    with pytest.raises(ReplayError, match="bad input"):
+        exe.run(parse_program('let a = shout("bad")\n'))
+    with pytest.raises(ReplayError, match="No recorded call"):
+        exe.run(parse_program('let a = shout("new")\n'))
+
+
+def test_array_batches_are_logged_per_call(tmp_path):
+    loop = 'let out = for (range(0, 3), init="") -> acc + shout("w")\n'
+    path, env = _record(tmp_path, loop, batch={"mode": "array", "function": "shout_batch"})
+    assert env == {"out": "WWW"}
+    assert len(open(path).readlines()) == 3
+    # Replayed one call at a time, without the batch hook.
+    exe = Executor(_defs(tmp_path), batch_window=0, call_log=CallLog(path, "replay"))
+    assert exe.run(parse_program(loop)) == env
+
+
+def test_cli_record_and_replay(tmp_path, capsys):
+    defs = list(_defs(tmp_path).values())
+    llm = tmp_path / "llm.json"
+    llm.write_text(json.dumps(defs))
+    prog = tmp_path / "prog.asl"
+    prog.write_text('let a = shout("hi")\n')
+    log = str(tmp_path / "calls.jsonl")
+    runtime.main([str(prog), "--llm", str(llm), "--record", log])
+    recorded = json.loads(capsys.readouterr().out)
+    os.remove(tmp_path / "adapter.py")
+    runtime.main([str(prog), "--llm", str(llm), "--replay", log, "--replay-latency", "recorded"])
+    assert json.loads(capsys.readouterr().out) == recorded == {"a": "HI0"}
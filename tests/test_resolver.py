@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.resolver import SlotLet, SlotVar, resolve_program
+
+
+def test_variables_are_slot_addressed():
+    prog = parse_program("let a = 1\nlet b = for(range(0, 3), init=a) -> acc + i + a")
+    resolved = resolve_program(prog)
+    assert resolved.names == ["a", "b"]
+    let_b = resolved.statements[1]
+    assert isinstance(let_b, SlotLet) and let_b.slot == 1
+    acc, i = let_b.expr.body.args[0].args
+    a = let_b.expr.body.args[1]
+    assert (acc.depth, acc.slot) == (0, 1)
+    assert (i.depth, i.slot) == (0, 0)
+    assert isinstance(a, SlotVar) and (a.depth, a.slot) == (1, 0)
+
+
+def test_loop_scopes_shadow_and_nest():
+    src = """
+let i = 100
+let acc = 7
+let outer = i + acc
+let nested = for(range(0, 3), init=0) -> acc + (while(test=acc < i, init=0) -> acc + 1)
+let after = i
+"""
+    env = Executor().run(parse_program(src))
+    assert env == {"i": 100, "acc": 7, "outer": 107, "nested": 3, "after": 100}
+    assert list(env) == ["i", "acc", "outer", "nested", "after"]
+
+
+def test_run_returns_plain_dict_and_keeps_initial_env():
+    initial = {"seed": 5, "unused": "x"}
+    env = Executor().run(parse_program("let y = seed * 2"), initial)
+    assert env is initial
+    assert env == {"seed": 5, "unused": "x", "y": 10}
+
+
+def test_unbound_reference_raises_key_error():
+    with pytest.raises(KeyError):
+        Executor().run(parse_program("let a = b\nlet b = 1"))
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.optimizations.accuracy_opt_passes import accuracy_opt_passes_optimization
+from aissembly_core.optimizations.decomposition_opt_passes import decomposition_opt_passes_optimization
+from aissembly_core.optimizations.rewrite import splice, statement_start
+
+ADAPTER = """
+import json
+import time
+
+def _log(prompt):
+    with open(__file__ + ".calls", "a") as f:
+        f.write(json.dumps(prompt) + "\\n")
+
+def better(system, prompt):
+    given = prompt.rsplit("GIVEN PROMPT: ", 1)[1]
+    _log(given)
+    time.sleep(0.2)
+    return '"better ' + given.strip('"') + '"'
+
+def steps(system, prompt):
+    given = prompt.rsplit("GIVEN PROMPT: ", 1)[1]
+    _log(given)
+    return '"first"\\n\\n"second"'
+
+def chat(prompt):
+    return prompt
+"""
+
+
+def _options(tmp_path, **kw):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    defs = [
+        {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": function},
+        }
+        for name, function in (
+            ("accuracy_opt_passes", "better"),
+            ("decomposition_opt_passes", "steps"),
+            ("chat", "chat"),
+        )
+    ]
+    llm = tmp_path / "llm.json"
+    llm.write_text(json.dumps(defs))
+    return SimpleNamespace(llm=str(llm), **kw), tmp_path / "adapter.py.calls"
+
+
+def _calls(log):
+    return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+
+SOURCE = """let a = chat(prompt="x")
+let b = cond(test=true):
+    then:
+        -> chat(prompt="y")
+    else:
+        -> ""
+let c = chat(prompt="x")
+"""
+
+
+def test_accuracy_pass_rewrites_sites_concurrently_and_splices_once(tmp_path, capsys):
+    options, log = _options(tmp_path, opt_concurrency=4)
+    start = time.perf_counter()
+    out = accuracy_opt_passes_optimization(SOURCE, options)
+    assert time.perf_counter() - start < 0.35
+    # Two distinct prompts, each rewritten once.
+    assert sorted(_calls(log)) == ['"x"', '"y"']
+    assert out.splitlines() == [
+        'let ACCURACY_OPT_0 = chat(prompt="Question : " + "better x");',
+        "let a = ACCURACY_OPT_0",
+        'let ACCURACY_OPT_1 = chat(prompt="Question : " + "better y");',
+        "let b = cond(test=true):",
+        "    then:",
+        "        -> ACCURACY_OPT_1",
+        "    else:",
+        '        -> ""',
+        'let ACCURACY_OPT_2 = chat(prompt="Question : " + "better x");',
+        "let c = ACCURACY_OPT_2",
+    ]
+    assert len(parse_program(out).statements) == 6
+    # The rewritten program is returned, not printed over the runtime's output.
+    assert capsys.readouterr().out == ""
+
+
+def test_rewrites_are_memoized_in_the_cache_dir(tmp_path, capsys):
+    options, log = _options(tmp_path, cache_dir=str(tmp_path / "cache"))
+    first = accuracy_opt_passes_optimization(SOURCE, options)
+    assert len(_calls(log)) == 2
+    assert accuracy_opt_passes_optimization(SOURCE, options) == first
+    assert len(_calls(log)) == 2
+    # A second pass over the output only rewrites the prompts it has not seen.
+    second = accuracy_opt_passes_optimization(first, options)
+    assert len(_calls(log)) == 4
+    assert "ACCURACY_OPT_3" in second and "let ACCURACY_OPT_0 = ACCURACY_OPT_3" in second
+
+
+def test_decomposition_pass_chains_steps(tmp_path, capsys):
+    options, log = _options(tmp_path)
+    out = decomposition_opt_passes_optimization('let a = chat(prompt="x")\n', options)
+    assert out.splitlines() == [
+        'let DECOMPOSITION_OPT_0 = chat(prompt="Question : " + "first");',
+        'let DECOMPOSITION_OPT_1 = chat(prompt=DECOMPOSITION_OPT_0 + " Question : " + "second");',
+        "let a = DECOMPOSITION_OPT_1",
+    ]
+    assert capsys.readouterr().out == ""
+
+
+def test_splice_helpers():
+    src = "let a = 1\nlet b = f(\n    g(x))\n"
+    pos = src.index("g(x)")
+    assert statement_start(src, pos) == src.index("let b")
+    edits = [(4, 5, "z"), (0, 0, "# one\n"), (0, 0, "# two\n")]
+    assert splice(src, edits).startswith("# one\n# two\nlet z = 1")
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.resolver import resolve_program
+from aissembly_core.scheduler import Scheduler
+
+ADAPTER = """
+import time
+
+def slow(text, delay=0.2):
+    time.sleep(delay)
+    if text == "boom":
+        raise RuntimeError("boom")
+    return text + "!"
+"""
+
+
+@pytest.fixture
+def defs(tmp_path):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    return {
+        "slow": {
+            "name": "slow",
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": "slow"},
+        }
+    }
+
+
+def test_dependency_graph():
+    prog = parse_program(
+        "let a = 1\nlet b = a + 1\nlet c = 2\nprint(c)\nlet a = 5\nlet d = b"
+    )
+    infos, deps = Scheduler(Executor(), 4).analyze(resolve_program(prog).statements)
+    assert deps == [set(), {0}, set(), {0, 1, 2}, {3, 0, 1}, {3, 1}]
+    assert [i.barrier for i in infos] == [False, False, False, True, False, False]
+
+
+def test_independent_llm_statements_overlap(defs, capsys):
+    src = """
+let a = slow("x")
+let b = slow("y")
+let c = slow("z")
+print(a + b)
+let d = slow(c)
+"""
+    prog = parse_program(src)
+    expected = Executor(defs).run(prog)
+    sequential_out = capsys.readouterr().out
+
+    start = time.perf_counter()
+    env = Executor(defs, max_concurrency=3).run(prog)
+    elapsed = time.perf_counter() - start
+    assert env == expected
+    assert list(env) == list(expected)
+    assert capsys.readouterr().out == sequential_out
+    assert elapsed < 0.55  # two rounds of 0.2s instead of four
+
+
+def test_failure_matches_sequential_execution(defs):
+    src = 'let a = slow("x", 0.3)\nlet b = slow("boom", 0.0)\nlet c = slow("c", 0.0)\nlet a = 1'
+    prog = parse_program(src)
+    env = {"seed": 0}
+    with pytest.raises(RuntimeError):
+        Executor(defs, max_concurrency=4).run(prog, env)
+    assert env == {"seed": 0, "a": "x!"}
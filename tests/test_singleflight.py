@@ -0,0 +1,157 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import AsyncExecutor
+from aissembly_core.parser import parse_program
+from aissembly_core.cache import LLMCache
+from aissembly_core.executor import Executor
+from aissembly_core.singleflight import SingleFlight
+
+ADAPTER = """
+import asyncio
+import time
+
+calls = []
+
+def work(text):
+    calls.append(text)
+    time.sleep(0.2)
+    return text.upper()
+
+def fail(text):
+    calls.append(text)
+    time.sleep(0.2)
+    raise RuntimeError("backend down")
+
+def stream(text):
+    calls.append(text)
+    for part in ("a", "b", "c"):
+        time.sleep(0.05)
+        yield part
+
+def tags(text):
+    calls.append(text)
+    time.sleep(0.2)
+    return ["a", "b"]
+
+async def awork(text):
+    calls.append(text)
+    await asyncio.sleep(0.1)
+    return text.upper()
+
+def count():
+    return len(calls)
+"""
+
+
+def _defs(tmp_path, **extra):
+    extra.setdefault("single_flight", True)
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    defs = {}
+    for name in ("work", "fail", "stream", "tags", "awork", "count"):
+        defs[name] = {
+            "name": name,
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": name},
+            **extra,
+        }
+    return defs
+
+
+def _threads(target, n):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_concurrent_duplicates_share_one_request(tmp_path):
+    src = 'let a = work("x")\nlet b = work("x")\nlet c = work("x")\nlet d = work("y")\nlet n = count()'
+    exe = Executor(_defs(tmp_path), max_concurrency=4, flights=SingleFlight())
+    env = exe.run(parse_program(src))
+    assert (env["a"], env["b"], env["c"], env["d"]) == ("X", "X", "X", "Y")
+    assert env["n"] == 2
+    assert sum(r.coalesced for r in exe.call_records) == 2
+    assert exe.flights.in_flight() == 0
+
+
+def test_waiters_get_their_own_copy_of_the_result(tmp_path):
+    src = 'let a = tags("q")\nlet b = tags("q")\nlet n = push(a, "z")\nlet calls = count()'
+    exe = Executor(_defs(tmp_path), max_concurrency=4, flights=SingleFlight())
+    env = exe.run(parse_program(src))
+    assert env["calls"] == 1
+    assert env["a"] == ["a", "b", "z"] and env["b"] == ["a", "b"]
+
+
+def test_single_flight_can_be_disabled_per_function(tmp_path):
+    src = 'let a = work("x")\nlet b = work("x")\nlet n = count()'
+    exe = Executor(_defs(tmp_path, single_flight=False), max_concurrency=2, flights=SingleFlight())
+    env = exe.run(parse_program(src))
+    assert env["n"] == 2
+
+
+def test_only_cacheable_calls_are_coalesced_by_default(tmp_path):
+    src = 'let a = work("x")\nlet b = work("x")\nlet n = count()'
+    defs = _defs(tmp_path)
+    for spec in defs.values():
+        del spec["single_flight"]
+    env = Executor(defs, max_concurrency=2, flights=SingleFlight()).run(parse_program(src))
+    assert env["n"] == 2
+    env = Executor(defs, max_concurrency=2, flights=SingleFlight(), cache=LLMCache()).run(parse_program(src))
+    assert env["n"] == 3
+
+
+def test_errors_fan_out_to_all_waiters(tmp_path):
+    exe = Executor(_defs(tmp_path), flights=SingleFlight())
+    errors = []
+
+    def call():
+        try:
+            exe.call_llm("fail", ["x"], {})
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    _threads(call, 4)
+    assert errors == ["backend down"] * 4
+    assert exe.call_llm("count", [], {}) == 1
+    # The failure is not remembered: the next call is sent again.
+    with pytest.raises(RuntimeError):
+        exe.call_llm("fail", ["x"], {})
+    assert exe.call_llm("count", [], {}) == 2
+
+
+def test_waiters_receive_the_leaders_stream(tmp_path):
+    streams = {}
+    lock = threading.Lock()
+
+    def sink(fn_name, call_id, chunk):
+        with lock:
+            streams.setdefault(call_id, []).append(chunk)
+
+    exe = Executor(_defs(tmp_path), on_token=sink, flights=SingleFlight())
+    results = []
+    _threads(lambda: results.append(exe.call_llm("stream", ["x"], {})), 3)
+    assert results == ["abc"] * 3
+    assert exe.call_llm("count", [], {}) == 1
+    assert sorted(streams.values()) == [["a", "b", "c", None]] * 3
+    assert all(r.chunks == 3 for r in exe.call_records if r.name == "stream")
+
+
+def test_async_duplicates_share_one_request(tmp_path):
+    exe = AsyncExecutor(_defs(tmp_path), flights=SingleFlight())
+    program = parse_program('let a = awork("x")')
+
+    async def main():
+        return await asyncio.gather(*(exe.run_async(program, {"seed": 0}) for _ in range(5)))
+
+    envs = asyncio.run(main())
+    assert [env["a"] for env in envs] == ["X"] * 5
+    assert exe.call_llm("count", [], {}) == 1
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.cache import LLMCache
+from aissembly_core.transport import HTTPTransport
+
+ADAPTER = """
+import time
+
+def words(text):
+    time.sleep(0.05)
+    for word in text.split():
+        yield word + " "
+"""
+
+
+class _Resp:
+    def __init__(self, lines):
+        self.lines = [json.dumps({"response": t}).encode() + b"\n" for t in lines]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self.lines)
+
+
+def _defs(tmp_path):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    return {
+        "words": {
+            "name": "words",
+            "model": "local",
+            "adapter": {"type": "python", "path": str(adapter), "function": "words"},
+        },
+        "gen": {
+            "name": "gen",
+            "model": "m",
+            "adapter": {"type": "http", "url": "http://localhost:9/api/generate"},
+            "parameters": {"properties": {"prompt": {}, "stream": {"default": True}}},
+        },
+    }
+
+
+def test_tokens_reach_the_callback_in_order(tmp_path, capsys):
+    seen = []
+    exe = Executor(_defs(tmp_path), on_token=lambda fn, cid, chunk: seen.append((fn, cid, chunk)))
+    env = exe.run(parse_program('let a = words("one two")\nlet b = words("three")'))
+    assert env == {"a": "one two ", "b": "three "}
+    assert seen == [
+        ("words", 1, "one "),
+        ("words", 1, "two "),
+        ("words", 1, None),
+        ("words", 2, "three "),
+        ("words", 2, None),
+    ]
+    assert capsys.readouterr().out == ""
+
+    first = exe.call_records[0]
+    assert first.chunks == 2
+    assert 0.05 <= first.ttft <= first.duration
+
+
+def test_default_sink_prints_http_stream(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(HTTPTransport, "send", lambda self, endpoint, body=None: _Resp(["Hel", "", "lo"]))
+    env = Executor(_defs(tmp_path)).run(parse_program('let s = gen("hi")'))
+    assert env["s"] == "Hello"
+    assert capsys.readouterr().out == "Hello\n"
+
+
+def test_silent_executor_and_cached_replay(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(HTTPTransport, "send", lambda self, endpoint, body=None: _Resp(["a"] * 5000))
+    cache = LLMCache()
+    prog = parse_program('let s = gen("hi")')
+    assert Executor(_defs(tmp_path), cache=cache, on_token=None).run(prog)["s"] == "a" * 5000
+    assert capsys.readouterr().out == ""
+
+    chunks = []
+    exe = Executor(_defs(tmp_path), cache=cache, on_token=lambda fn, cid, c: chunks.append(c))
+    exe.run(prog)
+    assert chunks == ["a" * 5000, None]
+    assert exe.call_records[-1].cached
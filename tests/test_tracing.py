@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import runtime, tracing
+from aissembly_core.async_executor import AsyncExecutor
+from aissembly_core.cache import LLMCache
+from aissembly_core.executor import Executor
+from aissembly_core.parser import ParserOptions, parse_program
+from aissembly_core.optimizer import optimizer
+
+ADAPTER = """
+def shout(text):
+    return text.upper()
+"""
+
+
+def _defs(tmp_path):
+    adapter = tmp_path / "adapter.py"
+    adapter.write_text(ADAPTER)
+    spec = {
+        "name": "shout",
+        "model": "local",
+        "adapter": {"type": "python", "path": str(adapter), "function": "shout"},
+    }
+    return {"shout": spec}
+
+
+def _by_category(tracer, category):
+    return [s for s in tracer.spans if s.category == category]
+
+
+def test_spans_cover_parse_passes_statements_and_calls(tmp_path):
+    tracer = tracing.start()
+    try:
+        prog = parse_program('let a = shout("hi")\nlet b = shout("hi")\nlet c = 2 * 3\n')
+        prog = optimizer(prog, ParserOptions(constant_folding_opt_passes=1))
+        Executor(_defs(tmp_path), cache=LLMCache()).run(prog)
+    finally:
+        assert tracing.stop() is tracer
+
+    (parse,) = _by_category(tracer, "parse")
+    assert parse.attributes["statements"] == 3
+    assert [s.name for s in _by_category(tracer, "optimize")] == ["pass constant_folding"]
+    statements = _by_category(tracer, "statement")
+    assert [s.name for s in statements] == ["let a", "let b", "let c"]
+
+    calls = _by_category(tracer, "llm")
+    assert [c.attributes["cache"] for c in calls] == ["miss", "hit"]
+    first = calls[0]
+    assert first.parent_id == statements[0].span_id
+    assert first.attributes["function"] == "shout"
+    assert first.attributes["model"] == "local"
+    assert first.attributes["response_bytes"] == 2
+    assert first.attributes["payload_bytes"] > 0
+    assert all(s.end is not None and s.end >= s.start for s in tracer.spans)
+
+
+def test_async_calls_nest_under_statements(tmp_path):
+    tracer = tracing.start()
+    try:
+        prog = parse_program('let a = shout("hi")\n')
+        env = asyncio.run(AsyncExecutor(_defs(tmp_path)).run_async(prog))
+    finally:
+        tracing.stop()
+    assert env == {"a": "HI"}
+    (statement,) = _by_category(tracer, "statement")
+    (call,) = _by_category(tracer, "llm")
+    assert call.parent_id == statement.span_id
+    assert call.attributes["cache"] == "off"
+
+
+def test_chrome_and_otel_export(tmp_path):
+    tracer = tracing.Tracer()
+    with tracer.span("outer", "execute"):
+        tracer.record("llm shout", "llm", 1.0, 1.5, function="shout", ttft=None)
+
+    chrome = tracer.to_chrome()["traceEvents"]
+    assert [e["name"] for e in chrome] == ["outer", "llm shout"]
+    assert chrome[1]["ph"] == "X"
+    assert chrome[1]["dur"] == 0.5 * 1e6
+    assert chrome[1]["args"]["parent_id"] == chrome[0]["args"]["span_id"]
+
+    otel = tracer.to_otel()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    outer, call = otel
+    assert "parentSpanId" not in outer
+    assert call["parentSpanId"] == outer["spanId"]
+    assert call["kind"] == 3
+    keys = {a["key"] for a in call["attributes"]}
+    assert "function" in keys and "ttft" not in keys
+
+
+def test_cli_writes_trace(tmp_path, capsys):
+    prog_path = tmp_path / "prog.asl"
+    prog_path.write_text("let x = 7 + 6\n")
+    out = tmp_path / "trace.json"
+    runtime.main([str(prog_path), "--trace", str(out)])
+    assert json.loads(capsys.readouterr().out) == {"x": 13}
+    names = [e["name"] for e in json.loads(out.read_text())["traceEvents"]]
+    assert "parse_program" in names and "execute" in names and "let x" in names
+    assert tracing.active() is None
+
+
+def test_no_spans_without_tracer(tmp_path):
+    assert tracing.active() is None
+    with tracing.span("anything", "execute") as span:
+        assert span is None
+    Executor(_defs(tmp_path)).run(parse_program('let a = shout("hi")\n'))
@@ -0,0 +1,158 @@
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core.parser import parse_program
+from aissembly_core.executor import Executor
+from aissembly_core.transport import Endpoint, HTTPTransport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.peers.append(self.client_address)
+        if self.path == "/slow":
+            time.sleep(body.get("delay", 0.5))
+        if self.path == "/missing":
+            self._send(404, b'{"error": "missing"}')
+        elif self.path == "/stream":
+            lines = b"".join(
+                json.dumps({"response": w}).encode() + b"\n" for w in ("Hel", "lo")
+            )
+            self._send(200, gzip.compress(lines), gzip=True)
+        else:
+            data = json.dumps({"echo": body.get("prompt")}).encode()
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                self._send(200, gzip.compress(data), gzip=True)
+            else:
+                self._send(200, data)
+
+    def _send(self, status, data, gzip=False):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.peers = []
+    srv.lock = threading.Lock()
+    thread = threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _url(server, path="/generate"):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def _defs(server, path="/generate", **adapter):
+    return {
+        "gen": {
+            "name": "gen",
+            "model": "m",
+            "adapter": dict({"type": "http", "url": _url(server, path)}, **adapter),
+            "parameters": {"properties": {"prompt": {}, "stream": {"default": False}}},
+        }
+    }
+
+
+def test_sequential_calls_reuse_one_connection(server):
+    transport = HTTPTransport()
+    exe = Executor(_defs(server), transport=transport)
+    env = exe.run(parse_program("let out = for (range(0, 20), init=[]) -> op.append(acc, gen(\"p\"))"))
+    assert env["out"] == [{"echo": "p"}] * 20
+    assert len(server.peers) == 20
+    assert len(set(server.peers)) == 1
+    assert transport.stats()["connections_opened"] == 1
+
+
+def test_max_connections_bounds_concurrent_requests(server):
+    transport = HTTPTransport()
+    endpoint = Endpoint(_url(server, "/slow"), max_connections=2)
+
+    def call(_):
+        with transport.send(endpoint, b'{"delay": 0.1}') as resp:
+            return json.loads(resp.read())
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(call, range(6)))
+    assert len(set(server.peers)) == 2
+    assert transport.stats()["connections_opened"] == 2
+
+
+def test_endpoints_of_one_host_share_its_connection_cap(server):
+    transport = HTTPTransport()
+    endpoints = [
+        Endpoint(_url(server, "/slow"), max_connections=2),
+        Endpoint(_url(server, "/slow?x=1"), max_connections=8),
+    ]
+
+    def call(n):
+        with transport.send(endpoints[n % 2], b'{"delay": 0.1}') as resp:
+            return json.loads(resp.read())
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(call, range(8)))
+    assert transport.stats()["pools"] == 1
+    assert transport.stats()["connections_opened"] == 2
+
+
+def test_gzip_stream_is_decoded_line_by_line(server, capsys):
+    exe = Executor(_defs(server, "/stream"), transport=HTTPTransport())
+    env = exe.run(parse_program('let s = gen("p", true)'))
+    assert env["s"] == "Hello"
+    assert capsys.readouterr().out == "Hello\n"
+
+
+def test_errors_and_timeouts(server):
+    transport = HTTPTransport()
+    with pytest.raises(HTTPError) as info:
+        transport.send(Endpoint(_url(server, "/missing")), b"{}")
+    assert info.value.code == 404
+
+    # The connection is still usable after an error response.
+    with transport.send(Endpoint(_url(server)), b'{"prompt": "x"}') as resp:
+        assert json.loads(resp.read()) == {"echo": "x"}
+
+    slow = Endpoint.from_adapter({"url": _url(server, "/slow"), "timeout": {"connect": 1, "read": 0.1}})
+    with pytest.raises(TimeoutError):
+        transport.send(slow, b'{"delay": 0.5}')
+
+
+def test_stale_pooled_connection_is_replaced(server):
+    transport = HTTPTransport()
+    endpoint = Endpoint(_url(server))
+    with transport.send(endpoint, b'{"prompt": "a"}') as resp:
+        resp.read()
+    # Simulate the server dropping the idle keep-alive connection.
+    pool = next(iter(transport._pools.values()))
+    pool.idle[0].sock.shutdown(2)
+    with transport.send(endpoint, b'{"prompt": "b"}') as resp:
+        assert json.loads(resp.read()) == {"echo": "b"}
+    assert transport.stats()["connections_opened"] == 2
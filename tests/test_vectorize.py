@@ -0,0 +1,99 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aissembly_core import vectorize
+from aissembly_core.executor import Executor
+from aissembly_core.parser import parse_program
+from aissembly_core.resolver import resolve_program
+
+LOOPS = [
+    "let t = for(range(0, 1000), init=0) -> acc + i * 2 % 7",
+    "let t = for(range(-50, 400, 3), init=1) -> (i % 4 + 1) * acc",
+    "let t = for(range(0, 300), init=0.1) -> acc - i * 0.1",
+    "let k = 7\nlet t = for(range(1, 300), init=1.5) -> acc * (1 + i / k / 1000)",
+    "let t = for(range(-300, 500), init=0) -> max(acc, (i * 37) % 101 - abs(i))",
+    "let t = for(range(0, 300), init=5) -> min(acc, 3 - i)",
+    "let t = for(range(0, 300), init=[]) -> op.append(acc, i * i / 3)",
+    "let k = 2\nlet t = for(range(0, 300), init=[0]) -> acc + [k * i - 100]",
+    "let f = 0.5\nlet t = for(range(0, 100), init=[]) -> op.append(acc, f)",
+]
+
+
+def _run(source, **kwargs):
+    try:
+        return repr(Executor(**kwargs).run(parse_program(source)))
+    except Exception as e:
+        return type(e).__name__
+
+
+@pytest.mark.parametrize("source", LOOPS)
+def test_results_match_the_interpreter(source, monkeypatch):
+    pytest.importorskip("numpy")
+    used = []
+    run_loop = vectorize.run_loop
+
+    def spy(*args):
+        value = run_loop(*args)
+        used.append(value is not vectorize.NOT_VECTORIZED)
+        return value
+
+    monkeypatch.setattr(vectorize, "run_loop", spy)
+    assert _run(source) == _run(source, vectorize=False)
+    assert used == [True]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        # Division by zero still raises in the interpreter.
+        "let t = for(range(0, 100), init=0) -> acc + 1 / (i - 50)",
+        # Beyond 2**53 integers are left to Python; products become Python ints.
+        "let t = for(range(0, 100), init=0) -> acc + i * 1000000000 * 1000000000",
+        "let t = for(range(1, 100), init=1) -> acc * i",
+        # Float min/max and float modulo keep Python's signed zeros and NaN.
+        "let t = for(range(0, 100), init=0.0) -> max(acc, 0 - i * 0.0)",
+        "let t = for(range(0, 100), init=[]) -> op.append(acc, (i - 50) * 0.5 % 3)",
+        # Not a number or not a list.
+        'let t = for(range(0, 100), init="x") -> acc + i',
+        "let t = for(range(0, 100), init=0) -> acc + [i]",
+    ],
+)
+def test_fallbacks_match_the_interpreter(source):
+    assert _run(source) == _run(source, vectorize=False)
+
+
+def test_append_extends_the_initial_list():
+    xs = [1]
+    env = Executor().run(parse_program("let t = for(range(0, 100), init=xs) -> op.append(acc, i)"), {"xs": xs})
+    assert env["t"] is xs and xs == [1] + list(range(100))
+
+
+def test_only_arithmetic_bodies_are_vectorized():
+    def shape(body):
+        loop = resolve_program(parse_program(f"let t = for(range(0, 9), init=0) -> {body}")).statements[0].expr
+        return vectorize.analyze(loop.body)
+
+    assert shape("acc + i * 2").kind == "op.add"
+    assert shape("i * 2 + acc").kind == "op.add"
+    assert shape("op.append(acc, i)").kind == "append"
+    assert shape("acc - i").kind == "op.sub"
+    for body in ["i - acc", "acc + acc * i", "acc + chat(i)", "acc + (i > 2)", "push(acc, i)", "acc + len([i])"]:
+        assert shape(body) is None, body
+
+
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(vectorize, "np", None)
+    assert not Executor().vectorize
+    assert Executor().run(parse_program(LOOPS[0]))["t"] == sum(i * 2 % 7 for i in range(1000))
+
+
+def test_loop_plans_do_not_accumulate_across_runs():
+    exe = Executor()
+    program = parse_program(LOOPS[0])
+    for _ in range(50):
+        exe.run(program)
+    assert len(exe._loop_plans) <= 1